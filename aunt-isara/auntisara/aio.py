@@ -0,0 +1,144 @@
+"""
+Asyncio implementation of the controller command and status links, an alternative to the Twisted factories in
+auntisara.isara which does not depend on a Twisted or GObject main loop. The clients expose the same interface to
+the application: they call its connect, disconnect and receive_message methods and provide send_message, drop
+and the ready flag. Messages are framed by a NUL byte in both directions, see msgs.MessageFramer. Requires
+Python 3.
+"""
+import asyncio
+import random
+
+from softdev import log
+
+from .msgs import MessageType, MessageFramer
+
+logger = log.get_module_logger(__name__)
+
+DELIMITER = b'\0'
+READ_LIMIT = 2 ** 16
+
+
+class CommandClient(object):
+    protocol_name = 'Command Link'
+    message_type = MessageType.RESPONSE
+
+    # retry quickly after a dropped link and back off with jitter while the controller remains unreachable
+    initial_delay = 0.5
+    factor = 1.6
+    jitter = 0.2
+    max_delay = 30
+
+    def __init__(self, application, loop=None):
+        """
+        :param application: application providing connect, disconnect and receive_message methods
+        :param loop: asyncio event loop on which the client runs, defaults to the current event loop
+        """
+        self.application = application
+        self.logger = getattr(application, 'logger', logger)
+        self.loop = loop or asyncio.get_event_loop()
+        self.ready = False
+        self.stopping = False
+        self.reader = None
+        self.writer = None
+        self.task = None
+        self.delay = self.initial_delay
+
+    @property
+    def protocol(self):
+        # the application looks up the message type through the protocol, as for the Twisted factories
+        return type(self)
+
+    def start(self, address, port):
+        """
+        Start connecting to the controller. The client reconnects automatically until stopped. May be called from
+        any thread.
+        """
+        self.stopping = False
+        self.loop.call_soon_threadsafe(self._start, address, port)
+
+    def _start(self, address, port):
+        self.task = self.loop.create_task(self.run(address, port))
+
+    def stop(self):
+        """
+        Close the connection and stop reconnecting. May be called from any thread.
+        """
+        self.stopping = True
+        self.loop.call_soon_threadsafe(self._stop)
+
+    def _stop(self):
+        self.abort()
+        if self.task:
+            self.task.cancel()
+
+    async def run(self, address, port):
+        while not self.stopping:
+            try:
+                self.reader, self.writer = await asyncio.open_connection(address, port, limit=READ_LIMIT)
+            except OSError as e:
+                self.logger.debug('%s: connection failed: %s', self.protocol_name, e)
+                self.application.disconnect(self.message_type)
+                await self.retry()
+                continue
+
+            self.logger.log(log.IMPORTANT, '{} Ready: {}:{}'.format(address, port, self.protocol_name))
+            self.delay = self.initial_delay
+            self.ready = True
+            self.application.connect(self.message_type)
+            try:
+                await self.receive_messages()
+            except (OSError, asyncio.IncompleteReadError) as e:
+                self.logger.warning('{} Disconnected: {}'.format(self.protocol_name, e))
+            finally:
+                self.ready = False
+                self.writer.close()
+                self.application.disconnect(self.message_type)
+            await self.retry()
+
+    async def retry(self):
+        if self.stopping:
+            return
+        delay = self.delay * random.normalvariate(1.0, self.jitter)
+        self.delay = min(self.delay * self.factor, self.max_delay)
+        await asyncio.sleep(max(delay, 0.0))
+
+    async def receive_messages(self):
+        framer = MessageFramer(DELIMITER, READ_LIMIT)
+        while True:
+            data = await self.reader.read(READ_LIMIT)
+            if not data:
+                raise ConnectionResetError('Connection closed by controller')
+            for message in framer.feed(data):
+                self.receive_message(message)
+
+    def receive_message(self, message):
+        self.application.receive_message(message, self.message_type)
+
+    def send_message(self, message):
+        """
+        Send a message to the controller. May be called from any thread.
+        """
+        if self.ready and self.writer:
+            self.loop.call_soon_threadsafe(self.write, message)
+        else:
+            self.logger.error('Client not connected. Command ignored!')
+
+    def write(self, message):
+        if self.writer and not self.writer.is_closing():
+            self.writer.write('{}'.format(message).encode('latin-1') + DELIMITER)
+
+    def drop(self):
+        """
+        Abort the current connection without waiting for pending data. The client reconnects automatically unless
+        stopped. May be called from any thread.
+        """
+        self.loop.call_soon_threadsafe(self.abort)
+
+    def abort(self):
+        if self.writer:
+            self.writer.transport.abort()
+
+
+class StatusClient(CommandClient):
+    protocol_name = 'Status Link'
+    message_type = MessageType.STATUS
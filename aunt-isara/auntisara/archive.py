@@ -0,0 +1,255 @@
+import glob
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy
+from numpy.lib import format as npformat
+from softdev import log
+
+logger = log.get_module_logger(__name__)
+
+FILE_PATT = re.compile(r'^(?P<prefix>.+)-(?P<date>\d{8})-(?P<part>\d+)\.npy$')
+
+
+def row_type(state_fields, pose_axes=6, words=4):
+    """
+    Return the record type of one archive row
+
+    :param state_fields: number of decoded state fields
+    :param pose_axes: number of pose axes
+    :param words: number of 16-bit words of digital inputs and of digital outputs
+    """
+    return numpy.dtype([
+        ('time', '<f8'),
+        ('context', 'u1'),
+        ('state', '<f4', (state_fields,)),
+        ('pose', '<f4', (pose_axes,)),
+        ('di', '<u2', (words,)),
+        ('do', '<u2', (words,)),
+        ('error', '<u4'),
+    ])
+
+
+def _bisect(times, value, lo, hi):
+    # first index in times[lo:hi] with a time greater than or equal to value, reading O(log n) elements
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if times[mid] < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def used_rows(times):
+    """
+    Return the number of rows written to an archive file given its time column. Rows are written in order and
+    unused rows have a zero time, so the boundary is found by bisection.
+    """
+    lo, hi = 0, len(times)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if times[mid] > 0:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def archive_files(directory, prefix='status'):
+    """
+    Return the archive files in a directory, oldest first
+
+    :return: list of (date, part, path) tuples
+    """
+    files = []
+    for path in glob.glob(os.path.join(directory, '{}-*.npy'.format(prefix))):
+        m = FILE_PATT.match(os.path.basename(path))
+        if m and m.group('prefix') == prefix:
+            files.append((m.group('date'), int(m.group('part')), path))
+    return sorted(files)
+
+
+def query(directory, start, end, columns=None, prefix='status'):
+    """
+    Return the archived rows with times in [start, end). Files are memory-mapped and only the rows within the
+    interval are read.
+
+    :param directory: archive directory
+    :param start: start time in seconds since the epoch
+    :param end: end time in seconds since the epoch
+    :param columns: names of the columns to return, defaults to all
+    :param prefix: archive file prefix
+    :return: numpy record array ordered by time
+    """
+    first = datetime.fromtimestamp(start).strftime('%Y%m%d')
+    last = datetime.fromtimestamp(end).strftime('%Y%m%d')
+    chunks = []
+    dtype = None
+    for date, part, path in archive_files(directory, prefix):
+        if not first <= date <= last:
+            continue
+        try:
+            data = numpy.load(path, mmap_mode='r')
+        except (IOError, ValueError) as e:
+            logger.warning('Unable to read archive {}: {}'.format(path, e))
+            continue
+        times = data['time']
+        used = used_rows(times)
+        lo = _bisect(times, start, 0, used)
+        hi = _bisect(times, end, lo, used)
+        rows = data[lo:hi]
+        if columns:
+            rows = rows[list(columns)]
+        dtype = rows.dtype
+        if len(rows):
+            chunks.append(numpy.array(rows))
+    if chunks:
+        return numpy.concatenate(chunks)
+    return numpy.zeros(0, dtype=dtype or row_type(0))
+
+
+class StatusArchive(object):
+    """
+    Columnar archive of the robot status in memory-mapped NumPy files. The latest value of every column is held
+    in a row buffer, and each status reply copies the buffer into the next row of the current file, so every row
+    is a complete snapshot. A new file is started every day, or when the current one is full, and the files of
+    days older than the retention period are removed.
+    """
+
+    def __init__(self, directory, contexts, state_fields, prefix='status', rows=2 ** 20, days=7, logger=logger):
+        """
+        :param directory: archive directory, created if missing
+        :param contexts: names of the status contexts, stored in each row by index
+        :param state_fields: number of decoded state fields
+        :param prefix: file name prefix
+        :param rows: number of rows per file
+        :param days: number of days of files to keep
+        :param logger: logger for file errors
+        """
+        self.directory = directory
+        self.contexts = {name: i for i, name in enumerate(contexts)}
+        self.prefix = prefix
+        self.rows = rows
+        self.days = days
+        self.logger = logger
+        self.dtype = row_type(state_fields)
+        self.row = numpy.zeros(1, dtype=self.dtype)[0]
+        self.lock = threading.Lock()
+        self.data = None
+        self.date = None
+        self.date_end = 0.0
+        self.retry = 0.0
+        self.part = 0
+        self.index = 0
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def fit(self, column, values):
+        """
+        Return values padded with zeros or truncated to the length of an array column, replies may carry fewer
+        words than the column holds
+        """
+        field = self.dtype[column]
+        if not field.shape:
+            return values
+        fitted = numpy.zeros(field.shape, dtype=field.base)
+        values = numpy.asarray(values).ravel()[:field.shape[0]]
+        fitted[:len(values)] = values
+        return fitted
+
+    def update(self, column, values):
+        """
+        Set the latest value of a column without writing a row
+        """
+        with self.lock:
+            self.row[column] = self.fit(column, values)
+
+    def add(self, context, column=None, values=None, timestamp=None):
+        """
+        Write a row for a status reply
+
+        :param context: name of the status context
+        :param column: column updated by the reply, if any
+        :param values: new values of the column
+        :param timestamp: time of the reply, defaults to now
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            if column is not None:
+                self.row[column] = self.fit(column, values)
+            self.row['time'] = timestamp
+            self.row['context'] = self.contexts.get(context, 255)
+            if self.data is None or self.index >= self.rows or timestamp >= self.date_end:
+                if timestamp < self.retry:
+                    return
+                self.roll(timestamp)
+                if self.data is None:
+                    # try again later rather than on every row
+                    self.retry = timestamp + 60.0
+                    return
+            self.data[self.index] = self.row
+            self.index += 1
+
+    def roll(self, timestamp):
+        """
+        Close the current file and open the file for the given time, resuming it if it exists and has room
+        """
+        self.close_file()
+        day = datetime.fromtimestamp(timestamp).date()
+        date = day.strftime('%Y%m%d')
+        part = self.part + 1 if date == self.date else 0
+        self.date = date
+        self.date_end = time.mktime((day + timedelta(days=1)).timetuple())
+        try:
+            while True:
+                path = self.path(date, part)
+                if not os.path.exists(path):
+                    self.data = npformat.open_memmap(path, mode='w+', dtype=self.dtype, shape=(self.rows,))
+                    self.index = 0
+                    break
+                data = npformat.open_memmap(path, mode='r+')
+                index = used_rows(data['time'])
+                if data.dtype == self.dtype and index < len(data):
+                    self.data, self.index = data, index
+                    break
+                del data
+                part += 1
+        except (IOError, OSError, ValueError) as e:
+            self.logger.error('Unable to open archive file: {}'.format(e))
+            self.data = None
+        self.part = part
+        self.expire(timestamp)
+
+    def path(self, date, part):
+        return os.path.join(self.directory, '{}-{}-{:02d}.npy'.format(self.prefix, date, part))
+
+    def expire(self, timestamp):
+        """
+        Remove the files of days older than the retention period
+        """
+        oldest = (datetime.fromtimestamp(timestamp) - timedelta(days=self.days - 1)).strftime('%Y%m%d')
+        for date, part, path in archive_files(self.directory, self.prefix):
+            if date < oldest:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    self.logger.warning('Unable to remove archive {}: {}'.format(path, e))
+
+    def flush(self):
+        with self.lock:
+            if self.data is not None:
+                self.data.flush()
+
+    def close_file(self):
+        if self.data is not None:
+            self.data.flush()
+            self.data = None
+
+    def close(self):
+        with self.lock:
+            self.close_file()
+
@@ -0,0 +1,159 @@
+import re
+
+# matches a saved position by name, or any variant of it such as SOAK_2
+POSITION_PATTERN = r'^(?:{})(?:_\w*)?$'
+
+_patterns = {}
+
+
+def position_pattern(*allowed):
+    """
+    Return the compiled pattern matching the current position against the allowed position names. Patterns are
+    compiled once per combination of names.
+    """
+    if allowed not in _patterns:
+        _patterns[allowed] = re.compile(POSITION_PATTERN.format('|'.join(allowed)))
+    return _patterns[allowed]
+
+
+def tool_mask(*tools):
+    """
+    Return a bitmask with a bit set for each of the given tools
+    """
+    mask = 0
+    for tool in tools:
+        mask |= 1 << tool.value
+    return mask
+
+
+def no_args(state):
+    return ()
+
+
+class Rejected(Exception):
+    """
+    Raised when a command can not be sent in the current state
+    """
+
+    def __init__(self, message, help=None):
+        super(Rejected, self).__init__(message)
+        self.help = help
+
+
+class Snapshot(dict):
+    """
+    Values of the records a command depends on, by record name. Each record is read the first time its value is
+    needed and the same value is used for validating and encoding the command. The value of the record which
+    triggered the command is available as 'value'.
+    """
+    __slots__ = ('ioc',)
+
+    def __init__(self, ioc, value=None):
+        """
+        :param ioc: database model
+        :param value: value of the record which triggered the command
+        """
+        super(Snapshot, self).__init__()
+        self['value'] = value
+        self.ioc = ioc
+
+    def __missing__(self, name):
+        value = self[name] = getattr(self.ioc, name).get()
+        return value
+
+
+class Command(object):
+    def __init__(self, name, command=None, positions=(), tools=(), args=no_args, traj=False, check=None):
+        """
+        :param name: name of the command in the table
+        :param command: controller command, defaults to name
+        :param positions: names of the positions from which the command is allowed, empty for any position
+        :param tools: tools with which the command is allowed, empty for any tool
+        :param args: function returning the tuple of command arguments from a Snapshot
+        :param traj: whether the command is sent as a trajectory
+        :param check: function returning a warning message if the command should not be sent, or None
+        """
+        self.name = name
+        self.command = command or name
+        self.positions = tuple(positions)
+        self.tools = tuple(tools)
+        self.args = args
+        self.traj = traj
+        self.check = check
+        self.pattern = position_pattern(*self.positions) if self.positions else None
+        self.mask = tool_mask(*self.tools)
+        self.prefix = 'traj({},'.format(self.command) if traj else '{}('.format(self.command)
+
+    def encode(self, state):
+        """
+        Return the command text for the given state
+        """
+        args = self.args(state)
+        if args:
+            return self.prefix + ','.join(map(str, args)) + ')'
+        return self.command
+
+
+class CommandTable(object):
+    """
+    Commands accepted from the records, compiled from their specifications. Several specifications may share a name,
+    in which case the first one allowing the current tool is used, so a command can be encoded differently for
+    different tools. Variants sharing a name must allow the same positions.
+    """
+
+    def __init__(self, commands):
+        self.commands = {}
+        for command in commands:
+            self.commands.setdefault(command.name, []).append(command)
+
+        # tools allowed by any variant, zero if one of them allows all tools
+        self.masks = {}
+        for name, variants in self.commands.items():
+            mask = 0
+            for command in variants:
+                if not command.mask:
+                    mask = 0
+                    break
+                mask |= command.mask
+            self.masks[name] = mask
+
+    def __contains__(self, name):
+        return name in self.commands
+
+    def prepare(self, name, state, positions=True):
+        """
+        Validate a command and return the text to send
+
+        :param name: name of the command
+        :param state: Snapshot of the records
+        :param positions: whether any robot positions have been defined
+        :return: command text
+        :raise: Rejected if the command is not allowed in the current state
+        """
+        variants = self.commands[name]
+        first = variants[0]
+        if first.pattern is not None:
+            if not positions:
+                raise Rejected(
+                    'No positions have been defined',
+                    'Please move the robot manually and save positions named `{}`'.format(' | '.join(first.positions))
+                )
+            if not first.pattern.match(state['position_fbk']):
+                raise Rejected(
+                    'Command allowed only from ` {} ` position'.format(' | '.join(first.positions)),
+                    'Please move the robot into the correct position and the re-issue the command'
+                )
+
+        if self.masks[name]:
+            tool = 1 << state['tool_fbk']
+            if not self.masks[name] & tool:
+                raise Rejected('Invalid tool for command!')
+            command = next(command for command in variants if command.mask & tool)
+        else:
+            command = first
+
+        if command.check is not None:
+            message = command.check(state)
+            if message:
+                raise Rejected(message)
+        return command.encode(state)
@@ -0,0 +1,160 @@
+import threading
+
+import numpy
+from enum import Enum
+
+
+class PortState(Enum):
+    EMPTY, PRESENT, TOOL, GONIO = range(4)
+
+
+# places outside the dewar which hold a pin and the port state reported for it, the double tool has two jaws
+HOLDERS = {
+    'tool': PortState.TOOL,
+    'toolb': PortState.TOOL,
+    'gonio': PortState.GONIO,
+}
+
+
+def bit_indices(mask):
+    """
+    Return the indices of all bits set in an integer bitmask, lowest first
+
+    :param mask: integer bitmask
+    :return: list of bit indices
+    """
+    indices = []
+    while mask:
+        low = mask & -mask
+        indices.append(low.bit_length() - 1)
+        mask ^= low
+    return indices
+
+
+def mask_names(mask, names):
+    """
+    Convert a bitmask to the set of names corresponding to the bits which are set
+
+    :param mask: integer bitmask
+    :param names: sequence of names indexed by bit
+    """
+    return {names[i] for i in bit_indices(mask) if i < len(names)}
+
+
+class Inventory(object):
+    """
+    Dewar inventory kept as integer bitsets. Puck presence is a single bitmask with bit `i` corresponding to
+    puck `i + 1`, sample occupancy is one bitmask per puck with bit `j` corresponding to sample `j + 1`, and
+    plates are a bitmask with bit `k` corresponding to plate `k + 1`.
+
+    Pins which are on either jaw of the tool or on the goniometer are removed from the dewar bitsets and tracked
+    separately, by holder name, so that the occupancy can be reported as a single array. May be used from any
+    thread.
+    """
+
+    def __init__(self, num_pucks, num_samples, num_plates):
+        self.num_pucks = num_pucks
+        self.num_samples = num_samples
+        self.num_plates = num_plates
+        self.full_puck = (1 << num_samples) - 1
+        self.pucks = 0
+        self.samples = [0] * num_pucks
+        self.plates = (1 << num_plates) - 1
+        self.tool_plate = 0
+        self.locations = {holder: None for holder in HOLDERS}
+        self.occupancy = numpy.zeros(num_pucks * num_samples + num_plates, dtype=numpy.int32)
+        self.dirty = True
+        self.lock = threading.RLock()
+
+    def update_pucks(self, mask):
+        """
+        Update puck presence from a new bitmask.
+
+        :param mask: integer bitmask of detected pucks
+        :return: (added, removed) bitmasks of pucks which changed
+        """
+        with self.lock:
+            changed = self.pucks ^ mask
+            added = changed & mask
+            removed = changed & self.pucks
+            for i in bit_indices(added):
+                self.samples[i] = self.full_puck & ~self._held_mask(i + 1)
+            for i in bit_indices(removed):
+                self.samples[i] = 0
+            self.pucks = mask
+            self.dirty = self.dirty or bool(changed)
+            return added, removed
+
+    def set_location(self, location, puck, sample):
+        """
+        Move a pin to a jaw of the tool or to the goniometer. The previous pin at that location, if any, is
+        returned to its port in the dewar, and the new pin is removed from its port.
+
+        :param location: holder name, one of HOLDERS
+        :param puck: puck number (1-based), 0 or negative if location is now empty
+        :param sample: sample number (1-based), 0 or negative if location is now empty
+        :return: True if the inventory changed
+        """
+        with self.lock:
+            valid = 0 < puck <= self.num_pucks and 0 < sample <= self.num_samples
+            pin = (puck, sample) if valid else None
+            previous = self.locations[location]
+            if pin == previous:
+                return False
+            self.locations[location] = pin
+            if previous and self.pucks & (1 << (previous[0] - 1)) and previous not in self.locations.values():
+                self.samples[previous[0] - 1] |= 1 << (previous[1] - 1)
+            if pin:
+                self.samples[pin[0] - 1] &= ~(1 << (pin[1] - 1))
+            self.dirty = True
+            return True
+
+    def set_plate(self, plate):
+        """
+        Update the plate on the tool. All other plates are considered to be in the dewar.
+
+        :param plate: plate number (1-based), 0 if no plate is on the tool
+        :return: True if the inventory changed
+        """
+        with self.lock:
+            plate = plate if 0 < plate <= self.num_plates else 0
+            mask = (1 << self.num_plates) - 1
+            if plate:
+                mask &= ~(1 << (plate - 1))
+            changed = mask != self.plates
+            self.plates = mask
+            self.tool_plate = plate
+            self.dirty = self.dirty or changed
+            return changed
+
+    def _held_mask(self, puck):
+        mask = 0
+        for pin in self.locations.values():
+            if pin and pin[0] == puck:
+                mask |= 1 << (pin[1] - 1)
+        return mask
+
+    def get_occupancy(self):
+        """
+        Return the occupancy array, one entry per port, puck samples first followed by plates. Entries are
+        PortState values. The array is only recomputed if the inventory changed since the last call, a copy is
+        returned.
+        """
+        with self.lock:
+            if self.dirty:
+                self.occupancy[:] = PortState.EMPTY.value
+                weights = 1 << numpy.arange(self.num_samples)
+                samples = numpy.array(self.samples, dtype=numpy.int64)[:, None]
+                present = (samples & weights) != 0
+                occupancy = self.occupancy[:self.num_pucks * self.num_samples].reshape(self.num_pucks, self.num_samples)
+                occupancy[present] = PortState.PRESENT.value
+                for location, pin in self.locations.items():
+                    if pin and 0 < pin[0] <= self.num_pucks and 0 < pin[1] <= self.num_samples:
+                        occupancy[pin[0] - 1, pin[1] - 1] = HOLDERS[location].value
+                plates = self.occupancy[self.num_pucks * self.num_samples:]
+                for i in bit_indices(self.plates):
+                    plates[i] = PortState.PRESENT.value
+                if self.tool_plate:
+                    plates[self.tool_plate - 1] = PortState.TOOL.value
+                self.dirty = False
+            return self.occupancy.copy()
@@ -4,17 +4,23 @@ import glob
 import os
 import textwrap
 import time
+import sys
 import numpy
 
 from datetime import datetime
-from Queue import Queue
-from threading import Thread
+from threading import Event, Thread
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 from enum import Enum
-from softdev import epics, models, log
-from twisted.internet import reactor
+from softdev import epics, executor, models, log
+from twisted.internet import reactor, task
 
-from . import isara, msgs
+from . import isara, msgs, inventory, mountqueue, timing, scheduler, watchdog, outbox, commands, motion, archive, \
+    recorder
 
 PUCK_LIST = [
     '1A', '2A', '3A', '4A', '5A',
@@ -31,6 +37,12 @@ NUM_PLATES = 8
 NUM_WELLS = 192
 NUM_ROW_WELLS = 24
 STATUS_TIME = 0.1
+POSE_HISTORY = 50
+STATE_FIELDS = 32
+STATUS_CONTEXTS = ['state', 'di', 'do', 'position', 'message']
+
+# controller link implementations, see isara and aio, the asyncio links require Python 3
+TRANSPORTS = ('twisted', 'asyncio') if sys.version_info[0] >= 3 else ('twisted',)
 
 STATUS_PATT = re.compile('^(?P<context>\w+)\((?P<msg>.*?)\)?$')
 
@@ -98,10 +110,10 @@ class AuntISARA(models.Model):
     message = models.String('MESSAGE', max_length=2048, desc='Message')
 
     # Inputs and Outputs
-    input0_fbk = models.BinaryInput('STATE:INP0', desc='Digital Inputs 00-15')
-    input1_fbk = models.BinaryInput('STATE:INP1', desc='Digital Inputs 16-31')
-    input2_fbk = models.BinaryInput('STATE:INP2', desc='Digital Inputs 32-47')
-    input3_fbk = models.BinaryInput('STATE:INP3', desc='Digital Inputs 48-63')
+    inputs_fbk = models.RecordArray(
+        models.BinaryInput, 'STATE:INP{}', count=4,
+        desc=['Digital Inputs {:02d}-{:02d}'.format(16 * i, 16 * i + 15) for i in range(4)]
+    )
 
     emergency_ok = models.Enum('INP:emerg', choices=GoodBad, desc='Emergency/Air OK')
     collision_ok = models.Enum('INP:colSensor', choices=GoodBad, desc='Collision Sensor OK')
@@ -111,10 +123,10 @@ class AuntISARA(models.Model):
     cryojet_fbk = models.Enum('INP:cryojet', choices=OffOn, desc='Cryojet Back')
     heartbeat = models.Enum('INP:heartbeat', choices=OffOn, desc='Heart beat')
 
-    output0_fbk = models.BinaryInput('STATE:OUT0', desc='Digital Outpus 00-15')
-    output1_fbk = models.BinaryInput('STATE:OUT1', desc='Digital Oututs 16-31')
-    output2_fbk = models.BinaryInput('STATE:OUT2', desc='Digital Oututs 32-47')
-    output3_fbk = models.BinaryInput('STATE:OUT3', desc='Digital Oututs 48-63')
+    outputs_fbk = models.RecordArray(
+        models.BinaryInput, 'STATE:OUT{}', count=4,
+        desc=['Digital Outputs {:02d}-{:02d}'.format(16 * i, 16 * i + 15) for i in range(4)]
+    )
 
     # Status
     mode_fbk = models.Enum('STATE:mode', choices=ModeType, desc='Control Mode')
@@ -151,14 +163,18 @@ class AuntISARA(models.Model):
     pos_dew_fbk = models.String('STATE:posDewar', max_length=40, desc='Position in Dewar')
     soak_count_fbk = models.Integer('STATE:soakCount', desc='Soak Count')
     pucks_fbk = models.String('STATE:pucks', max_length=40, desc='Puck Detection')
-    pucks_bit0 = models.BinaryInput('STATE:pucks:bit0', desc='Puck Detection')
-    pucks_bit1= models.BinaryInput('STATE:pucks:bit1', desc='Puck Detection')
+    pucks_bits = models.RecordArray(models.BinaryInput, 'STATE:pucks:bit{}', count=2, desc='Puck Detection')
+    occupancy_fbk = models.Array(
+        'STATE:occupancy', type=int, length=NUM_PUCKS * NUM_PUCK_SAMPLES + NUM_PLATES, desc='Port Occupancy'
+    )
     xpos_fbk = models.Float('STATE:posX', prec=2, desc='X-Pos')
     ypos_fbk = models.Float('STATE:posY', prec=2, desc='Y-Pos')
     zpos_fbk = models.Float('STATE:posZ', prec=2, desc='Z-Pos')
     rxpos_fbk = models.Float('STATE:posRX', prec=2, desc='RX-Pos')
     rypos_fbk = models.Float('STATE:posRY', prec=2, desc='RY-Pos')
     rzpos_fbk = models.Float('STATE:posRZ', prec=2, desc='RZ-Pos')
+    pose_vec_fbk = models.Array('STATE:poseVec', type=float, length=len(motion.AXES), desc='Pose (x, y, z, rx, ry, rz)')
+    state_vec_fbk = models.Array('STATE:stateVec', type=float, length=STATE_FIELDS, desc='Decoded State')
     mounted_fbk = models.String('STATE:onDiff', max_length=40, desc='On Gonio')
     tooled_fbk = models.String('STATE:onTool', max_length=40, desc='On Tool')
 
@@ -194,6 +210,7 @@ class AuntISARA(models.Model):
     pos_name = models.String('PAR:posName', max_length=40, default='', desc='Position Name')
     pos_force = models.Enum('PAR:posForce', choices=OffOn, default=0, desc='Overwrite Position')
     pos_tolerance = models.Float('PAR:posTol', default=0.1, prec=2, desc='Position Tolerance')
+    debug_param = models.Enum('PAR:debug', choices=OffOn, default=0, desc='Status Debug')
 
     # General Commands
     power_cmd = models.Toggle('CMD:power', desc='Power')
@@ -260,6 +277,64 @@ class AuntISARA(models.Model):
     dismount_cmd = models.Toggle('CMD:dismount', desc='Dismount')
     mount_cmd = models.Toggle('CMD:mount', desc='Mount')
 
+    # Mount queue
+    queue_port = models.String('PAR:queuePort', max_length=40, default='', desc='Port to Queue')
+    queue_add_cmd = models.Toggle('CMD:queueAdd', desc='Add to Queue')
+    queue_clear_cmd = models.Toggle('CMD:queueClear', desc='Clear Queue')
+    queue_next_cmd = models.Toggle('CMD:queueNext', desc='Mount Next')
+    queue_fbk = models.String('STATE:queue', max_length=1024, desc='Queued Ports')
+    queue_count_fbk = models.Integer('STATE:queueCount', desc='Queued Count')
+    queue_done_fbk = models.Integer('STATE:queueDone', desc='Queue Mounted Count')
+    queue_active_fbk = models.String('STATE:queueActive', max_length=40, desc='Queue Mounting')
+    pipelined_rate_fbk = models.Float('STATE:pipelinedRate', prec=1, units='smpl/h', desc='Pipelined Throughput')
+    single_rate_fbk = models.Float('STATE:singleRate', prec=1, units='smpl/h', desc='Single Throughput')
+
+    # Operation timing
+    op_names_fbk = models.Array('STATE:opNames', type=str, length=len(timing.OPERATIONS), desc='Operation Names')
+    op_mean_fbk = models.Array('STATE:opMean', type=float, length=len(timing.OPERATIONS), desc='Mean Duration')
+    op_p95_fbk = models.Array('STATE:opP95', type=float, length=len(timing.OPERATIONS), desc='95% Duration')
+    op_last_fbk = models.Array('STATE:opLast', type=float, length=len(timing.OPERATIONS), desc='Last Duration')
+    op_phases_fbk = models.String('STATE:opPhases', max_length=1024, desc='Last Operation Phases')
+    op_path_fbk = models.Array('STATE:opPath', type=float, length=len(timing.OPERATIONS), desc='Last Path Length')
+
+    # Motion history
+    moving_fbk = models.Enum('STATE:moving', choices=OffOn, desc='Robot Moving')
+    motion_speed_fbk = models.Float('STATE:motionSpeed', prec=1, units='mm/s', desc='Linear Speed')
+    speed_hist_fbk = models.Array('STATE:speedHist', type=float, length=POSE_HISTORY, desc='Linear Speed History')
+    pose_hist_fbk = models.Array(
+        'STATE:poseHist', type=float, length=len(motion.AXES) * POSE_HISTORY, desc='Pose History'
+    )
+
+    # Endstation wait accounting
+    wait_rdtrsf_fbk = models.Float('STATE:waitRdTrsf', prec=1, units='s', desc='Total RdTrsf Wait')
+    wait_splon_fbk = models.Float('STATE:waitSplOn', prec=1, units='s', desc='Total SplOn Wait')
+    op_wait_fbk = models.Array('STATE:opWait', type=float, length=len(timing.OPERATIONS), desc='Total Wait per Op')
+    mount_rdtrsf_fbk = models.Float('STATE:mountWaitRdTrsf', prec=2, units='s', desc='Mount RdTrsf Wait')
+    mount_splon_fbk = models.Float('STATE:mountWaitSplOn', prec=2, units='s', desc='Mount SplOn Wait')
+    mount_wait_frac = models.Float('STATE:mountWaitFrac', prec=3, desc='Mount Wait Fraction')
+
+    # Soak and dry scheduler
+    sched_enable = models.Enum('PAR:schedEnable', choices=OffOn, default=0, desc='Soak Scheduler')
+    sched_idle_time = models.Float('PAR:schedIdleTime', default=60.0, prec=0, units='s', desc='Scheduler Idle Time')
+    sched_action_fbk = models.String('STATE:schedAction', max_length=40, desc='Last Scheduled Action')
+    sched_count_fbk = models.Integer('STATE:schedCount', desc='Scheduled Actions')
+    sched_soaks_fbk = models.Integer('STATE:schedSoaksLeft', desc='Soaks Left')
+    sched_saved_fbk = models.Float('STATE:schedSaved', prec=1, units='s', desc='Mount Latency Saved')
+
+    # Controller link watchdog
+    stale_timeout = models.Float(
+        'PAR:staleTimeout', default=5.0, min_val=1, max_val=60, prec=1, units='s', desc='Stale Link Timeout'
+    )
+    rtt_fbk = models.Float('STATE:rtt', prec=1, units='ms', desc='Status Round-Trip')
+    rtt_avg_fbk = models.Float('STATE:rttAvg', prec=1, units='ms', desc='Smoothed Round-Trip')
+    rtt_dev_fbk = models.Float('STATE:rttDev', prec=1, units='ms', desc='Round-Trip Deviation')
+    link_stale_fbk = models.Enum('STATE:linkStale', choices=OffOn, default=0, desc='Stale Link')
+    link_drops_fbk = models.Integer('STATE:linkDrops', desc='Stale Link Drops')
+    resync_time_fbk = models.Float('STATE:resyncTime', prec=0, units='ms', desc='Reconnect Resync Time')
+
+    # Fault flight recorder
+    flight_dump_fbk = models.String('STATE:flightDump', max_length=256, default='', desc='Last Flight Record')
+
 
 def port2args(port):
     # converts '1A16' to puck=1, sample=16, tool=2 for UNIPUCK where NUM_PUCK_SAMPLES = 16
@@ -311,6 +386,12 @@ def minus_int(text):
     except ValueError:
         return -1
 
+def float_or_nan(text):
+    try:
+        return float(text)
+    except ValueError:
+        return numpy.nan
+
 def name_to_tool(text):
     return {
         #ORG 'simple': ToolType.UNIPUCK.value,
@@ -321,24 +402,181 @@ def name_to_tool(text):
     }.get(text.lower(), 1)
 
 
+def make_args(tool=0, puck=0, sample=0, datamatrix_scan=0, next_puck=0, next_sample=0, sample_type=SampleType.SPINE.value, next_sample_type=SampleType.SPINE.value, x_off=0, y_off=0, z_off=0, **kwargs):
+    #ORG def make_args(tool=0, puck=0, sample=0, puck_type=PuckType.UNIPUCK.value, x_off=0, y_off=0, z_off=0, **kwargs):
+    #ORG     return (tool, puck, sample) + (0,) * 4 + (puck_type, 0, 0) + (x_off, y_off, z_off)
+    return (tool, puck, sample) + (datamatrix_scan,) + (next_puck, next_sample) + (sample_type, next_sample_type, 0, 0) + (x_off, y_off, z_off)
+
+
+def sample_args(state):
+    return make_args(
+        tool=state['tool_param'], puck=state['puck_param'], sample=state['sample_param'],
+        datamatrix_scan=state['datamatrix_scan'], next_puck=state['next_puck'], next_sample=state['next_sample'],
+        sample_type=state['sample_type'], next_sample_type=state['next_sample_type']
+    )
+
+
+def next_port(state):
+    return port2args(state['next_param'].strip())
+
+
+def require_next_port(state):
+    if next_port(state).get('mode') != 'puck':
+        return 'No Sample specified'
+
+
+PUCK_TOOLS = (ToolType.UNIPUCK, ToolType.ROTATING, ToolType.DOUBLE)
+SOAK_TOOLS = (ToolType.DOUBLE, ToolType.UNIPUCK, ToolType.ROTATING)
+
+COMMANDS = commands.CommandTable([
+    commands.Command('restart'),
+    commands.Command('clearbcrd'),
+    commands.Command('speedup'),
+    commands.Command('speeddown'),
+    commands.Command('clearmemory'),
+    commands.Command('reset parameters'),
+    commands.Command('resetMotion'),
+    commands.Command('safe', args=lambda s: (s['tool_fbk'],)),
+    commands.Command('home', positions=('SOAK', 'HOME', 'Undefined'), args=lambda s: (s['tool_fbk'],), traj=True),
+    commands.Command('recover', args=lambda s: (s['tool_fbk'],), traj=True),
+    commands.Command(
+        'changetool', positions=('HOME',), args=lambda s: (s['tool_param'],), traj=True,
+        check=lambda s: 'Requested tool already present, command ignored' if s['tool_param'] == s['tool_fbk'] else None
+    ),
+    commands.Command('put', positions=('SOAK',), tools=PUCK_TOOLS, args=sample_args, traj=True),
+    commands.Command(
+        'put', 'putplate', positions=('SOAK',), tools=(ToolType.PLATE,), traj=True,
+        args=lambda s: (s['tool_param'], s['plate_param'])
+    ),
+    commands.Command(
+        'get', positions=('SOAK',), tools=PUCK_TOOLS, traj=True,
+        args=lambda s: make_args(
+            tool=s['tool_param'], datamatrix_scan=s['datamatrix_scan'], sample_type=0, next_sample_type=0
+        )
+    ),
+    commands.Command(
+        'get', 'getplate', positions=('SOAK',), tools=(ToolType.PLATE,), args=lambda s: (s['tool_param'],), traj=True
+    ),
+    commands.Command('getput', positions=('SOAK',), tools=PUCK_TOOLS, args=sample_args, traj=True),
+    commands.Command(
+        'getput', 'getplate', positions=('SOAK',), tools=(ToolType.PLATE,), args=lambda s: (s['tool_param'],), traj=True
+    ),
+    commands.Command(
+        'datamatrix', positions=('SOAK',), traj=True,
+        args=lambda s: (s['tool_param'], s['puck_param'], s['sample_param'], 0, 0, 0, s['sample_type'])
+    ),
+    commands.Command(
+        'back', positions=('SOAK',), args=lambda s: (s['tool_fbk'],), traj=True,
+        check=lambda s: None if s['tooled_fbk'] else 'No sample on tool, command ignored'
+    ),
+    commands.Command('soak', positions=('HOME',), tools=SOAK_TOOLS, args=lambda s: (s['tool_fbk'],), traj=True),
+    commands.Command('dry', positions=('SOAK', 'HOME'), tools=SOAK_TOOLS, args=lambda s: (s['tool_fbk'],), traj=True),
+    commands.Command(
+        'pick', tools=(ToolType.DOUBLE,), traj=True,
+        args=lambda s: (
+            s['tool_param'], s['puck_param'], s['sample_param'], s['datamatrix_scan'], 0, 0, s['sample_type']
+        )
+    ),
+    commands.Command(
+        'toolcal', positions=('HOME',), tools=(ToolType.LASER, ToolType.DOUBLE), args=lambda s: (s['tool_fbk'],),
+        traj=True
+    ),
+    commands.Command(
+        'teachgonio', positions=('HOME',), tools=(ToolType.LASER,), args=lambda s: (ToolType.LASER.value,), traj=True
+    ),
+    commands.Command(
+        'teachpuck', positions=('HOME',), tools=(ToolType.LASER,), traj=True,
+        args=lambda s: (ToolType.LASER.value, s['puck_param']),
+        check=lambda s: None if s['puck_param'] else 'Please select a puck number'
+    ),
+    commands.Command(
+        'teachdewar', positions=('HOME',), tools=(ToolType.LASER,), traj=True,
+        args=lambda s: (ToolType.LASER.value, s['puck_param'])
+    ),
+    commands.Command(
+        'setdiffr', check=require_next_port,
+        args=lambda s: (next_port(s)['puck'], next_port(s)['sample'], s['sample_type'])
+    ),
+    commands.Command(
+        'settool', tools=(ToolType.DOUBLE,), check=require_next_port,
+        args=lambda s: (next_port(s)['puck'], next_port(s)['sample'], s['sample_type'], s['jaw_param'])
+    ),
+    commands.Command(
+        'settool2', tools=(ToolType.DOUBLE,), check=require_next_port,
+        args=lambda s: (next_port(s)['puck'], next_port(s)['sample'], s['sample_type'])
+    ),
+    commands.Command('setmaxsoaktime', args=lambda s: (s['value'],)),
+    commands.Command('setmaxsoaknb', args=lambda s: (s['value'],)),
+    commands.Command('setautocloselidtimer', args=lambda s: (s['value'],)),
+    commands.Command('setautodrytimer', args=lambda s: (s['value'],)),
+    commands.Command('sethighln2', args=lambda s: (s['value'],)),
+    commands.Command('setlowln2', args=lambda s: (s['value'],)),
+])
+
+
+def command_handler(name):
+    """
+    Return a record callback which sends the named command from the command table when the record is set
+    """
+    def handler(self, pv, value, ioc):
+        if value:
+            self.execute_command(name, value)
+    handler.__name__ = str('do_{}'.format(name.replace(' ', '_')))
+    return models.serial('commands')(handler)
+
+
 class AuntISARAApp(object):
-    def __init__(self, device_name, address, command_port=10000, status_port=1000, positions='positions'):
-        self.app_directory = os.getcwd()
-        self.ioc = AuntISARA(device_name, callbacks=self)
-        self.inbox = Queue()
-        self.outbox = Queue()
+    def __init__(
+            self, device_name, address, command_port=10000, status_port=1000, positions='positions',
+            directory=None, server=None, transport='twisted'
+    ):
+        """
+        :param device_name: device name prefix of the records
+        :param address: controller address
+        :param command_port: controller command port
+        :param status_port: controller status port
+        :param positions: name prefix of the positions file
+        :param directory: directory for positions and statistics files, defaults to the current directory
+        :param server: shared models.RecordServer when hosting several robots in one process
+        :param transport: controller link implementation, one of TRANSPORTS. The asyncio links run on their own
+            event loop thread and require Python 3.
+        """
+        self.app_directory = directory or os.getcwd()
+        self.logger = log.get_device_logger(device_name, __name__)
+        self.status_debug = log.get_debug_channel('status', device=device_name)
+        # record callbacks run in worker threads once the application is initialized, those checking and changing
+        # the mount state before sending commands are in the 'commands' group and run one at a time
+        self.executor = executor.CallbackExecutor(name=device_name)
+        self.ioc = AuntISARA(device_name, callbacks=self, server=server, executor=self.executor)
+        self.inbox = queue.Queue()
+        self.outbox = outbox.Outbox(self.transmit, logger=self.logger)
         self.send_on = False
         self.recv_on = False
         self.user_enabled = False
         self.ready = False
         self.standby_active = False
-        self.dewar_pucks = set()
-        self.command_client = isara.CommandFactory(self)
-        self.status_client = isara.StatusFactory(self)
-        self.pending_clients = {self.command_client.protocol.message_type, self.status_client.protocol.message_type}
-
-        reactor.connectTCP(address, status_port, self.status_client)
-        reactor.connectTCP(address, command_port, self.command_client)
+        self.inventory = inventory.Inventory(NUM_PUCKS, NUM_PUCK_SAMPLES, NUM_PLATES)
+        self.mount_queue = mountqueue.MountQueue()
+        self.throughput = mountqueue.Throughput()
+        self.timer = timing.OperationTimer(os.path.join(self.app_directory, 'timing.json'))
+        self.waits = timing.WaitAccounting(self.timer)
+        self.motion = motion.PoseHistory(size=POSE_HISTORY)
+        self.archive = archive.StatusArchive(
+            os.path.join(self.app_directory, 'archive'), STATUS_CONTEXTS, STATE_FIELDS, logger=self.logger
+        )
+        self.recorder = recorder.FlightRecorder(
+            os.path.join(self.app_directory, 'flight'), self.archive.dtype, callback=self.flight_recorded,
+            logger=self.logger
+        )
+        self.scheduler = scheduler.SoakScheduler()
+        self.schedule_loop = task.LoopingCall(self.check_schedule)
+        self.schedule_loop.start(1.0, now=False)
+        self.watchdog = watchdog.LinkWatchdog()
+        self.last_inputs = ''
+        self.last_outputs = ''
+        self.transport = transport
+        self.loop = None
+        self.connect_links(address, command_port, status_port)
 
         # status pvs and conversion types
         # maps status position to record, converter pairs
@@ -416,6 +654,18 @@ class AuntISARAApp(object):
         self.positions_name = positions
         self.positions = self.load_positions()
         self.status_received = None
+        self.status_event = Event()
+
+        # records refreshed by the status link, flagged invalid while the link is down
+        self.link_records = [record for record, converter in self.status_map.values()] + self.position_map + [
+            self.ioc.status, self.ioc.health, self.ioc.error_fbk, self.ioc.pose_vec_fbk, self.ioc.state_vec_fbk,
+        ] + self.ioc.inputs_fbk + self.ioc.outputs_fbk
+        self.link_records += list(self.input_map.values()) + list(self.rev_input_map.values()) + list(self.output_map.values())
+        for record in self.link_records:
+            record.field('UDF')
+            record.field('PROC')
+        self.records_invalid = True
+        self.executor.start()
 
     def load_positions(self):
         """
@@ -428,7 +678,7 @@ class AuntISARAApp(object):
             data_files.sort(key=lambda x: -os.path.getmtime(x))
             latest = data_files[0]
 
-            logger.info('Using Position File: {}'.format(latest))
+            self.logger.info('Using Position File: {}'.format(latest))
             with open(latest, 'r') as fobj:
                 positions = json.load(fobj)
             return positions
@@ -438,7 +688,7 @@ class AuntISARAApp(object):
         Save current positions to a file. If previous file was older than today, create a new one with todays's date
         as a suffix.
         """
-        logger.debug('Saving positions ...')
+        self.logger.debug('Saving positions ...')
         positions_file = '{}-{}.dat'.format(self.positions_name, datetime.today().strftime('%Y%m%d'))
         with open(os.path.join(self.app_directory, positions_file), 'w') as fobj:
             json.dump(self.positions, fobj, indent=2)
@@ -454,14 +704,18 @@ class AuntISARAApp(object):
         self.send_on = True
         epics.threads_init()
         while self.send_on:
-            command = self.outbox.get()
-            logger.debug('< {}'.format(command))
-            try:
-                self.command_client.send_message(command)
-            except Exception as e:
-                logger.error('{}: {}'.format(command, e))
+            self.outbox.send_next(timeout=STATUS_TIME)
             time.sleep(0)
 
+    def transmit(self, command):
+        """
+        Write a command to the command link. Called by the outbox from the sender thread, or directly for safety
+        commands.
+        """
+        self.logger.debug('< %s', command)
+        self.recorder.add_command(command)
+        self.command_client.send_message(command)
+
     def receiver(self):
         """
         Main method which receives messages from the robot from the inbox queue. Messages from the robot are placed in
@@ -474,11 +728,11 @@ class AuntISARAApp(object):
             message, message_type = self.inbox.get()
             if message_type == isara.MessageType.RESPONSE:
                 self.ioc.warning.put('')  # clear warning if command is successful
-                logger.debug('> {}'.format(message))
+                self.logger.debug('> %s', message)
             try:
                 self.process_message(message, message_type)
             except Exception as e:
-                logger.error('{}: {}'.format(message, e))
+                self.logger.error('{}: {}'.format(message, e))
             time.sleep(0)
 
     def status_monitor(self):
@@ -490,10 +744,22 @@ class AuntISARAApp(object):
         self.recv_on = True
         cmd_index = 0
         #ORG commands = ['state', 'di', 'di2', 'do', 'position', 'message']
-        commands = ['state', 'di', 'do', 'position', 'message']
+        commands = STATUS_CONTEXTS
+        heartbeat = 0
+        self.watchdog.reset()
+
+        # refresh all records before declaring the controller connected
+        while self.recv_on and not self.resync():
+            if self.watchdog.check():
+                self.link_stale()
+                return
+        if not self.recv_on:
+            return
+
         while self.recv_on:
             self.status_received = None
             cmd = commands[cmd_index]
+            self.watchdog.query_sent()
             self.status_client.send_message(cmd)
             cmd_index = (cmd_index + 1) % len(commands)
             timeout = 10 * STATUS_TIME
@@ -501,11 +767,93 @@ class AuntISARAApp(object):
                 time.sleep(STATUS_TIME)
                 timeout -= STATUS_TIME
 
+            if self.watchdog.check():
+                self.link_stale()
+                break
+            elif cmd_index == 0:
+                heartbeat = 1 - heartbeat
+                self.ioc.heartbeat.put(heartbeat)
+                self.publish_link()
+
+    def resync(self):
+        """
+        Query all status contexts back to back, without the polling interval, and mark the controller connected
+        once every context has been refreshed. Replies are awaited one at a time so that each context is known to be
+        processed before the next query.
+
+        :return: True if all contexts were refreshed
+        """
+        start = time.time()
+        for cmd in STATUS_CONTEXTS:
+            if not (self.recv_on and self.query_status(cmd)):
+                self.logger.warning('Resync incomplete, no reply to "%s"', cmd)
+                return False
+
+        self.ioc.resync_time_fbk.put(1000 * (time.time() - start))
+        self.ready = True
+        self.records_invalid = False
+        self.publish_timing()
+        self.publish_link()
+        self.ioc.link_stale_fbk.put(0)
+        self.ioc.connected.put(1)
+        self.logger.warn('Controller ready!')
+        return True
+
+    def query_status(self, cmd, timeout=10 * STATUS_TIME):
+        """
+        Send a status query and wait until the reply has been processed and the records updated
+
+        :param cmd: status context
+        :param timeout: maximum time to wait in seconds
+        :return: True if the reply was received
+        """
+        self.status_received = None
+        self.status_event.clear()
+        self.watchdog.query_sent()
+        self.status_client.send_message(cmd)
+        end_time = time.time() + timeout
+        while True:
+            remaining = end_time - time.time()
+            if remaining <= 0 or not self.status_event.wait(remaining):
+                return False
+            self.status_event.clear()
+            if self.status_received == cmd:
+                return True
+
+    def link_stale(self):
+        self.logger.error('No reply from controller for %0.1f s, reconnecting ...', self.watchdog.silence())
+        self.ioc.link_stale_fbk.put(1)
+        self.ioc.link_drops_fbk.put(self.watchdog.drops)
+        reactor.callFromThread(self.drop_links)
+
+    def invalidate_records(self):
+        """
+        Flag all records refreshed by the status link as invalid until fresh data arrives
+        """
+        if not self.records_invalid:
+            self.records_invalid = True
+            for record in self.link_records:
+                record.invalidate()
+
+    def publish_link(self):
+        self.ioc.rtt_fbk.put(1000 * self.watchdog.rtt)
+        self.ioc.rtt_avg_fbk.put(1000 * self.watchdog.average)
+        self.ioc.rtt_dev_fbk.put(1000 * self.watchdog.deviation)
+
+    def drop_links(self):
+        """
+        Drop both controller connections. The clients reconnect automatically. Must be called in the reactor thread.
+        """
+        self.status_client.drop()
+        self.command_client.drop()
+
     def disconnect(self, client_type):
         self.pending_clients.add(client_type)
         self.recv_on = False
         self.send_on = False
+        self.ready = False
         self.ioc.connected.put(0)
+        self.invalidate_records()
 
     def connect(self, client_type):
         self.pending_clients.remove(client_type)
@@ -513,7 +861,7 @@ class AuntISARAApp(object):
         # all clients connected
         if not self.pending_clients:
             self.inbox.queue.clear()
-            self.outbox.queue.clear()
+            self.outbox.clear()
             send_thread = Thread(target=self.sender)
             recv_thread = Thread(target=self.receiver)
             status_thread = Thread(target=self.status_monitor)
@@ -523,16 +871,48 @@ class AuntISARAApp(object):
             send_thread.start()
             recv_thread.start()
             status_thread.start()
-            self.ready = True
-            self.ioc.connected.put(1)
-            logger.warn('Controller ready!')
         else:
             self.ready = False
 
+    def connect_links(self, address, command_port, status_port):
+        """
+        Create the command and status links with the selected transport and start connecting
+        """
+        if self.transport == 'asyncio':
+            import asyncio
+            from . import aio
+            self.loop = asyncio.new_event_loop()
+            loop_thread = Thread(target=self.loop.run_forever, name='{}-links'.format(self.ioc.device_name))
+            loop_thread.setDaemon(True)
+            loop_thread.start()
+            self.command_client = aio.CommandClient(self, loop=self.loop)
+            self.status_client = aio.StatusClient(self, loop=self.loop)
+        elif self.transport == 'twisted':
+            self.command_client = isara.CommandFactory(self)
+            self.status_client = isara.StatusFactory(self)
+        else:
+            raise ValueError('Unknown transport "{}", expected one of {}'.format(self.transport, TRANSPORTS))
+        self.pending_clients = {self.command_client.protocol.message_type, self.status_client.protocol.message_type}
+
+        if self.loop:
+            self.status_client.start(address, status_port)
+            self.command_client.start(address, command_port)
+        else:
+            reactor.connectTCP(address, status_port, self.status_client)
+            reactor.connectTCP(address, command_port, self.command_client)
+
     def shutdown(self):
-        logger.warn('Shutting down ...')
+        self.logger.warn('Shutting down ...')
         self.recv_on = False
         self.send_on = False
+        if self.loop:
+            self.status_client.stop()
+            self.command_client.stop()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.stop()
+        self.executor.report()
+        self.outbox.report()
+        self.archive.close()
         self.ioc.shutdown()
 
     def wait_for_position(self, *positions):
@@ -543,7 +923,7 @@ class AuntISARAApp(object):
         if timeout > 0:
             return True
         else:
-            logger.warn('Timeout waiting for positions "{}"'.format(states))
+            self.logger.warn('Timeout waiting for positions "{}"'.format(states))
             return False
 
     def wait_for_state(self, *states):
@@ -555,7 +935,7 @@ class AuntISARAApp(object):
         if timeout > 0:
             return True
         else:
-            logger.warn('Timeout waiting for states "{}"'.format(states))
+            self.logger.warn('Timeout waiting for states "{}"'.format(states))
             return False
 
     def wait_in_state(self, state):
@@ -566,57 +946,76 @@ class AuntISARAApp(object):
         if timeout > 0:
             return True
         else:
-            logger.warn('Timeout in state "{}"'.format(state))
+            self.logger.warn('Timeout in state "{}"'.format(state))
             return False
 
-    @staticmethod
-    #ORG def make_args(tool=0, puck=0, sample=0, puck_type=PuckType.UNIPUCK.value, x_off=0, y_off=0, z_off=0, **kwargs):
-    #ORG     return (tool, puck, sample) + (0,) * 4 + (puck_type, 0, 0) + (x_off, y_off, z_off)
-    def make_args(tool=0, puck=0, sample=0, datamatrix_scan=0, next_puck=0, next_sample=0, sample_type=SampleType.SPINE.value, next_sample_type=SampleType.SPINE.value, x_off=0, y_off=0, z_off=0, **kwargs):
-        return (tool, puck, sample) + (datamatrix_scan,) + (next_puck, next_sample) + (sample_type, next_sample_type, 0, 0) + (x_off, y_off, z_off)
+    make_args = staticmethod(make_args)
 
     def send_command(self, command, *args):
-        self.standby_active = False
-        if self.ready_for_commands():
-            if args:
-                cmd = '{}({})'.format(command, ','.join([str(arg) for arg in args]))
-            else:
-                cmd = command
-            self.outbox.put(cmd)
+        if args:
+            cmd = '{}({})'.format(command, ','.join([str(arg) for arg in args]))
+        else:
+            cmd = command
+        self.queue_command(cmd)
+
+    def execute_command(self, name, value=None):
+        """
+        Validate and send a command from the command table. The records are read once and the same values are used
+        for validating and encoding the command.
 
-    def send_traj_command(self, command, *args):
+        :param name: name of the command in the table
+        :param value: value of the record which triggered the command
+        """
+        state = commands.Snapshot(self.ioc, value)
+        try:
+            cmd = COMMANDS.prepare(name, state, positions=bool(self.positions))
+        except commands.Rejected as e:
+            self.warn(str(e))
+            if e.help:
+                self.ioc.help.put(e.help)
+        else:
+            self.queue_command(cmd)
+
+    def queue_command(self, cmd):
         self.standby_active = False
         if self.ready_for_commands():
-            if args:
-                #ORG cmd = '{}({})'.format(command, ','.join([str(arg) for arg in args]))
-                cmd = 'traj({},{})'.format(command, ','.join([str(arg) for arg in args]))
-            else:
-                cmd = command
             self.outbox.put(cmd)
+            self.timer.command_sent(cmd)
+            self.scheduler.activity()
 
     def receive_message(self, message, message_type):
+        self.recorder.add_frame(message_type.value, message)
+        if message_type == isara.MessageType.STATUS:
+            self.watchdog.reply_received()
         self.inbox.put((message, message_type))
 
     def process_message(self, message, message_type):
         if message_type == isara.MessageType.STATUS:
             # process state messages
-            self.parse_status(message)
+            try:
+                self.parse_status(message)
+            finally:
+                self.status_event.set()
         else:
             # process response messages
+            self.timer.command_ack(message)
             self.ioc.log.put(message)
 
     def parse_inputs(self, bitstring):
-        inputs = [self.ioc.input0_fbk, self.ioc.input1_fbk, self.ioc.input2_fbk, self.ioc.input3_fbk]
-
-        for pv, bits in zip(inputs, textwrap.wrap(bitstring, 16)):
-            pv.put(int(bits, 2))
+        words = [int(bits, 2) for bits in textwrap.wrap(bitstring, 16)][:len(self.ioc.inputs_fbk)]
+        for pv, word in zip(self.ioc.inputs_fbk, words):
+            pv.put(word)
+        self.record_status('di', 'di', words)
         for i, bit in enumerate(bitstring):
             if i in self.input_map:
                 self.input_map[i].put(int(bit))
             if i in self.rev_input_map:
                 self.rev_input_map[i].put((int(bit) + 1) % 2)
+        if self.last_inputs and bitstring[24] != self.last_inputs[24]:
+            self.waits.edge('di24', int(bitstring[24]))
+        self.last_inputs = bitstring
 
-        #REM logger.info('parse_inputs: bitstring={}'.format(map(int, bitstring[3:7])))
+        #REM self.logger.info('parse_inputs: bitstring={}'.format(map(int, bitstring[3:7])))
 
         # setup LN2 status & alarms
         hihi, hi, lo, lolo = map(int, bitstring[3:7])
@@ -632,14 +1031,25 @@ class AuntISARAApp(object):
             self.ioc.cryo_level.put(CryoLevel.NORMAL.value)
 
     def parse_outputs(self, bitstring):
-        outputs = [self.ioc.output0_fbk, self.ioc.output1_fbk, self.ioc.output2_fbk, self.ioc.output3_fbk]
-
-        for pv, bits in zip(outputs, textwrap.wrap(bitstring, 16)):
-            pv.put(int(bits, 2))
+        words = [int(bits, 2) for bits in textwrap.wrap(bitstring, 16)][:len(self.ioc.outputs_fbk)]
+        for pv, word in zip(self.ioc.outputs_fbk, words):
+            pv.put(word)
+        self.record_status('do', 'do', words)
         for i, bit in enumerate(bitstring):
             if i in self.output_map:
                 pv = self.output_map[i]
                 pv.put(int(bit))
+        if self.last_outputs and bitstring[26] != self.last_outputs[26]:
+            self.waits.edge('do26', int(bitstring[26]))
+        self.last_outputs = bitstring
+
+    def record_status(self, context, column, values):
+        self.archive.add(context, column, values)
+        self.recorder.add_state(self.archive.row)
+
+    def flight_recorded(self, path):
+        epics.threads_init()
+        self.ioc.flight_dump_fbk.put(path)
 
     def calc_position(self):
         self.standby_active = False
@@ -673,19 +1083,11 @@ class AuntISARAApp(object):
             self.ioc.help.put('Please move the robot manually and save positions named `{}`'.format(' | '.join(allowed)))
             return False
 
-        current = self.ioc.position_fbk.get()
-        for pos in allowed:
-            if re.match('^' + pos + '(?:_\w*)?$', current):
-                return True
+        if commands.position_pattern(*allowed).match(self.ioc.position_fbk.get()):
+            return True
         self.warn('Command allowed only from ` {} ` position'.format(' | '.join(allowed)))
         self.ioc.help.put('Please move the robot into the correct position and the re-issue the command')
 
-    def require_tool(self, *tools):
-        if self.ioc.tool_fbk.get() in [t.value for t in tools]:
-            return True
-        else:
-            self.warn('Invalid tool for command!')
-
     def warn(self, msg):
         self.ioc.warning.put('{} {}'.format(datetime.now().strftime('%b/%d %H:%M:%S'), msg))
 
@@ -694,24 +1096,38 @@ class AuntISARAApp(object):
         m = patt.match(message)
         next_status = None
         cur_status = self.ioc.status.get()
+        # records invalidated on disconnect must be written even if the controller state did not change
+        refresh = self.records_invalid
         if m:
             details = m.groupdict()
             #ADD
-            msg_size = details['msg'].index(')')
+            # the closing parenthesis is only captured when the frame carries its terminator
+            msg_size = details['msg'].find(')')
+            if msg_size < 0:
+                msg_size = len(details['msg'])
             self.status_received = details['context']
             if details['context'] == 'state':
-                my_msg = 'mydebug> {}:{}'.format(datetime.today().strftime('%Y%m%d'), details['msg'][0:msg_size-1])
-                print( my_msg )
-                for i, value in enumerate(details['msg'][0:msg_size-1].split(',')):
-                    #REM logger.info('parse_status: i= {}, value= {}'.format(i, value))
+                self.status_debug('state> %s', details['msg'][0:msg_size-1])
+                fields = details['msg'][0:msg_size-1].split(',')
+                # all fields as numbers, in one update with a single timestamp
+                vector = [float_or_nan(value) for value in fields[:STATE_FIELDS]]
+                vector += [numpy.nan] * (STATE_FIELDS - len(vector))
+                for i, value in enumerate(fields):
+                    #REM self.logger.info('parse_status: i= {}, value= {}'.format(i, value))
                     if i not in self.status_map: continue
                     record, converter = self.status_map[i]
                     try:
-                        record.put(converter(value))
+                        value = converter(value)
+                        record.put(value)
                     except ValueError:
-                        logger.warning('Unable to parse state: {}'.format(message))
+                        self.logger.warning('Unable to parse state: %s', message)
+                    else:
+                        if i < STATE_FIELDS and isinstance(value, (int, float)):
+                            vector[i] = value
+                self.ioc.state_vec_fbk.put(vector)
+                self.record_status('state', 'state', vector)
 
-                #REM logger.info('parse_status: matched fault_active= {}'.format(self.fault_active))
+                #REM self.logger.info('parse_status: matched fault_active= {}'.format(self.fault_active))
 
                 # determine robot state
                 if self.fault_active:
@@ -729,12 +1145,18 @@ class AuntISARAApp(object):
                 self.fault_active = False
 
             elif details['context'] == 'position':
+                pose = []
                 for i, value in enumerate(details['msg'][0:msg_size-1].split(',')):
                     try:
-                        self.position_map[i].put(float(value))
+                        pose.append(float(value))
+                        self.position_map[i].put(pose[-1])
                     except ValueError:
-                        logger.warning('Unable to parse position: {}'.format(message))
+                        self.logger.warning('Unable to parse position: %s', message)
                 self.calc_position()
+                if len(pose) == len(self.position_map):
+                    self.ioc.pose_vec_fbk.put(pose)
+                    self.record_status('position', 'pose', pose)
+                    self.update_motion(pose)
             #REM elif details['context'] == 'di2':
             #REM     # puck detection
             #REM     bitstring = details['msg'].replace(',', '')
@@ -758,43 +1180,50 @@ class AuntISARAApp(object):
                 bitstring = '11111111111111111111111111111'
                 bitstring = bitstring[0:29]
                 self.ioc.pucks_fbk.put(bitstring)
-                bit0, bit1 = textwrap.wrap(bitstring, 16)
-                self.ioc.pucks_bit0.put(int(bit0[::-1], 2))
-                self.ioc.pucks_bit1.put(int(bit1[::-1], 2))
+                mask = int(bitstring[::-1], 2)
+                self.ioc.pucks_bits[0].put(mask & 0xFFFF)
+                self.ioc.pucks_bits[1].put(mask >> 16)
             elif details['context'] == 'message':
-                self.ioc.log.put(details['msg'][0:msg_size-1])
+                self.ioc.log.put(details['msg'][0:msg_size-1], soft=True)
         else:
             # must be messages
             self.status_received = 'message'
+            bit = None
+            error = 0
+            health = None
             if message.strip():
                 warning, help, state, bit = msgs.parse_error(message.strip())
                 bitarray = list(bin(self.ioc.error_fbk.get())[2:].rjust(32, '0'))
                 if bit is not None:
                     bitarray[bit] = '1'
-                    new_value = int(''.join(bitarray), 2)
-                    if new_value != self.ioc.error_fbk.get():
-                        self.ioc.error_fbk.put(new_value)
+                    error = int(''.join(bitarray), 2)
+                    if refresh or error != self.ioc.error_fbk.get():
+                        self.ioc.error_fbk.put(error)
                     if state == StatusType.FAULT:
-                        self.ioc.health.put(ErrorType.ERROR.value)
+                        health = ErrorType.ERROR.value
                         self.fault_active = True
 
-                        #REM logger.info('parse_status: no matched fault_active= {}'.format(self.fault_active))
+                        #REM self.logger.info('parse_status: no matched fault_active= {}'.format(self.fault_active))
                 else:
                     self.ioc.error_fbk.put(0)
             else:
-                self.ioc.health.put(ErrorType.OK.value)
+                health = ErrorType.OK.value
                 self.ioc.error_fbk.put(0)
                 self.fault_active = False
 
-                #REM logger.info('parse_status: no matched fault_active= {}'.format(self.fault_active))
+                #REM self.logger.info('parse_status: no matched fault_active= {}'.format(self.fault_active))
 
-            msg_idx = message.strip().index('\0')
-            old_message = self.ioc.message.get() 
-            new_message = message.strip()[0:msg_idx]
-            if new_message != old_message:
-                self.ioc.message.put(new_message)
+            if health is None and refresh:
+                health = self.ioc.health.get()
+            if health is not None:
+                self.ioc.health.put(health)
+            # the row carries the error mask in effect after this message
+            self.record_status('message', 'error', error)
+            if self.waits.update(bit):
+                self.publish_timing()
+            self.ioc.message.put(message.strip().split('\0')[0], soft=True)
 
-        if next_status is not None and next_status != cur_status:
+        if next_status is not None and (refresh or next_status != cur_status):
             self.ioc.status.put(next_status)
 
     # def mount_operation(self, cmd, args):
@@ -838,7 +1267,13 @@ class AuntISARAApp(object):
     #         self.mounting = False
 
     # callbacks
+    @models.serial('commands')
     def do_mount_cmd(self, pv, value, ioc):
+        if value:
+            self.scheduler.mount_requested()
+        if value and self.scheduler.defer_mount():
+            self.warn('Mount deferred until scheduled {} completes'.format(self.scheduler.running))
+            return
         #TEST
         self.mounting = False
         if value and self.require_position('SOAK') and not self.mounting:
@@ -852,25 +1287,30 @@ class AuntISARAApp(object):
             params = port2args(port)
             #ADD
             next_params = port2args(next_port)
+            if next_params.get('mode') != 'puck' or not all(next_params.values()):
+                next_params = {'puck': 0, 'sample': 0}
             if params and all(params.values()):
                 if params['mode'] == 'puck':
                     ioc.tool_param.put(params['tool'])
                     ioc.puck_param.put(params['puck'])
                     ioc.sample_param.put(params['sample'])
-                    #ADD
-                    #ioc.next_puck.put(next_params['puck'])
-                    #ioc.next_sample.put(next_params['sample'])
+                    # pre-pick the following sample with the second jaw during the exchange
+                    ioc.next_puck.put(next_params['puck'])
+                    ioc.next_sample.put(next_params['sample'])
                 elif params['mode'] == 'plate':
                     ioc.tool_param.put(params['tool'])
                     ioc.plate_param.put(params['plate'])
-                    #ADD
-                    #ioc.next_puck.put(next_params['puck'])
-                    #ioc.next_sample.put(next_params['sample'])
+                    ioc.next_puck.put(0)
+                    ioc.next_sample.put(0)
                 else:
                     self.warn('Invalid Port parameters for mounting: {}'.format(params))
                     self.mounting = False
                     return
 
+                # a mount is pipelined if the sample was pre-picked with the second jaw during the previous exchange
+                target = pin2port(params['puck'], params['sample']) if params['mode'] == 'puck' else port
+                prepicked = pin2port(ioc.puck_toolb_fbk.get(), ioc.sample_toolb_fbk.get())
+                self.throughput.start(target, pipelined=(params['mode'] == 'puck' and target == prepicked))
                 if command == 'put':
                     self.ioc.put_cmd.put(1)
                 elif command == 'getput':
@@ -878,7 +1318,11 @@ class AuntISARAApp(object):
             else:
                 self.warn('Invalid Port for mounting: {}'.format(port))
                 self.mounting = False
+        if value and not self.mounting:
+            self.mount_queue.cancel()
+            self.publish_queue()
 
+    @models.serial('commands')
     def do_dismount_cmd(self, pv, value, ioc):
         if value and self.require_position('SOAK') and not self.mounting:
             self.mounting = True
@@ -892,31 +1336,39 @@ class AuntISARAApp(object):
                 self.warn('Invalid port or sample not mounted')
                 self.mounting = False
 
+    @models.serial('commands')
     def do_power_cmd(self, pv, value, ioc):
         if value:
             cmd = 'off' if ioc.power_fbk.get() else 'on'
             self.send_command(cmd)
 
     #ADD
+    @models.serial('commands')
     def do_reboot_cmd(self, pv, value, ioc):
         if value:
             cmd = 'resetprogram'
             self.send_command(cmd)
 
+    @models.inline
     def do_panic_cmd(self, pv, value, ioc):
         if value:
             self.send_command('panic')
 
+    @models.inline
     def do_abort_cmd(self, pv, value, ioc):
         if value:
             self.send_command('abort')
             self.aborted = True
             self.mounting = False
+            self.mount_queue.cancel()
+            self.publish_queue()
 
+    @models.inline
     def do_pause_cmd(self, pv, value, ioc):
         if value:
             self.send_command('pause')
 
+    @models.serial('commands')
     def do_reset_cmd(self, pv, value, ioc):
         if value:
             self.send_command('reset')
@@ -925,319 +1377,184 @@ class AuntISARAApp(object):
             self.ioc.warning.put('')
             self.mounting = False
 
-    def do_restart_cmd(self, pv, value, ioc):
-        if value:
-            self.send_command('restart')
-
-    def do_clear_barcode_cmd(self, pv, value, ioc):
-        if value:
-            self.send_command('clearbcrd')
-
+    # commands from the command table
+    do_restart_cmd = command_handler('restart')
+    do_clear_barcode_cmd = command_handler('clearbcrd')
+    do_faster_cmd = command_handler('speedup')
+    do_slower_cmd = command_handler('speeddown')
+    do_home_cmd = command_handler('home')
+    do_recover_cmd = command_handler('recover')
+    do_change_tool_cmd = command_handler('changetool')
+    do_safe_cmd = command_handler('safe')
+    do_put_cmd = command_handler('put')
+    do_get_cmd = command_handler('get')
+    do_getput_cmd = command_handler('getput')
+    do_barcode_cmd = command_handler('datamatrix')
+    do_back_cmd = command_handler('back')
+    do_soak_cmd = command_handler('soak')
+    do_dry_cmd = command_handler('dry')
+    do_pick_cmd = command_handler('pick')
+    do_calib_cmd = command_handler('toolcal')
+    do_teach_gonio_cmd = command_handler('teachgonio')
+    do_teach_puck_cmd = command_handler('teachpuck')
+    do_teach_dewar_cmd = command_handler('teachdewar')
+    do_set_diff_cmd = command_handler('setdiffr')
+    do_set_tool_cmd = command_handler('settool')
+    do_set_toolb_cmd = command_handler('settool2')
+    do_set_maxsoaktime = command_handler('setmaxsoaktime')
+    do_set_maxsoaknb = command_handler('setmaxsoaknb')
+    do_set_autocloselidtimer = command_handler('setautocloselidtimer')
+    do_set_autodrytimer = command_handler('setautodrytimer')
+    do_set_highln2 = command_handler('sethighln2')
+    do_set_lowln2 = command_handler('setlowln2')
+    do_clear_cmd = command_handler('clearmemory')
+    do_reset_params = command_handler('reset parameters')
+    do_reset_motion = command_handler('resetMotion')
+
+    @models.serial('commands')
     def do_lid_cmd(self, pv, value, ioc):
         if value:
             self.send_command('openlid')
         else:
             self.send_command('closelid')
 
+    @models.serial('commands')
     def do_tool_cmd(self, pv, value, ioc):
         if value:
             self.send_command('opentool')
         else:
             self.send_command('closetool')
 
+    @models.serial('commands')
     def do_toolb_cmd(self, pv, value, ioc):
         if value:
             self.send_command('opentoolb')
         else:
             self.send_command('closetoolb')
 
-    def do_faster_cmd(self, pv, value, ioc):
-        if value:
-            self.send_command('speedup')
-
-    def do_slower_cmd(self, pv, value, ioc):
-        if value:
-            self.send_command('speeddown')
-
+    @models.serial('commands')
     def do_magnet_enable(self, pv, value, ioc):
         if value:
             cmd = 'magnetoff' if ioc.magnet_fbk.get() else 'magneton'
             self.send_command(cmd)
 
+    @models.serial('commands')
     def do_heater_enable(self, pv, value, ioc):
         if value:
             cmd = 'heateroff' if ioc.heater_fbk.get() else 'heateron'
             self.send_command(cmd)
 
+    @models.serial('commands')
     def do_speed_enable(self, pv, value, ioc):
         if value:
             st, cmd = (0, 'remotespeedoff') if ioc.remote_speed_fbk.get() else (1, 'remotespeedon')
             self.send_command(cmd)
             ioc.remote_speed_fbk.put(st)
 
+    @models.serial('commands')
     def do_approach_enable(self, pv, value, ioc):
         if value:
             cmd = 'cryoOFF' if ioc.approach_fbk.get() else 'cryoON'
             self.send_command(cmd, ioc.tool_fbk.get())
 
+    @models.serial('commands')
     def do_running_enable(self, pv, value, ioc):
         if value:
             cmd = 'trajOFF' if ioc.running_fbk.get() else 'trajON'
             self.send_command(cmd, ioc.tool_fbk.get())
 
+    @models.serial('commands')
     def do_autofill_enable(self, pv, value, ioc):
         if value:
             cmd = 'reguloff' if ioc.autofill_fbk.get() else 'regulon'
             self.send_command(cmd)
 
-    def do_home_cmd(self, pv, value, ioc):
-        if value and self.require_position('SOAK', 'HOME', 'Undefined'):
-            #ORG self.send_command('home', ioc.tool_fbk.get())
-            self.send_traj_command('home', ioc.tool_fbk.get())
+    def publish_inventory(self):
+        if self.inventory.dirty:
+            self.ioc.occupancy_fbk.put(self.inventory.get_occupancy())
 
-    #ADD
-    def do_recover_cmd(self, pv, value, ioc):
-        self.send_traj_command('recover', ioc.tool_fbk.get())
-
-    def do_change_tool_cmd(self, pv, value, ioc):
-        if value and self.require_position('HOME'):
-            if ioc.tool_param.get() != ioc.tool_fbk.get():
-                #ORG self.send_command('home', ioc.tool_fbk.get())
-                self.send_traj_command('changetool', ioc.tool_param.get())
-            else:
-                self.warn('Requested tool already present, command ignored')
+    def publish_queue(self):
+        self.ioc.queue_fbk.put(self.mount_queue.text())
+        self.ioc.queue_count_fbk.put(len(self.mount_queue))
+        self.ioc.queue_done_fbk.put(self.mount_queue.completed)
+        self.ioc.queue_active_fbk.put(self.mount_queue.active or '')
 
-    def do_safe_cmd(self, pv, value, ioc):
+    @models.serial('commands')
+    def do_queue_add_cmd(self, pv, value, ioc):
         if value:
-            self.send_command('safe', ioc.tool_fbk.get())
-
-    def do_put_cmd(self, pv, value, ioc):
-        allowed_tools = (ToolType.UNIPUCK, ToolType.ROTATING, ToolType.DOUBLE, ToolType.PLATE)
-        if value and self.require_position('SOAK') and self.require_tool(*allowed_tools):
-            if self.ioc.tool_fbk.get() in [ToolType.UNIPUCK.value, ToolType.ROTATING.value, ToolType.DOUBLE.value]:
-                args = self.make_args(
-                    tool=ioc.tool_param.get(), puck=ioc.puck_param.get(), sample=ioc.sample_param.get(),
-                    datamatrix_scan=ioc.datamatrix_scan.get(),
-                    #ADD
-                    next_puck=ioc.next_puck.get(), next_sample=ioc.next_sample.get(),
-                    #ORG puck_type=ioc.type_param.get()
-                    sample_type=ioc.sample_type.get(), next_sample_type=ioc.next_sample_type.get()
-                )
-                #ORG cmd = 'put_bcrd' if ioc.barcode_param.get() else 'put'
-                cmd = 'put'
-            else:
-                args = (
-                    #ORG ToolType.PLATE.value, 0, 0, 0, 0, ioc.plate_param.get()
-                    ioc.tool_param.get(), ioc.plate_param.get()
-                )
-                #ORG cmd = 'putplate'
-                cmd = 'putplate'
-            #ORG self.send_command(cmd, *args)
-            self.send_traj_command(cmd, *args)
-
-    def do_get_cmd(self, pv, value, ioc):
-        allowed_tools = (ToolType.UNIPUCK, ToolType.ROTATING, ToolType.DOUBLE, ToolType.PLATE)
-        if value and self.require_position('SOAK') and self.require_tool(*allowed_tools):
-            if self.ioc.tool_fbk.get() in [ToolType.UNIPUCK.value, ToolType.ROTATING.value, ToolType.DOUBLE.value]:
-                #ADD
-                args = self.make_args(
-                    tool=ioc.tool_param.get(), puck=0, sample=0,
-                    datamatrix_scan=ioc.datamatrix_scan.get(),
-                    #ADD
-                    next_puck=0, next_sample=0,
-                    #ORG puck_type=ioc.type_param.get()
-                    sample_type=0, next_sample_type=0
-                )
-                #ORG cmd = 'get'
-                cmd = 'get'
-            else:
-                #ADD
-                args = (
-                    ioc.tool_param.get(),
-                )
-                #ORG cmd = 'getplate'
-                cmd = 'getplate'
-            #ORG self.send_command(cmd, ioc.tool_param.get())
-            self.send_traj_command(cmd, *args)
-
-    def do_getput_cmd(self, pv, value, ioc):
-        allowed_tools = (ToolType.UNIPUCK, ToolType.ROTATING, ToolType.DOUBLE, ToolType.PLATE)
-        if value and self.require_position('SOAK') and self.require_tool(*allowed_tools):
-
-            if self.ioc.tool_fbk.get() in [ToolType.UNIPUCK.value, ToolType.ROTATING.value, ToolType.DOUBLE.value]:
-                #ORG cmd = 'getput_bcrd' if ioc.barcode_param.get() else 'getput'
-                cmd = 'getput'
-                args = self.make_args(
-                    tool=ioc.tool_param.get(), puck=ioc.puck_param.get(), sample=ioc.sample_param.get(),
-                    datamatrix_scan=ioc.datamatrix_scan.get(),
-                    #ADD
-                    next_puck=ioc.next_puck.get(), next_sample=ioc.next_sample.get(),
-                    #ORG puck_type=ioc.type_param.get()
-                    sample_type=ioc.sample_type.get(), next_sample_type=ioc.next_sample_type.get()
-                )
-            else:
-                #ADD
-                args = (
-                    ioc.tool_param.get(),
-                )
-                #ORG cmd = 'getplate'
-                cmd = 'getplate'
-            #ORG self.send_command(cmd, *args)
-            self.send_traj_command(cmd, *args)
-
-    def do_barcode_cmd(self, pv, value, ioc):
-        if value and self.require_position('SOAK'):
-            args = (
-                ioc.tool_param.get(), ioc.puck_param.get(), ioc.sample_param.get(),
-                0, 0, 0, ioc.sample_type.get()
-            )
-            cmd = 'datamatrix'
-            #ORG self.send_command('barcode', *args)
-            self.send_traj_command(cmd, *args)
-
-    def do_back_cmd(self, pv, value, ioc):
-        if value and self.require_position('SOAK'):
-            if ioc.tooled_fbk.get():
-                #ORG self.send_command('back', ioc.tool_fbk.get())
-                self.send_traj_command('back', ioc.tool_fbk.get())
-            else:
-                self.warn('No sample on tool, command ignored')
-
-    def do_soak_cmd(self, pv, value, ioc):
-        allowed = (ToolType.DOUBLE, ToolType.UNIPUCK, ToolType.ROTATING)
-        if value and self.require_position('HOME') and self.require_tool(*allowed):
-            #ORG self.send_command('soak', ioc.tool_fbk.get())
-            self.send_traj_command('soak', ioc.tool_fbk.get())
-
-    def do_dry_cmd(self, pv, value, ioc):
-        allowed = (ToolType.DOUBLE, ToolType.UNIPUCK, ToolType.ROTATING)
-        if value and self.require_position('SOAK', 'HOME') and self.require_tool(*allowed):
-            #ORG self.send_command('dry', ioc.tool_fbk.get())
-            self.send_traj_command('dry', ioc.tool_fbk.get())
-
-    def do_pick_cmd(self, pv, value, ioc):
-        if value and self.require_tool(ToolType.DOUBLE):
-            args = (
-                ioc.tool_param.get(), ioc.puck_param.get(), ioc.sample_param.get(),
-                ioc.datamatrix_scan.get(), 0, 0, ioc.sample_type.get()
-            )
-            #ORG self.send_command('pick', *args)
-            self.send_traj_command('pick', *args)
-
-    def do_calib_cmd(self, pv, value, ioc):
-        if value and self.require_position('HOME') and (self.require_tool(ToolType.LASER) or self.require_tool(ToolType.DOUBLE)):
-            #ORG self.send_command('toolcal', ioc.tool_fbk.get())
-            self.send_traj_command('toolcal', ioc.tool_fbk.get())
-
-    def do_teach_gonio_cmd(self, pv, value, ioc):
-        if value and self.require_position('HOME') and self.require_tool(ToolType.LASER):
-            #ORG self.send_command('teach_gonio', ToolType.LASER.value)
-            self.send_traj_command('teachgonio', ToolType.LASER.value)
-
-    def do_teach_puck_cmd(self, pv, value, ioc):
-        if value and self.require_tool(ToolType.LASER) and self.require_position('HOME'):
-            if ioc.puck_param.get():
-                #ORG self.send_command('teach_puck', ToolType.LASER.value, ioc.puck_param.get())
-                self.send_traj_command('teachpuck', ToolType.LASER.value, ioc.puck_param.get())
-            else:
-                self.warn('Please select a puck number')
-
-    #ADD
-    def do_teach_dewar_cmd(self, pv, value, ioc):
-        if value and self.require_tool(ToolType.LASER) and self.require_position('HOME'):
-            #ORG self.send_traj_command('teachdewar', ToolType.LASER.value)
-            self.send_traj_command('teachdewar', ToolType.LASER.value, ioc.puck_param.get())
-
-    def do_set_diff_cmd(self, pv, value, ioc):
-        if value:
-            current = ioc.next_param.get()
-            if current.strip():
-                params = port2args(current)
-                #ORG self.send_command('settool', params['puck'], params['sample'], ioc.puck_param.get())
-                self.send_command('setdiffr', params['puck'], params['sample'], ioc.sample_type.get())
+            port = ioc.queue_port.get().strip()
+            params = port2args(port)
+            if params.get('mode') == 'puck' and all(params.values()):
+                self.mount_queue.add(pin2port(params['puck'], params['sample']))
+                ioc.queue_port.put('')
+                self.publish_queue()
             else:
-                self.warn('No Sample specified')
+                self.warn('Invalid Port for queue: {}'.format(port))
 
-    def do_set_tool_cmd(self, pv, value, ioc):
+    @models.serial('commands')
+    def do_queue_clear_cmd(self, pv, value, ioc):
         if value:
-            current = ioc.next_param.get()
-            if current.strip() and self.require_tool(ToolType.DOUBLE):
-                params = port2args(current)
-                #ORG self.send_command('settool', params['puck'], params['sample'], ioc.puck_param.get())
-                self.send_command('settool', params['puck'], params['sample'], ioc.sample_type.get(), ioc.jaw_param.get())
-            else:
-                self.warn('No Sample specified')
-
-    def do_set_toolb_cmd(self, pv, value, ioc):
-        if value and self.require_tool(ToolType.DOUBLE):
-            current = ioc.next_param.get()
-            if current.strip():
-                params = port2args(current)
-                self.send_command('settool2', params['puck'], params['sample'], ioc.sample_type.get())
-            else:
-                self.warn('No Sample specified')
+            self.mount_queue.clear()
+            self.publish_queue()
 
-    #ADD
-    def do_set_maxsoaktime(self, pv, value, ioc):
-        if value:
-            self.send_command('setmaxsoaktime', value)
-    def do_set_maxsoaknb(self, pv, value, ioc):
+    @models.serial('commands')
+    def do_queue_next_cmd(self, pv, value, ioc):
         if value:
-            self.send_command('setmaxsoaknb', value)
-    def do_set_autocloselidtimer(self, pv, value, ioc):
-        if value:
-            self.send_command('setautocloselidtimer', value)
-    def do_set_autodrytimer(self, pv, value, ioc):
-        if value:
-            self.send_command('setautodrytimer', value)
-    def do_set_highln2(self, pv, value, ioc):
-        if value:
-            self.send_command('sethighln2', value)
-    def do_set_lowln2(self, pv, value, ioc):
-        if value:
-            self.send_command('setlowln2', value)
-
-    def do_clear_cmd(self, pv, value, ioc):
-        if value:
-            #ORG self.send_command('clear memory')
-            self.send_command('clearmemory')
-
-    def do_reset_params(self, pv, value, ioc):
-        if value:
-            self.send_command('reset parameters')
-
-    def do_reset_motion(self, pv, value, ioc):
-        if value:
-            self.send_command('resetMotion')
-
+            port, next_port = self.mount_queue.start()
+            if port is None:
+                self.warn('Queue is empty or a queued mount is in progress')
+                return
+            ioc.next_param.put(port)
+            ioc.next_after_param.put(next_port)
+            self.publish_queue()
+            ioc.mount_cmd.put(1)
+
+    @models.serial('commands')
     def do_sample_diff_fbk(self, pv, value, ioc):
         port = pin2port(ioc.puck_diff_fbk.get(), value)
         ioc.mounted_fbk.put(port)
         ioc.next_param.put('')
+        if port and self.throughput.stop(port):
+            ioc.pipelined_rate_fbk.put(self.throughput.rate(True))
+            ioc.single_rate_fbk.put(self.throughput.rate(False))
+        if port and self.mount_queue.complete(port):
+            self.publish_queue()
+        if self.inventory.set_location('gonio', ioc.puck_diff_fbk.get(), value):
+            self.publish_inventory()
 
     def do_plate_fbk(self, pv, value, ioc):
         if value:
             port = plate2port(value)
             ioc.tooled_fbk.put(port)
+        if self.inventory.set_plate(value):
+            self.publish_inventory()
 
+    @models.serial('commands')
     def do_pucks_fbk(self, pv, value, ioc):
         if len(value) != NUM_PUCKS:
-            logger.error('Puck Detection does not contain {} values!'.format(NUM_PUCKS))
+            self.logger.error('Puck Detection does not contain {} values!'.format(NUM_PUCKS))
         else:
-            pucks_detected = {v[1] for v in zip(value, PUCK_LIST) if v[0] == '1'}
-            added = pucks_detected - self.dewar_pucks
-            removed = self.dewar_pucks - pucks_detected
-            self.dewar_pucks = pucks_detected
-            logger.info('Pucks changed: added={}, removed={}'.format(list(added), list(removed)))
+            added_mask, removed_mask = self.inventory.update_pucks(int(value[::-1], 2))
+            if not (added_mask or removed_mask):
+                return
+            added = inventory.mask_names(added_mask, PUCK_LIST)
+            removed = inventory.mask_names(removed_mask, PUCK_LIST)
+            self.logger.info('Pucks changed: added={}, removed={}'.format(list(added), list(removed)))
+            self.publish_inventory()
 
             # If currently mounting a puck and it is removed abort
             on_tool = ioc.tooled_fbk.get().strip()
             if on_tool and on_tool[:2] in removed and ioc.status.get() in [StatusType.BUSY.value]:
                 msg = 'Target puck removed while mounting. Aborting! Manual recovery required.'
-                logger.error(msg)
+                self.logger.error(msg)
                 self.warn(msg)
                 self.send_command('abort')
 
+    @models.inline
+    def do_debug_param(self, pv, value, ioc):
+        self.status_debug.enabled = bool(value)
+
+    @models.serial('commands')
     def do_save_pos_cmd(self, pv, value, ioc):
         if value and ioc.pos_name.get().strip():
             pos_name = ioc.pos_name.get().strip().replace(' ', '_')
@@ -1259,14 +1576,121 @@ class AuntISARAApp(object):
     def do_sample_tool_fbk(self, pv, value, ioc):
         port = pin2port(ioc.puck_tool_fbk.get(), value)
         ioc.tooled_fbk.put(port)
+        if self.inventory.set_location('tool', ioc.puck_tool_fbk.get(), value):
+            self.publish_inventory()
+
+    def do_sample_toolb_fbk(self, pv, value, ioc):
+        if self.inventory.set_location('toolb', ioc.puck_toolb_fbk.get(), value):
+            self.publish_inventory()
     
+    def publish_timing(self):
+        mean, p95, last = self.timer.statistics()
+        self.ioc.op_names_fbk.put(list(timing.OPERATIONS))
+        self.ioc.op_mean_fbk.put(mean)
+        self.ioc.op_p95_fbk.put(p95)
+        self.ioc.op_last_fbk.put(last)
+        self.ioc.op_path_fbk.put(self.timer.path_lengths())
+        totals, per_operation = self.waits.statistics()
+        self.ioc.wait_rdtrsf_fbk.put(totals['RdTrsf'])
+        self.ioc.wait_splon_fbk.put(totals['SplOn'])
+        self.ioc.op_wait_fbk.put(per_operation)
+        last = self.timer.last
+        if last:
+            self.ioc.op_phases_fbk.put(last.text())
+            if last.name in timing.MOUNT_OPERATIONS:
+                self.ioc.mount_rdtrsf_fbk.put(last.waits['RdTrsf'])
+                self.ioc.mount_splon_fbk.put(last.waits['SplOn'])
+                self.ioc.mount_wait_frac.put(last.wait_time() / max(last.duration(), 1e-3))
+
+    def update_motion(self, pose):
+        self.timer.add_path(self.motion.add(pose))
+        self.ioc.moving_fbk.put(int(self.motion.moving), soft=True)
+        self.ioc.motion_speed_fbk.put(self.motion.speed())
+        self.ioc.speed_hist_fbk.put(self.motion.speed_history())
+        times, poses = self.motion.latest()
+        self.ioc.pose_hist_fbk.put(poses.ravel())
+
+    def update_timing(self, method, value):
+        last = self.timer.last
+        method(value)
+        if self.timer.last is not last:
+            self.publish_timing()
+
+    def do_path_fbk(self, pv, value, ioc):
+        self.update_timing(self.timer.path_changed, value.strip())
+
+    def do_position_fbk(self, pv, value, ioc):
+        self.update_timing(self.timer.position_changed, value.strip())
+
+    @models.serial('commands')
     def do_status(self, pv, value, ioc):
+        if value == StatusType.FAULT.value and self.ready:
+            self.recorder.trigger('fault')
         if value == 0:
             if ioc.error_fbk.get():
                 ioc.reset_cmd.put(1)
             self.mounting = False
+        saved = self.timer.mean(self.scheduler.running)
+        self.update_timing(self.timer.status_changed, value)
+        if self.scheduler.status_changed(value, saved):
+            self.publish_schedule()
+        if self.scheduler.take_deferred():
+            ioc.mount_cmd.put(1)
+
+    def publish_schedule(self):
+        self.ioc.sched_action_fbk.put(self.scheduler.decision)
+        self.ioc.sched_count_fbk.put(self.scheduler.actions)
+        self.ioc.sched_saved_fbk.put(self.scheduler.saved)
+
+    def check_schedule(self):
+        if not self.ready_for_commands():
+            return
+        state = scheduler.SchedulerState(
+            status=self.ioc.status.get(), position=self.ioc.position_fbk.get(),
+            soak_count=self.ioc.soak_count_fbk.get(), max_soak_count=self.ioc.set_maxsoaknb.get(),
+            max_soak_time=self.ioc.set_maxsoaktime.get(), queued=len(self.mount_queue), mounting=self.mounting,
+            pending=bool(self.ioc.next_param.get().strip()), moving=self.motion.moving,
+        )
+        action, reason = self.scheduler.evaluate(state)
+        if action:
+            self.logger.info('Scheduled {}: {}'.format(action, reason))
+            self.scheduler.start(action, reason)
+            self.publish_schedule()
+            if action == 'dry':
+                self.ioc.dry_cmd.put(1)
+            elif action == 'soak':
+                self.ioc.soak_cmd.put(1)
+        elif self.scheduler.take_deferred():
+            self.ioc.mount_cmd.put(1)
+
+    @models.inline
+    def do_sched_enable(self, pv, value, ioc):
+        self.scheduler.enabled = bool(value)
+
+    @models.inline
+    def do_sched_idle_time(self, pv, value, ioc):
+        self.scheduler.idle_time = value
+
+    @models.inline
+    def do_stale_timeout(self, pv, value, ioc):
+        self.watchdog.stale_timeout = value
+
+    def do_health(self, pv, value, ioc):
+        if value == ErrorType.ERROR.value and self.ready:
+            self.recorder.trigger('health error')
+
+    def do_collision_ok(self, pv, value, ioc):
+        # the sensor reads bad until the inputs are first refreshed
+        if value == GoodBad.BAD.value and self.ready:
+            self.recorder.trigger('collision')
+
+    def do_soak_count_fbk(self, pv, value, ioc):
+        self.scheduler.update_soak_count(value)
+        ioc.sched_soaks_fbk.put(max(ioc.set_maxsoaknb.get() - value, 0))
 
     def do_error_fbk(self, pv, value, ioc):
+        # later rows carry the mask also when it is changed other than by a message, e.g. by a reset
+        self.archive.update('error', value)
         if value:
             bitarray = list(bin(value)[2:].rjust(32, '0'))
             errors = filter(None, [msgs.MESSAGES.get(i) for i, bit in enumerate(bitarray) if bit == '1'])
@@ -1,41 +1,35 @@
-import re
-from enum import Enum
 from softdev import log
 from twisted.internet import reactor, protocol
-from twisted.protocols.basic import LineReceiver
-
-logger = log.get_module_logger(__name__)
 
+from .msgs import MessageType, MessageFramer
 
-class MessageType(Enum):
-    RESPONSE, STATUS = range(2)
+logger = log.get_module_logger(__name__)
 
 
-class CommandProtocol(LineReceiver):
-    delimiter = '\0'
+class CommandProtocol(protocol.Protocol):
+    delimiter = b'\0'
     protocol_name = 'Command Link'
     message_type = MessageType.RESPONSE
 
     def __init__(self, factory):
         self.factory = factory
+        self.framer = MessageFramer(self.delimiter)
 
     def connectionMade(self):
         reactor.addSystemEventTrigger('before', 'shutdown', self.transport.abortConnection)
-        logger.warn('{} Connected!'.format(self.protocol_name))
+        self.factory.logger.warn('{} Connected!'.format(self.protocol_name))
 
     def connectionLost(self, reason=protocol.connectionDone):
-        logger.warning('{} Disconnected: {}'.format(self.protocol_name, reason.getErrorMessage()))
+        self.factory.logger.warning('{} Disconnected: {}'.format(self.protocol_name, reason.getErrorMessage()))
 
     def dataReceived(self, data):
-        self.receive_message(data.strip())
-
-    #REM def lineReceived(self, line):
-    #REM     print( 'Received>', line )
-    #REM     self.receive_message(line.strip())
+        # replies written back to back arrive in one chunk and are split by the framer
+        for message in self.framer.feed(data):
+            self.receive_message(message)
 
     def send_message(self, message):
         if self.transport:
-            self.sendLine('{}'.format(message))
+            self.transport.write('{}'.format(message).encode('latin-1') + self.delimiter)
 
     def receive_message(self, message):
         self.factory.receive_message(message, self.message_type)
@@ -49,13 +43,20 @@ class StatusProtocol(CommandProtocol):
 class CommandFactory(protocol.ReconnectingClientFactory):
     protocol = CommandProtocol
 
+    # retry quickly after a dropped link and back off with jitter while the controller remains unreachable
+    initialDelay = 0.5
+    factor = 1.6
+    jitter = 0.2
+    maxDelay = 30
+
     def __init__(self, application):
         self.application = application
+        self.logger = getattr(application, 'logger', logger)
         self.ready = False
         self.client = None
 
     def buildProtocol(self, address):
-        logger.log(log.IMPORTANT, '{} Ready: {}'.format(address, self.protocol.protocol_name))
+        self.logger.log(log.IMPORTANT, '{} Ready: {}'.format(address, self.protocol.protocol_name))
         self.client = self.protocol(self)
         self.resetDelay()
         self.ready = True
@@ -74,11 +75,18 @@ class CommandFactory(protocol.ReconnectingClientFactory):
         if self.ready and self.client:
             self.client.send_message(message)
         else:
-            logger.error('Client not connected. Command ignored!')
+            self.logger.error('Client not connected. Command ignored!')
 
     def receive_message(self, message, message_type):
         self.application.receive_message(message, message_type)
 
+    def drop(self):
+        """
+        Abort the current connection without waiting for pending data. The factory reconnects automatically.
+        """
+        if self.client and self.client.transport:
+            self.client.transport.abortConnection()
+
     def disconnect(self):
         self.ready = False
         self.application.disconnect(self.protocol.message_type)
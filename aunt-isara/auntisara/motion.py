@@ -0,0 +1,135 @@
+import threading
+import time
+
+import numpy
+
+# pose axes as reported by the position status, translations in mm and rotations in degrees
+AXES = ('x', 'y', 'z', 'rx', 'ry', 'rz')
+
+
+class PoseHistory(object):
+    """
+    Fixed-size ring buffer of timestamped robot poses. Velocities and accelerations are estimated by finite
+    differences over the buffered samples. The robot is considered moving once its linear speed or angular rate
+    exceeds the start thresholds, and stopped once both have stayed below the stop thresholds for a number of
+    consecutive samples.
+    """
+
+    def __init__(self, size=64, start_speed=1.0, stop_speed=0.2, start_rate=1.0, stop_rate=0.2, settle=2):
+        """
+        :param size: number of poses kept
+        :param start_speed: linear speed in mm/s above which the robot is moving
+        :param stop_speed: linear speed in mm/s below which the robot may be stopped
+        :param start_rate: angular rate in deg/s above which the robot is moving
+        :param stop_rate: angular rate in deg/s below which the robot may be stopped
+        :param settle: number of consecutive slow samples after which the robot is stopped
+        """
+        self.size = size
+        self.start_speed = start_speed
+        self.stop_speed = stop_speed
+        self.start_rate = start_rate
+        self.stop_rate = stop_rate
+        self.settle = settle
+        self.lock = threading.Lock()
+        self.times = numpy.zeros(size)
+        self.poses = numpy.zeros((size, len(AXES)))
+        self.speeds = numpy.zeros(size)
+        self.count = 0
+        self.moving = False
+        self.slow = 0
+
+    def add(self, pose, timestamp=None):
+        """
+        Add a pose and update the motion state
+
+        :param pose: sequence of six values in the order of AXES
+        :param timestamp: time of the sample, defaults to now
+        :return: linear distance in mm from the previous pose
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            index = self.count % self.size
+            self.poses[index] = pose
+            self.times[index] = timestamp
+            speed = rate = distance = 0.0
+            if self.count:
+                previous = (self.count - 1) % self.size
+                step = self.poses[index] - self.poses[previous]
+                turn = (step[3:] + 180.0) % 360.0 - 180.0
+                dt = timestamp - self.times[previous]
+                distance = float(numpy.sqrt(numpy.dot(step[:3], step[:3])))
+                if dt > 0:
+                    speed = distance / dt
+                    rate = float(numpy.abs(turn).max()) / dt
+            self.speeds[index] = speed
+            self.count += 1
+
+            if speed > self.start_speed or rate > self.start_rate:
+                self.moving = True
+                self.slow = 0
+            elif speed < self.stop_speed and rate < self.stop_rate:
+                self.slow += 1
+                if self.slow >= self.settle:
+                    self.moving = False
+            else:
+                self.slow = 0
+            return distance
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def _order(self, count):
+        # ring indices of the most recent samples, oldest first
+        count = min(len(self), self.size if count is None else count)
+        return numpy.arange(self.count - count, self.count) % self.size
+
+    def latest(self, count=None):
+        """
+        Return the most recent samples, oldest first
+
+        :param count: maximum number of samples, defaults to all
+        :return: (times, poses) arrays of shape (n,) and (n, 6)
+        """
+        with self.lock:
+            order = self._order(count)
+            return self.times[order], self.poses[order]
+
+    def velocity(self, count=None):
+        """
+        Estimate velocities between consecutive samples
+
+        :param count: maximum number of samples used, defaults to all
+        :return: (times, velocities) arrays of shape (n-1,) and (n-1, 6), times are interval midpoints
+        """
+        times, poses = self.latest(count)
+        dt = numpy.diff(times)
+        valid = dt > 0
+        velocities = numpy.diff(poses, axis=0)[valid] / dt[valid, numpy.newaxis]
+        return (times[1:][valid] + times[:-1][valid]) / 2, velocities
+
+    def acceleration(self, count=None):
+        """
+        Estimate accelerations between consecutive velocity estimates
+
+        :param count: maximum number of samples used, defaults to all
+        :return: (times, accelerations) arrays of shape (n-2,) and (n-2, 6)
+        """
+        times, velocities = self.velocity(count)
+        dt = numpy.diff(times)
+        valid = dt > 0
+        accelerations = numpy.diff(velocities, axis=0)[valid] / dt[valid, numpy.newaxis]
+        return (times[1:][valid] + times[:-1][valid]) / 2, accelerations
+
+    def speed(self):
+        """
+        Return the linear speed in mm/s over the last interval
+        """
+        with self.lock:
+            return float(self.speeds[(self.count - 1) % self.size]) if self.count else 0.0
+
+    def speed_history(self, count=None):
+        """
+        Return the linear speeds of the most recent samples, oldest first
+        """
+        with self.lock:
+            return self.speeds[self._order(count)]
@@ -0,0 +1,109 @@
+import collections
+import threading
+import time
+
+
+class MountQueue(object):
+    """
+    A FIFO queue of ports to be mounted. The head of the queue is mounted next while the port after it is
+    passed to the robot as the next sample so that the double gripper can pre-pick it during the exchange.
+    """
+
+    def __init__(self):
+        self.ports = collections.deque()
+        self.lock = threading.RLock()
+        self.active = None
+        self.completed = 0
+
+    def __len__(self):
+        return len(self.ports)
+
+    def add(self, port):
+        with self.lock:
+            self.ports.append(port)
+
+    def clear(self):
+        with self.lock:
+            self.ports.clear()
+            self.active = None
+
+    def start(self):
+        """
+        Mark the head of the queue as being mounted.
+
+        :return: (port, next_port) tuple. Port is None if the queue is empty or a mount is in progress and
+            next_port is an empty string if there is no port after it.
+        """
+        with self.lock:
+            if self.active or not self.ports:
+                return None, ''
+            self.active = self.ports[0]
+            next_port = self.ports[1] if len(self.ports) > 1 else ''
+            return self.active, next_port
+
+    def cancel(self):
+        with self.lock:
+            self.active = None
+
+    def complete(self, port):
+        """
+        Notify the queue that a port has been mounted. If it is the active port, it is removed from the queue.
+
+        :param port: mounted port
+        :return: True if the active port was completed
+        """
+        with self.lock:
+            if not self.active or port != self.active:
+                return False
+            if self.ports and self.ports[0] == port:
+                self.ports.popleft()
+            self.active = None
+            self.completed += 1
+            return True
+
+    def text(self):
+        with self.lock:
+            return ' '.join(self.ports)
+
+
+class Throughput(object):
+    """
+    Rolling estimate of mount throughput in samples per hour, kept separately for pipelined mounts (sample
+    pre-picked by the previous exchange) and for regular mounts.
+    """
+
+    def __init__(self, window=20):
+        self.durations = {
+            True: collections.deque(maxlen=window),
+            False: collections.deque(maxlen=window),
+        }
+        self.started = None
+        self.port = None
+        self.pipelined = False
+
+    def start(self, port, pipelined):
+        self.started = time.time()
+        self.port = port
+        self.pipelined = pipelined
+
+    def stop(self, port):
+        """
+        Record the duration of the current mount if one was started for the given port.
+
+        :param port: mounted port
+        :return: True if a duration was recorded
+        """
+        if self.started is None or port != self.port:
+            return False
+        self.durations[self.pipelined].append(time.time() - self.started)
+        self.started = None
+        return True
+
+    def rate(self, pipelined):
+        """
+        Samples per hour for the given kind of mount, or 0.0 if no mounts have been recorded.
+        """
+        durations = self.durations[pipelined]
+        if not durations:
+            return 0.0
+        return 3600.0 * len(durations) / sum(durations)
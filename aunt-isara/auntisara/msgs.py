@@ -2,6 +2,50 @@ import re
 from enum import Enum
 
 
+class MessageType(Enum):
+    RESPONSE, STATUS = range(2)
+
+
+class MessageFramer(object):
+    """
+    Splits the byte stream of a controller link into messages terminated by a NUL byte. A controller which does
+    not terminate its messages writes one message at a time, so until a first NUL has been seen on the link each
+    chunk received is taken as a whole message.
+    """
+
+    def __init__(self, delimiter=b'\0', limit=2 ** 16):
+        """
+        :param delimiter: message terminator
+        :param limit: unterminated data longer than this is passed on as a message
+        """
+        self.delimiter = delimiter
+        self.limit = limit
+        self.buffer = b''
+        self.delimited = False
+
+    def feed(self, data):
+        """
+        Add received data
+
+        :param data: bytes received
+        :return: list of complete messages, decoded and stripped
+        """
+        if not self.delimited:
+            if self.delimiter not in data:
+                return [data.decode('latin-1').strip()]
+            self.delimited = True
+        frames = (self.buffer + data).split(self.delimiter)
+        self.buffer = frames.pop()
+        if len(self.buffer) > self.limit:
+            frames.append(self.buffer)
+            self.buffer = b''
+        return [frame.decode('latin-1').strip() for frame in frames]
+
+    def reset(self):
+        self.buffer = b''
+        self.delimited = False
+
+
 class StatusType(Enum):
     #ORG IDLE, WAITING, BUSY, STANDBY, FAULT = range(5)
     IDLE, WAITING, BUSY, STANDBY, FAULT, DRYING = range(6)
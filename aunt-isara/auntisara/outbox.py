@@ -0,0 +1,234 @@
+import heapq
+import itertools
+import threading
+import time
+
+from softdev import log
+
+logger = log.get_module_logger(__name__)
+
+# command classes in order of priority
+SAFETY, CONTROL, SETTER, SPEED, COMMAND, TRAJECTORY = ('safety', 'control', 'setter', 'speed', 'command', 'trajectory')
+PRIORITY = {SAFETY: 0, CONTROL: 1, SETTER: 2, SPEED: 2, COMMAND: 2, TRAJECTORY: 2}
+
+# safety commands bypass the queue, abort and panic also discard queued commands
+SAFETY_COMMANDS = {'abort', 'panic', 'pause'}
+PURGE_COMMANDS = {'abort', 'panic'}
+
+# commands recovering the controller, sent ahead of queued routine commands
+CONTROL_COMMANDS = {'reset', 'restart', 'resetMotion', 'reset parameters', 'clearmemory', 'clear memory'}
+
+SPEED_STEPS = {'speedup': 1, 'speeddown': -1}
+
+
+def command_name(command):
+    return command.split('(', 1)[0].strip()
+
+
+def command_class(command):
+    """
+    Return the class of a command
+    """
+    name = command_name(command)
+    if name in SAFETY_COMMANDS:
+        return SAFETY
+    elif name in CONTROL_COMMANDS:
+        return CONTROL
+    elif name in SPEED_STEPS:
+        return SPEED
+    elif name == 'traj':
+        return TRAJECTORY
+    elif name.startswith('set'):
+        return SETTER
+    return COMMAND
+
+
+class Entry(object):
+    def __init__(self, command, kind, sequence):
+        self.command = command
+        self.kind = kind
+        self.sequence = sequence
+        self.queued = time.time()
+        self.steps = 0
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (PRIORITY[self.kind], self.sequence) < (PRIORITY[other.kind], other.sequence)
+
+
+class LatencyStats(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.coalesced = 0
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.maximum = max(self.maximum, latency)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'latency': self.total / self.count if self.count else 0.0,
+            'max_latency': self.maximum,
+            'coalesced': self.coalesced,
+        }
+
+
+class Outbox(object):
+    """
+    Priority scheduler for commands sent to the controller. Safety commands are written to the transport
+    immediately from the calling thread, abort and panic also discard everything still queued. Controller recovery
+    commands are sent ahead of routine commands, which keep their order. A parameter setter replaces a queued one of
+    the same name, and speedup and speeddown commands cancel each other, only while that entry is the last one
+    queued so that no command is moved past another. The latency from enqueueing to writing a command is accounted
+    per command class.
+    """
+
+    def __init__(self, transport, logger=logger):
+        """
+        :param transport: callable writing a command to the controller
+        :param logger: logger for discarded commands and transport errors
+        """
+        self.transport = transport
+        self.logger = logger
+        self.queue = []
+        self.last = None
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.send_lock = threading.Lock()
+        self.stats = {kind: LatencyStats() for kind in PRIORITY}
+
+    def put(self, command):
+        """
+        Queue a command, or send it immediately if it is a safety command. May be called from any thread.
+
+        :param command: command text
+        """
+        kind = command_class(command)
+        if kind == SAFETY:
+            if command_name(command) in PURGE_COMMANDS:
+                dropped = self.clear()
+                if dropped:
+                    self.logger.warning('{}: discarded {} queued commands'.format(command, dropped))
+            self.write(Entry(command, kind, None))
+            return
+
+        with self.condition:
+            # only the last queued entry may absorb a command, anything queued after it must stay after it
+            last = self.last
+            if kind == SETTER and last is not None and last.kind == SETTER:
+                if command_name(last.command) == command_name(command):
+                    last.command = command
+                    self.stats[kind].coalesced += 1
+                    return
+            elif kind == SPEED and last is not None and last.kind == SPEED:
+                last.steps += SPEED_STEPS[command_name(command)]
+                self.stats[kind].coalesced += 1
+                if last.steps == 0:
+                    last.cancelled = True
+                    self.last = None
+                return
+
+            entry = Entry(command, kind, next(self.sequence))
+            if kind == SPEED:
+                entry.steps = SPEED_STEPS[command_name(command)]
+            self.last = entry
+            heapq.heappush(self.queue, entry)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Remove and return the next command to send, waiting for one if the queue is empty
+
+        :param timeout: maximum time to wait in seconds, or None to wait forever
+        :return: Entry or None if the timeout expired
+        """
+        end = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while True:
+                while self.queue and self.queue[0].cancelled:
+                    heapq.heappop(self.queue)
+                if self.queue:
+                    break
+                remaining = None if end is None else end - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+            entry = heapq.heappop(self.queue)
+            remaining = None
+            if entry.kind == SPEED:
+                # send one step at a time, the remaining steps stay at the head of the queue
+                step = 1 if entry.steps > 0 else -1
+                entry.command = 'speedup' if step > 0 else 'speeddown'
+                if entry.steps != step:
+                    remaining = Entry(entry.command, SPEED, entry.sequence)
+                    remaining.queued = entry.queued
+                    remaining.steps = entry.steps - step
+                    heapq.heappush(self.queue, remaining)
+            if self.last is entry:
+                self.last = remaining
+            return entry
+
+    def send_next(self, timeout=None):
+        """
+        Send the next queued command. Called from the sender thread.
+
+        :param timeout: maximum time to wait for a command in seconds, or None to wait forever
+        :return: the command sent or None
+        """
+        entry = self.get(timeout)
+        if entry is not None:
+            self.write(entry)
+            return entry.command
+
+    def write(self, entry):
+        with self.send_lock:
+            try:
+                self.transport(entry.command)
+            except Exception as e:
+                self.logger.error('{}: {}'.format(entry.command, e))
+        with self.lock:
+            self.stats[entry.kind].add(time.time() - entry.queued)
+
+    def clear(self):
+        """
+        Discard all queued commands
+
+        :return: number of commands discarded
+        """
+        with self.condition:
+            count = len([entry for entry in self.queue if not entry.cancelled])
+            self.queue = []
+            self.last = None
+            return count
+
+    def __len__(self):
+        with self.lock:
+            return len([entry for entry in self.queue if not entry.cancelled])
+
+    def get_stats(self):
+        """
+        Return the enqueue-to-wire latency of each command class in seconds
+
+        :return: dictionary mapping command classes to dictionaries with count, latency, max_latency and coalesced
+        """
+        with self.lock:
+            return {kind: stats.as_dict() for kind, stats in self.stats.items()}
+
+    def report(self):
+        """
+        Log the latency of each command class
+        """
+        lines = ['{:>12} {:>8} {:>14} {:>12} {:>10}'.format('class', 'count', 'latency (ms)', 'max (ms)', 'coalesced')]
+        stats = self.get_stats()
+        for kind in sorted(stats, key=lambda k: PRIORITY[k]):
+            info = stats[kind]
+            lines.append('{:>12} {:>8} {:>14.3f} {:>12.3f} {:>10}'.format(
+                kind, info['count'], 1e3 * info['latency'], 1e3 * info['max_latency'], info['coalesced']
+            ))
+        self.logger.info('Command latency:\n' + '\n'.join(lines))
@@ -0,0 +1,169 @@
+import glob
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy
+from softdev import log
+
+logger = log.get_module_logger(__name__)
+
+
+class Ring(object):
+    """
+    Preallocated ring of timestamped values. Adding a value copies it into the next slot, overwriting the oldest.
+    """
+
+    def __init__(self, capacity, dtype):
+        self.capacity = capacity
+        self.times = numpy.zeros(capacity)
+        self.data = numpy.zeros(capacity, dtype=dtype)
+        self.count = 0
+
+    def add(self, value, timestamp):
+        index = self.count % self.capacity
+        self.data[index] = value
+        self.times[index] = timestamp
+        self.count += 1
+
+    def since(self, start):
+        """
+        Return copies of the values added at or after the given time, oldest first
+
+        :return: (times, values) arrays
+        """
+        order = numpy.arange(max(self.count - self.capacity, 0), self.count) % self.capacity
+        keep = order[self.times[order] >= start]
+        return self.times[keep], self.data[keep]
+
+
+class FlightRecorder(object):
+    """
+    Always-on record of the last seconds of controller traffic: raw frames received on both links, decoded
+    status rows and commands written. Storage is allocated once, so memory is bounded and recording an event
+    only copies it into its ring. When triggered, the recorder waits a little to also capture the aftermath, then
+    writes the history to a compressed NumPy file. Triggers arriving while a dump is pending are merged into it.
+    """
+
+    def __init__(
+            self, directory, state_type, seconds=60.0, frames=4096, commands=512, frame_size=256,
+            command_size=128, post_trigger=2.0, keep=50, callback=None, logger=logger
+    ):
+        """
+        :param directory: directory for dump files, created if missing
+        :param state_type: numpy dtype of the decoded status rows
+        :param seconds: length of the history written to a dump
+        :param frames: capacity of the raw frame and status row rings
+        :param commands: capacity of the command ring
+        :param frame_size: raw frames are truncated to this many bytes
+        :param command_size: commands are truncated to this many bytes
+        :param post_trigger: seconds recorded after a trigger before the dump is written
+        :param keep: maximum number of dump files kept
+        :param callback: called with the path of each dump file, from the thread writing it
+        :param logger: logger for saved dumps and file errors
+        """
+        self.directory = directory
+        self.seconds = seconds
+        self.post_trigger = post_trigger
+        self.keep = keep
+        self.callback = callback
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.frames = Ring(frames, [('kind', 'u1'), ('text', 'S{}'.format(frame_size))])
+        self.states = Ring(frames, state_type)
+        self.commands = Ring(commands, 'S{}'.format(command_size))
+        self.pending = []
+        self.last_dump = ''
+        self.dumps = 0
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def add_frame(self, kind, text, timestamp=None):
+        """
+        Record a raw frame
+
+        :param kind: integer frame kind, e.g. the message type value
+        :param text: frame text
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            self.frames.add((kind, _encode(text)), timestamp)
+
+    def add_state(self, row, timestamp=None):
+        """
+        Record a decoded status row
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            self.states.add(row, timestamp)
+
+    def add_command(self, command, timestamp=None):
+        """
+        Record a command written to the controller
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            self.commands.add(_encode(command), timestamp)
+
+    def trigger(self, reason):
+        """
+        Request a dump of the history. May be called from any thread.
+
+        :param reason: short description of the trigger, included in the dump
+        """
+        with self.lock:
+            self.pending.append((time.time(), reason))
+            if len(self.pending) > 1:
+                return
+        timer = threading.Timer(self.post_trigger, self.dump)
+        timer.daemon = True
+        timer.start()
+
+    def dump(self):
+        """
+        Write the history and the pending triggers to a compressed file
+
+        :return: path of the file or None if it could not be written
+        """
+        with self.lock:
+            triggers, self.pending = self.pending, []
+            start = (triggers[0][0] if triggers else time.time()) - self.seconds
+            frame_times, frames = self.frames.since(start)
+            state_times, states = self.states.since(start)
+            command_times, commands = self.commands.since(start)
+
+        reasons = ', '.join(reason for t, reason in triggers)
+        stamp = datetime.fromtimestamp(triggers[0][0] if triggers else time.time()).strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, 'flight-{}-{}.npz'.format(stamp, self.dumps))
+        try:
+            numpy.savez_compressed(
+                path,
+                trigger_times=numpy.array([t for t, reason in triggers]),
+                triggers=numpy.array([_encode(reason) for t, reason in triggers], dtype='S64'),
+                frame_times=frame_times, frame_kinds=frames['kind'], frames=frames['text'],
+                state_times=state_times, states=states,
+                command_times=command_times, commands=commands,
+            )
+        except (IOError, OSError) as e:
+            self.logger.error('Unable to write flight record: {}'.format(e))
+            return None
+        self.logger.warning('Flight record ({}) saved to {}'.format(reasons, path))
+        self.last_dump = path
+        self.dumps += 1
+        self.expire()
+        if self.callback is not None:
+            self.callback(path)
+        return path
+
+    def expire(self):
+        dumps = sorted(glob.glob(os.path.join(self.directory, 'flight-*.npz')))
+        for path in dumps[:max(len(dumps) - self.keep, 0)]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.logger.warning('Unable to remove {}: {}'.format(path, e))
+
+
+def _encode(text):
+    return text.encode('utf-8', 'replace') if not isinstance(text, bytes) else text
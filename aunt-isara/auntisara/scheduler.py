@@ -0,0 +1,179 @@
+import collections
+import threading
+import time
+
+from .msgs import StatusType
+
+# below this, the max soak time parameter is considered unset
+MIN_SOAK_TIME = 2
+
+# a scheduled action which has not started within this time is considered rejected
+START_TIMEOUT = 10.0
+
+SchedulerState = collections.namedtuple(
+    'SchedulerState', 'status position soak_count max_soak_count max_soak_time queued mounting pending moving'
+)
+
+
+class SoakScheduler(object):
+    """
+    Schedules drying of the tool during idle windows, so that the soak limits are not reached in the middle of a
+    burst of mounts, and soaks it again after a scheduled dry so that the next mount can start. The number of soaks
+    needed is predicted from the size of the last burst of mounts. The scheduler only acts when the robot has been
+    idle and stationary for longer than the idle time and no mount is imminent: nothing is queued, no mount is in
+    progress and no next port is selected. A mount requested anyway while a scheduled action is running is
+    deferred rather than rejected.
+    """
+
+    def __init__(self, idle_time=60.0):
+        self.idle_time = idle_time
+        self.enabled = False
+        self.lock = threading.RLock()
+        self.last_activity = time.time()
+        self.soak_since = time.time()
+        self.soak_count = 0
+        self.running = None
+        self.started = 0.0
+        self.busy = False
+        self.deferred = False
+        self.reissued = False
+        self.actions = 0
+        self.saved = 0.0
+        self.decision = ''
+        self.last_mount = 0.0
+        self.burst = 0
+        self.last_burst = 0
+        self.dried = False
+
+    def activity(self):
+        """
+        Notify the scheduler that a command was sent to the robot
+        """
+        with self.lock:
+            self.last_activity = time.time()
+
+    def mount_requested(self):
+        """
+        Notify the scheduler of a mount request, mounts separated by less than the idle time form a burst. A
+        deferred mount re-issued after take_deferred was already counted when first requested.
+        """
+        with self.lock:
+            if self.reissued:
+                self.reissued = False
+                return
+            now = time.time()
+            if now - self.last_mount > self.idle_time:
+                self.last_burst = self.burst or self.last_burst
+                self.burst = 0
+            self.burst += 1
+            self.last_mount = now
+
+    def update_soak_count(self, count):
+        with self.lock:
+            if count < self.soak_count or (count and not self.soak_count):
+                self.soak_since = time.time()
+            self.soak_count = count
+
+    def soaks_left(self, state):
+        return max(state.max_soak_count - state.soak_count, 0)
+
+    def evaluate(self, state):
+        """
+        Decide whether to dry or soak the tool now.
+
+        :param state: SchedulerState snapshot
+        :return: (action, reason) tuple, action is 'dry', 'soak' or None
+        """
+        now = time.time()
+        with self.lock:
+            self.expire()
+            if not self.enabled or self.running:
+                return None, ''
+            idle = now - self.last_activity
+            if state.status != StatusType.IDLE.value or state.moving or idle < self.idle_time:
+                return None, ''
+            if state.queued or state.mounting or state.pending:
+                # a mount may be requested at any moment, never start an action which would hold it
+                return None, ''
+
+            left = self.soaks_left(state)
+            if state.position.startswith('SOAK') and state.soak_count:
+                expected = max(self.burst, self.last_burst, 1)
+                if left < expected:
+                    return 'dry', '{} soaks left, {} mounts expected'.format(left, expected)
+                if state.max_soak_time >= MIN_SOAK_TIME:
+                    remaining = state.max_soak_time - (now - self.soak_since)
+                    if remaining < 2 * self.idle_time:
+                        return 'dry', '{:0.0f} s of soak time left'.format(remaining)
+            elif state.position.startswith('HOME') and self.dried:
+                return 'soak', 'ready for next mount after dry'
+        return None, ''
+
+    def start(self, action, reason):
+        with self.lock:
+            self.running = action
+            self.started = time.time()
+            self.busy = False
+            self.actions += 1
+            self.dried = False
+            self.decision = '{}: {}'.format(action, reason)
+            self.last_activity = time.time()
+
+    def defer_mount(self):
+        """
+        Check if a mount must be deferred until the scheduled action completes.
+
+        :return: True if the mount was deferred
+        """
+        with self.lock:
+            self.expire()
+            if self.running:
+                self.deferred = True
+                return True
+            return False
+
+    def status_changed(self, status, saved):
+        """
+        Track the progress of the scheduled action from status changes
+
+        :param status: new status value
+        :param saved: estimated latency saved if the action completes, in seconds
+        :return: True if the scheduled action finished
+        """
+        with self.lock:
+            if not self.running:
+                return False
+            if status in (StatusType.BUSY.value, StatusType.DRYING.value, StatusType.STANDBY.value):
+                self.busy = True
+            elif status == StatusType.FAULT.value:
+                self.running = None
+                self.deferred = False
+                return True
+            elif status == StatusType.IDLE.value and self.busy:
+                self.dried = self.running == 'dry'
+                self.running = None
+                self.saved += saved
+                return True
+            return False
+
+    def take_deferred(self):
+        """
+        Check if a deferred mount should now be issued. The deferred flag is cleared and the next mount request
+        is taken to be the re-issued mount.
+
+        :return: True if a mount was deferred and no scheduled action is running anymore
+        """
+        with self.lock:
+            self.expire()
+            if self.deferred and not self.running:
+                self.deferred = False
+                self.reissued = True
+                return True
+            return False
+
+    def expire(self):
+        """
+        Give up on a scheduled action which the robot did not start
+        """
+        if self.running and not self.busy and time.time() - self.started > START_TIMEOUT:
+            self.running = None
@@ -0,0 +1,257 @@
+import collections
+import json
+import os
+import re
+import threading
+import time
+
+import numpy
+from softdev import log
+
+from .msgs import StatusType
+
+logger = log.get_module_logger(__name__)
+
+OPERATIONS = ('put', 'get', 'getput', 'soak', 'dry', 'home', 'changetool')
+MOUNT_OPERATIONS = ('put', 'get', 'getput')
+COMMAND_PATT = re.compile(r'^(?:traj\()?(?P<name>\w+)')
+
+# message bits for the endstation handshake conditions the robot waits on
+WAIT_CAUSES = {
+    14: 'RdTrsf',
+    15: 'SplOn',
+}
+
+
+class Operation(object):
+    """
+    Timeline of a single robot operation. Phases are recorded as (label, time) pairs relative to the time
+    the command was sent.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.sent = time.time()
+        self.started = False
+        self.phases = [('sent', 0.0)]
+        self.waits = dict.fromkeys(WAIT_CAUSES.values(), 0.0)
+        self.path = 0.0
+
+    def mark(self, label):
+        self.phases.append((label, time.time() - self.sent))
+
+    def duration(self):
+        return self.phases[-1][1]
+
+    def wait_time(self):
+        return sum(self.waits.values())
+
+    def text(self):
+        return '{}: {}'.format(self.name, ', '.join('{} {:0.2f}s'.format(label, t) for label, t in self.phases))
+
+    __str__ = text
+
+
+class OperationTimer(object):
+    """
+    Records the timeline of robot operations from command acknowledgements, status, path and position
+    transitions, and keeps rolling duration statistics per operation which are persisted to a file.
+    """
+
+    def __init__(self, filename, window=100):
+        self.filename = filename
+        self.window = window
+        self.lock = threading.RLock()
+        self.current = None
+        self.last = None
+        self.durations = {name: collections.deque(maxlen=window) for name in OPERATIONS}
+        self.paths = dict.fromkeys(OPERATIONS, 0.0)
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, 'r') as fobj:
+                data = json.load(fobj)
+        except (IOError, ValueError) as e:
+            logger.warning('Unable to load operation statistics: {}'.format(e))
+            return
+        for name, values in data.items():
+            if name in self.durations:
+                self.durations[name].extend(values)
+
+    def save(self):
+        data = {name: [round(v, 3) for v in values] for name, values in self.durations.items() if values}
+        tmp_file = '{}.tmp'.format(self.filename)
+        with open(tmp_file, 'w') as fobj:
+            json.dump(data, fobj, separators=(',', ':'))
+        os.rename(tmp_file, self.filename)
+
+    def command_sent(self, command):
+        """
+        Start a new operation timeline if the command is a tracked operation. Any operation still in progress
+        is discarded.
+
+        :param command: command text as sent to the robot
+        """
+        m = COMMAND_PATT.match(command)
+        name = m.group('name') if m else ''
+        with self.lock:
+            if name == 'abort':
+                self.current = None
+            elif name in OPERATIONS:
+                self.current = Operation(name)
+
+    def command_ack(self, message):
+        with self.lock:
+            if self.current and not self.current.started and len(self.current.phases) == 1:
+                self.current.mark('ack')
+
+    def status_changed(self, status):
+        with self.lock:
+            if not self.current:
+                return
+            if status in (StatusType.BUSY.value, StatusType.DRYING.value) and not self.current.started:
+                self.current.started = True
+                self.current.mark('start')
+            elif status == StatusType.FAULT.value:
+                self.current = None
+            elif status == StatusType.IDLE.value and self.current.started:
+                self.finish()
+
+    def path_changed(self, path):
+        with self.lock:
+            if not self.current:
+                return
+            if path and not self.current.started:
+                self.current.started = True
+                self.current.mark('start')
+            elif not path and self.current.started:
+                self.finish()
+
+    def position_changed(self, position):
+        with self.lock:
+            if self.current and self.current.started:
+                self.current.mark(position)
+
+    def add_path(self, distance):
+        """
+        Add the distance travelled by the robot to the path length of the operation in progress
+
+        :param distance: linear distance in mm
+        """
+        with self.lock:
+            if self.current and self.current.started:
+                self.current.path += distance
+
+    def finish(self):
+        operation, self.current = self.current, None
+        operation.mark('end')
+        self.last = operation
+        self.durations[operation.name].append(operation.duration())
+        self.paths[operation.name] = operation.path
+        logger.debug('%s', operation)
+        try:
+            self.save()
+        except (IOError, OSError) as e:
+            logger.warning('Unable to save operation statistics: {}'.format(e))
+
+    def mean(self, name):
+        """
+        Return the mean duration of an operation or 0.0 if none has been recorded
+        """
+        with self.lock:
+            values = self.durations.get(name)
+            return float(numpy.mean(values)) if values else 0.0
+
+    def path_lengths(self):
+        """
+        Return the path length in mm of the last completed run of each operation, in the order of OPERATIONS
+        """
+        with self.lock:
+            return [self.paths[name] for name in OPERATIONS]
+
+    def statistics(self):
+        """
+        Return the mean, 95th percentile and last durations for all operations in the order of OPERATIONS.
+        Operations without any recorded durations report zeros.
+
+        :return: (mean, p95, last) tuple of lists
+        """
+        with self.lock:
+            mean, p95, last = [], [], []
+            for name in OPERATIONS:
+                values = self.durations[name]
+                if values:
+                    mean.append(float(numpy.mean(values)))
+                    p95.append(float(numpy.percentile(values, 95)))
+                    last.append(values[-1])
+                else:
+                    mean.append(0.0)
+                    p95.append(0.0)
+                    last.append(0.0)
+            return mean, p95, last
+
+
+class WaitAccounting(object):
+    """
+    Measures how long the robot spends waiting on the endstation. Entry into and exit from each waiting cause
+    reported in the controller messages, as well as edges of the handshake signals, are marked on the timeline
+    of the current operation and the waiting time is attributed to it.
+    """
+
+    def __init__(self, timer):
+        self.timer = timer
+        self.lock = timer.lock
+        self.active = {}
+        self.totals = dict.fromkeys(WAIT_CAUSES.values(), 0.0)
+        self.operations = dict.fromkeys(OPERATIONS, 0.0)
+
+    def update(self, bit):
+        """
+        Update the waiting state from the message bit reported by the controller
+
+        :param bit: message bit or None if there is no message
+        :return: True if a wait ended and the totals changed
+        """
+        cause = WAIT_CAUSES.get(bit)
+        now = time.time()
+        changed = False
+        with self.lock:
+            for name in list(self.active.keys()):
+                if name != cause:
+                    self.exit(name, now)
+                    changed = True
+            if cause and cause not in self.active:
+                self.active[cause] = now
+                if self.timer.current:
+                    self.timer.current.mark('wait {}'.format(cause))
+        return changed
+
+    def exit(self, cause, now):
+        duration = now - self.active.pop(cause)
+        self.totals[cause] += duration
+        operation = self.timer.current
+        if operation:
+            operation.waits[cause] += duration
+            operation.mark('{} ready'.format(cause))
+            self.operations[operation.name] += duration
+
+    def edge(self, signal, value):
+        """
+        Mark an edge of a handshake signal on the timeline of the current operation
+
+        :param signal: signal name
+        :param value: new signal value
+        """
+        with self.lock:
+            if self.timer.current:
+                self.timer.current.mark('{} {}'.format(signal, 'on' if value else 'off'))
+
+    def statistics(self):
+        """
+        Return cumulative waiting time per cause and per operation in the order of OPERATIONS
+        """
+        with self.lock:
+            return dict(self.totals), [self.operations[name] for name in OPERATIONS]
@@ -0,0 +1,87 @@
+import threading
+import time
+
+# gains of the smoothed round-trip time and its mean deviation, as used for TCP retransmission timers
+RTT_GAIN = 0.125
+DEVIATION_GAIN = 0.25
+
+
+class LinkWatchdog(object):
+    """
+    Measures the round-trip time of status queries and detects a stale link, where the connection is up but the
+    controller no longer replies. A smoothed round-trip time and its mean deviation are kept. Replies which may
+    belong to an earlier query that timed out are not used as samples.
+    """
+
+    def __init__(self, stale_timeout=5.0):
+        self.stale_timeout = stale_timeout
+        self.lock = threading.RLock()
+        self.sent = None
+        self.ambiguous = False
+        self.last_reply = time.time()
+        self.rtt = 0.0
+        self.average = 0.0
+        self.deviation = 0.0
+        self.samples = 0
+        self.stale = False
+        self.drops = 0
+
+    def reset(self):
+        """
+        Restart the watchdog after the link is established
+        """
+        with self.lock:
+            self.sent = None
+            self.ambiguous = False
+            self.last_reply = time.time()
+            self.stale = False
+
+    def query_sent(self):
+        with self.lock:
+            if self.sent is not None:
+                self.ambiguous = True
+            self.sent = time.time()
+
+    def reply_received(self):
+        """
+        Record a reply to the outstanding query
+
+        :return: round-trip time in seconds or None if the reply could not be matched to a query
+        """
+        now = time.time()
+        with self.lock:
+            self.last_reply = now
+            if self.sent is None:
+                return None
+            rtt, self.sent = now - self.sent, None
+            if self.ambiguous:
+                self.ambiguous = False
+                return None
+            if self.samples:
+                self.deviation += DEVIATION_GAIN * (abs(rtt - self.average) - self.deviation)
+                self.average += RTT_GAIN * (rtt - self.average)
+            else:
+                self.average = rtt
+                self.deviation = rtt / 2
+            self.rtt = rtt
+            self.samples += 1
+            return rtt
+
+    def silence(self):
+        """
+        Time since the last reply in seconds
+        """
+        return time.time() - self.last_reply
+
+    def check(self):
+        """
+        Check if the link has become stale
+
+        :return: True if no reply was received within the stale timeout and the link was not already stale
+        """
+        with self.lock:
+            if not self.stale and self.silence() > self.stale_timeout:
+                self.stale = True
+                self.drops += 1
+                return True
+            return False
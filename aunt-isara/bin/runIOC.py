@@ -4,14 +4,18 @@ import logging
 import sys
 import argparse
 
-# Twisted boiler-plate code.
-from twisted.internet import gireactor
-gireactor.install()
+# Twisted boiler-plate code. Headless mode runs on the default reactor without GObject
+HEADLESS = '--headless' in sys.argv
+if not HEADLESS:
+    from twisted.internet import gireactor
+    gireactor.install()
 from twisted.internet import reactor
 
 # add the project to the python path and inport it
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from softdev import log
+from softdev import log, signals
+if HEADLESS:
+    signals.set_dispatcher(signals.TwistedDispatcher(reactor))
 from auntisara import ioc
 
 # Setup single argument for verbose logging
@@ -21,16 +25,21 @@ parser.add_argument('-d', '--device', type=str, help='Device Name', required=Tru
 parser.add_argument('--address', type=str, help='Controller address', required=True)
 parser.add_argument('--commands', type=int, help='Command Port', required=True)
 parser.add_argument('--status', type=int, help='Status Port', required=True)
+parser.add_argument('--headless', action='store_true', help='Run without GObject, signals delivered by the reactor')
+parser.add_argument('--transport', choices=ioc.TRANSPORTS, default='twisted', help='Controller link implementation')
 
 
 if __name__== '__main__':
     args = parser.parse_args()
     if args.v:
-        log.log_to_console(logging.DEBUG)
+        log.log_to_console(logging.DEBUG, queued=True)
     else:
-        log.log_to_console(logging.INFO)
+        log.log_to_console(logging.INFO, queued=True)
 
-    app = ioc.AuntISARAApp(args.device, address=args.address, command_port=args.commands, status_port=args.status)
+    app = ioc.AuntISARAApp(
+        args.device, address=args.address, command_port=args.commands, status_port=args.status,
+        transport=args.transport
+    )
     reactor.addSystemEventTrigger('before', 'shutdown', app.shutdown) # make sure app is properly shutdown
     reactor.run()               # run main-loop
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+import os
+import logging
+import re
+import resource
+import sys
+import time
+import argparse
+
+# Twisted boiler-plate code. Headless mode runs on the default reactor without GObject
+HEADLESS = '--headless' in sys.argv
+if not HEADLESS:
+    from twisted.internet import gireactor
+    gireactor.install()
+from twisted.internet import reactor, task
+
+# add the project to the python path and inport it
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from softdev import log, models, signals
+if HEADLESS:
+    signals.set_dispatcher(signals.TwistedDispatcher(reactor))
+from auntisara import ioc
+
+logger = log.get_module_logger('runMulti')
+
+# Setup arguments, one --robot option per hosted robot
+parser = argparse.ArgumentParser(description='Run several IOC Applications in one process')
+parser.add_argument('-v', action='store_true', help='Verbose Logging')
+parser.add_argument('--headless', action='store_true', help='Run without GObject, signals delivered by the reactor')
+parser.add_argument(
+    '-r', '--robot', type=str, action='append', required=True, metavar='DEVICE,ADDRESS,COMMANDS,STATUS',
+    help='Device name, controller address, command port and status port of a robot'
+)
+parser.add_argument('--directory', type=str, default=os.getcwd(), help='Base directory, one sub-directory per robot')
+parser.add_argument('--usage', type=float, default=60.0, help='Resource usage logging interval in seconds')
+parser.add_argument('--transport', choices=ioc.TRANSPORTS, default='twisted', help='Controller link implementation')
+
+
+def process_usage():
+    """
+    Resident memory in MB and total CPU time in seconds of this process, excluding the softIoc process
+    """
+    try:
+        with open('/proc/self/statm') as fobj:
+            rss = int(fobj.read().split()[1]) * resource.getpagesize() / 1048576.
+    except (IOError, OSError, IndexError, ValueError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+    times = os.times()
+    return rss, times[0] + times[1]
+
+
+class UsageMonitor(object):
+    def __init__(self):
+        self.robots = 0
+        self.rss, self.cpu = process_usage()
+        self.last_time = time.time()
+        logger.info('Baseline: RSS {:0.1f} MB'.format(self.rss))
+
+    def robot_added(self, device):
+        rss, cpu = process_usage()
+        self.robots += 1
+        logger.info('Added {}: RSS {:0.1f} MB (+{:0.1f} MB), {} robots, {:0.1f} MB/robot'.format(
+            device, rss, rss - self.rss, self.robots, rss / self.robots
+        ))
+        self.rss = rss
+
+    def report(self):
+        rss, cpu = process_usage()
+        now = time.time()
+        load = 100 * (cpu - self.cpu) / max(now - self.last_time, 1e-6)
+        self.cpu, self.last_time = cpu, now
+        logger.info('Usage: RSS {:0.1f} MB, CPU {:0.1f}%, {} robots, {:0.1f} MB and {:0.2f}% per robot'.format(
+            rss, load, self.robots, rss / max(self.robots, 1), load / max(self.robots, 1)
+        ))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.v:
+        log.log_to_console(logging.DEBUG, queued=True)
+    else:
+        log.log_to_console(logging.INFO, queued=True)
+
+    usage = UsageMonitor()
+    server = models.RecordServer(directory=args.directory)
+    apps = []
+    for spec in args.robot:
+        device, address, commands, status = spec.split(',')
+        directory = os.path.join(args.directory, re.sub(r'[^\w-]', '_', device))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        log.log_to_file(os.path.join(directory, 'ioc.log'), queued=True, device=device)
+        app = ioc.AuntISARAApp(
+            device, address=address, command_port=int(commands), status_port=int(status),
+            directory=directory, server=server, transport=args.transport
+        )
+        reactor.addSystemEventTrigger('before', 'shutdown', app.shutdown)  # make sure app is properly shutdown
+        apps.append(app)
+        usage.robot_added(device)
+
+    if not server.start():
+        logger.error('Not all records connected!')
+    usage.report()
+    reactor.addSystemEventTrigger('after', 'shutdown', server.shutdown)
+    usage_loop = task.LoopingCall(usage.report)
+    usage_loop.start(args.usage, now=False)
+    reactor.run()               # run main-loop
@@ -0,0 +1,121 @@
+"""
+Benchmark of command preflight, the validation and encoding of a command before it is queued. Every command of the
+command table is prepared against stand-in records, and a few are compared with the previous per-command code which
+built the position pattern on every call and read some records more than once. Records are not connected, so the
+times do not include Channel Access.
+
+Run with `python test/bench_commands.py` from the aunt-isara directory.
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara import commands
+from auntisara.ioc import COMMANDS, ToolType, make_args
+
+REPEATS = 20000
+
+
+class Record(object):
+    def __init__(self, value):
+        self.value = value
+        self.reads = 0
+
+    def get(self):
+        self.reads += 1
+        return self.value
+
+
+class Database(object):
+    def __init__(self, **values):
+        self.records = {name: Record(value) for name, value in values.items()}
+        self.__dict__.update(self.records)
+
+    def reads(self):
+        total = sum(record.reads for record in self.records.values())
+        for record in self.records.values():
+            record.reads = 0
+        return total
+
+
+def database(position, tool):
+    return Database(
+        position_fbk=position, tool_fbk=tool.value, tool_param=tool.value, tooled_fbk=1, puck_param=3,
+        sample_param=7, plate_param=1, datamatrix_scan=1, next_puck=4, next_sample=2, sample_type=0,
+        next_sample_type=0, next_param='2A5', jaw_param=1,
+    )
+
+
+def legacy_position(ioc, *allowed):
+    current = ioc.position_fbk.get()
+    for pos in allowed:
+        if re.match('^' + pos + r'(?:_\w*)?$', current):
+            return True
+
+
+def legacy_tool(ioc, *tools):
+    return ioc.tool_fbk.get() in [t.value for t in tools]
+
+
+def legacy_put(ioc):
+    allowed_tools = (ToolType.UNIPUCK, ToolType.ROTATING, ToolType.DOUBLE, ToolType.PLATE)
+    if legacy_position(ioc, 'SOAK') and legacy_tool(ioc, *allowed_tools):
+        if ioc.tool_fbk.get() in [ToolType.UNIPUCK.value, ToolType.ROTATING.value, ToolType.DOUBLE.value]:
+            args = make_args(
+                tool=ioc.tool_param.get(), puck=ioc.puck_param.get(), sample=ioc.sample_param.get(),
+                datamatrix_scan=ioc.datamatrix_scan.get(), next_puck=ioc.next_puck.get(),
+                next_sample=ioc.next_sample.get(), sample_type=ioc.sample_type.get(),
+                next_sample_type=ioc.next_sample_type.get()
+            )
+            cmd = 'put'
+        else:
+            args = (ioc.tool_param.get(), ioc.plate_param.get())
+            cmd = 'putplate'
+        return 'traj({},{})'.format(cmd, ','.join([str(arg) for arg in args]))
+
+
+def legacy_dry(ioc):
+    allowed = (ToolType.DOUBLE, ToolType.UNIPUCK, ToolType.ROTATING)
+    if legacy_position(ioc, 'SOAK', 'HOME') and legacy_tool(ioc, *allowed):
+        return 'traj({},{})'.format('dry', ioc.tool_fbk.get())
+
+
+def legacy_home(ioc):
+    if legacy_position(ioc, 'SOAK', 'HOME', 'Undefined'):
+        return 'traj({},{})'.format('home', ioc.tool_fbk.get())
+
+
+LEGACY = {'put': legacy_put, 'dry': legacy_dry, 'home': legacy_home}
+
+
+def prepare(name, ioc):
+    try:
+        return COMMANDS.prepare(name, commands.Snapshot(ioc, 1))
+    except commands.Rejected:
+        return None
+
+
+def main():
+    ioc = database('SOAK_1', ToolType.DOUBLE)
+    print('{:>20} {:>10} {:>8} {:>12} {:>8}  {}'.format('command', 'table (us)', 'reads', 'before (us)', 'reads', 'result'))
+    for name in sorted(COMMANDS.commands):
+        ioc.reads()
+        result = prepare(name, ioc)
+        reads = ioc.reads()
+        table = timeit.timeit(lambda: prepare(name, ioc), number=REPEATS)
+        if name in LEGACY:
+            ioc.reads()
+            LEGACY[name](ioc)
+            legacy_reads = ioc.reads()
+            legacy = timeit.timeit(lambda: LEGACY[name](ioc), number=REPEATS)
+            print('{:>20} {:>10.2f} {:>8} {:>12.2f} {:>8}  {}'.format(
+                name, 1e6 * table / REPEATS, reads, 1e6 * legacy / REPEATS, legacy_reads, result
+            ))
+        else:
+            print('{:>20} {:>10.2f} {:>8} {:>12} {:>8}  {}'.format(name, 1e6 * table / REPEATS, reads, '', '', result))
+
+
+if __name__ == '__main__':
+    main()
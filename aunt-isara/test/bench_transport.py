@@ -0,0 +1,161 @@
+"""
+Benchmark of the Twisted and asyncio controller links against the fake controller. For each transport, status
+queries are sent one at a time to measure the round-trip latency and CPU time, then in bursts to check that every
+reply is delivered as a separate message. Requires Python 3 and Twisted.
+
+Run with `python test/bench_transport.py [queries]` from the aunt-isara directory.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import numpy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara import aio, isara
+from auntisara.msgs import MessageType
+
+from fakecontroller import FakeController
+
+QUERIES = 2000
+BURST = 5
+BURSTS = 50
+COMMANDS = ['state', 'di', 'do', 'position', 'message']
+
+
+class Recorder(object):
+    """
+    Stands in for the application, recording connections and received messages
+    """
+
+    def __init__(self):
+        self.pending = {MessageType.RESPONSE, MessageType.STATUS}
+        self.ready = threading.Event()
+        self.replies = queue.Queue()
+
+    def connect(self, message_type):
+        self.pending.discard(message_type)
+        if not self.pending:
+            self.ready.set()
+
+    def disconnect(self, message_type):
+        self.pending.add(message_type)
+
+    def receive_message(self, message, message_type):
+        if message_type == MessageType.STATUS:
+            self.replies.put(message)
+
+
+class TwistedTransport(object):
+    name = 'twisted'
+
+    def __init__(self, controller):
+        from twisted.internet import reactor
+        self.reactor = reactor
+        self.app = Recorder()
+        self.status_client = isara.StatusFactory(self.app)
+        self.command_client = isara.CommandFactory(self.app)
+        self.thread = threading.Thread(target=reactor.run, kwargs={'installSignalHandlers': False})
+        self.thread.daemon = True
+        self.thread.start()
+        reactor.callFromThread(reactor.connectTCP, '127.0.0.1', controller.status_port, self.status_client)
+        reactor.callFromThread(reactor.connectTCP, '127.0.0.1', controller.command_port, self.command_client)
+
+    def send(self, message):
+        self.reactor.callFromThread(self.status_client.send_message, message)
+
+    def stop(self):
+        self.status_client.stopTrying()
+        self.command_client.stopTrying()
+        self.reactor.callFromThread(self.reactor.stop)
+        self.thread.join(5)
+
+
+class AsyncioTransport(object):
+    name = 'asyncio'
+
+    def __init__(self, controller):
+        self.loop = asyncio.new_event_loop()
+        self.app = Recorder()
+        self.status_client = aio.StatusClient(self.app, loop=self.loop)
+        self.command_client = aio.CommandClient(self.app, loop=self.loop)
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.status_client.start('127.0.0.1', controller.status_port)
+        self.command_client.start('127.0.0.1', controller.command_port)
+
+    def send(self, message):
+        self.status_client.send_message(message)
+
+    def stop(self):
+        self.status_client.stop()
+        self.command_client.stop()
+        time.sleep(0.1)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+def run(transport_type, controller, queries):
+    transport = transport_type(controller)
+    if not transport.app.ready.wait(10):
+        print('{}: unable to connect'.format(transport.name))
+        return
+
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for i in range(queries):
+        start = time.perf_counter()
+        transport.send(COMMANDS[i % len(COMMANDS)])
+        transport.app.replies.get(timeout=5)
+        latencies.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    received = 0
+    for i in range(BURSTS):
+        for cmd in COMMANDS[:BURST]:
+            transport.send(cmd)
+        deadline = time.time() + 0.2
+        count = 0
+        while count < BURST and time.time() < deadline:
+            try:
+                transport.app.replies.get(timeout=max(deadline - time.time(), 0.001))
+                count += 1
+            except queue.Empty:
+                break
+        received += count
+        time.sleep(0.01)
+        while not transport.app.replies.empty():
+            transport.app.replies.get()
+    transport.stop()
+
+    latencies = 1e6 * numpy.array(latencies)
+    print('{:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.0f} {:>10.1f} {:>12}'.format(
+        transport.name, latencies.mean(), numpy.percentile(latencies, 50), numpy.percentile(latencies, 99),
+        queries / wall, 1e6 * cpu / queries, '{}/{}'.format(received, BURSTS * BURST)
+    ))
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else QUERIES
+    controller = FakeController()
+    controller.start()
+    print('{:>8} {:>10} {:>10} {:>10} {:>10} {:>10} {:>12}'.format(
+        'link', 'mean (us)', 'p50 (us)', 'p99 (us)', 'query/s', 'cpu (us)', 'burst msgs'
+    ))
+    for transport_type in (TwistedTransport, AsyncioTransport):
+        run(transport_type, controller, queries)
+    controller.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Minimal fake ISARA controller serving a command port and a status port on localhost. Status queries are answered
+with replies captured from a real controller and commands are echoed back. Messages are NUL terminated in both
+directions.
+
+Run standalone with `python test/fakecontroller.py [command_port] [status_port]`.
+"""
+import socket
+import sys
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+STATUS_REPLIES = {
+    'state': 'state(0,0,0,DoubleGripper,SOAK,,0,0,-1,-1,-1,-1,9,11,-32768,-32768,,0,0,100.0,1,7,86.15965,89.0,87.0,0,0,0,0,0)',
+    'di': 'di({})'.format(','.join('1' if i in (0, 16, 18, 20, 36, 41, 59) else '0' for i in range(100))),
+    'do': 'do({})'.format(','.join('1' if i in (8, 9, 15, 24, 29, 43) or 56 <= i < 85 else '0' for i in range(100))),
+    'position': 'position(-33.7,708.9,-415.0,178.6,-0.6,-43.4)',
+    'message': 'System OK for operation',
+}
+
+
+class ControllerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        buffer = b''
+        while True:
+            data = self.request.recv(4096)
+            if not data:
+                break
+            buffer += data
+            while b'\0' in buffer:
+                frame, buffer = buffer.split(b'\0', 1)
+                request = frame.decode('latin-1').strip()
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                reply = self.server.reply(request)
+                self.request.sendall(reply.encode('latin-1') + b'\0')
+
+
+class ControllerServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port, status=False, latency=0.0):
+        socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', port), ControllerHandler)
+        self.status = status
+        self.latency = latency
+
+    def reply(self, request):
+        if self.status:
+            return STATUS_REPLIES.get(request, 'message({})'.format(request))
+        return request
+
+
+class FakeController(object):
+    """
+    Command and status servers running in background threads. Use port 0 to pick free ports, the actual ports
+    are available as the command_port and status_port attributes once started.
+    """
+
+    def __init__(self, command_port=0, status_port=0, latency=0.0):
+        self.command_server = ControllerServer(command_port, latency=latency)
+        self.status_server = ControllerServer(status_port, status=True, latency=latency)
+        self.command_port = self.command_server.server_address[1]
+        self.status_port = self.status_server.server_address[1]
+
+    def start(self):
+        for server in (self.command_server, self.status_server):
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        for server in (self.command_server, self.status_server):
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    ports = [int(v) for v in sys.argv[1:3]] or [10000, 1000]
+    controller = FakeController(*ports)
+    controller.start()
+    print('Fake controller listening on ports {} and {}'.format(controller.command_port, controller.status_port))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        controller.stop()
@@ -0,0 +1,283 @@
+"""
+Channel Access load generator for the command and parameter records of an AuntISARA IOC. Client threads put to
+toggle and parameter records at a fixed rate while monitors watch them and a set of status records, as several
+OPIs and scripts would. Reports the put to monitor latency, toggles merged or dropped before reaching the IOC,
+CPU usage, and warns every second in which the IOC falls behind.
+
+By default an IOC is started in this process on the in-memory fake Channel Access backend, connected to the fake
+controller, and callback delays and the callback backlog are also reported. With --device, the load is applied
+to an IOC running elsewhere through libca and only client side measurements are available.
+
+Run with `python test/loadgen.py [options]` from the aunt-isara directory, e.g.
+    python test/loadgen.py --clients 4 --rate 20 --duration 30
+    python test/loadgen.py --device BL1:ISARA --toggle CMD:faster --param PAR:posTol:0.05:0.2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy
+
+LOCAL = '--device' not in sys.argv
+if LOCAL:
+    os.environ.setdefault('SOFTDEV_CA_BACKEND', 'fake')
+
+from twisted.internet import reactor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from softdev import epics, log, signals
+
+signals.set_dispatcher(signals.TwistedDispatcher(reactor))
+
+logger = log.get_module_logger('loadgen')
+
+TOGGLES = ['CMD:faster', 'CMD:slower']
+PARAMS = ['PAR:schedIdleTime:30:90', 'PAR:posTol:0.05:0.2']
+WATCH = ['STATE:poseVec', 'STATE:stateVec', 'STATUS', 'HEALTH']
+
+parser = argparse.ArgumentParser(description='Channel Access load generator for AuntISARA')
+parser.add_argument('--device', type=str, help='Device name of a running IOC, by default one is started here')
+parser.add_argument('--toggle', action='append', help='Toggle record to press, default {}'.format(TOGGLES))
+parser.add_argument(
+    '--param', action='append', help='Float parameter record and range as NAME:LOW:HIGH, default {}'.format(PARAMS)
+)
+parser.add_argument('--watch', action='append', help='Status record to monitor, default {}'.format(WATCH))
+parser.add_argument('--clients', type=int, default=2, help='Put clients per toggle and parameter record')
+parser.add_argument('--monitors', type=int, default=4, help='Monitor clients per record')
+parser.add_argument('--rate', type=float, default=10.0, help='Puts per second of each client')
+parser.add_argument('--duration', type=float, default=10.0, help='Duration of the load in seconds')
+parser.add_argument('--max-latency', type=float, default=0.25, help='Latency in seconds considered falling behind')
+
+
+class Monitor(object):
+    """
+    Counts the updates of a record, and the rising edges of toggles. Put clients register the values they send
+    so the latency to their monitor update can be measured.
+    """
+
+    def __init__(self, name, toggle=False):
+        self.pv = epics.PV(name)
+        self.toggle = toggle
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.rises = 0
+        self.last = None
+        self.sent = {}
+        self.latencies = []
+        self.pv.connect('changed', self.on_change)
+
+    def expect(self, value):
+        with self.lock:
+            self.sent[value] = time.time()
+
+    def on_change(self, pv, value):
+        now = time.time()
+        with self.lock:
+            self.updates += 1
+            if self.toggle:
+                if value and not self.last:
+                    self.rises += 1
+                self.last = value
+            sent = self.sent.pop(value, None)
+            if sent is not None:
+                self.latencies.append(now - sent)
+
+    def take_latencies(self):
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+            return latencies
+
+
+class Client(threading.Thread):
+    """
+    Puts to a record at a fixed rate. Toggles are pressed with 1, parameters are set to distinct values which
+    cycle through the range.
+    """
+
+    def __init__(self, name, monitor, rate, low=None, high=None, seed=0):
+        super(Client, self).__init__(name=name)
+        self.daemon = True
+        self.pv = epics.PV(name)
+        self.monitor = monitor
+        self.period = 1.0 / rate
+        self.low = low
+        self.high = high
+        self.seed = seed
+        self.puts = 0
+        self.running = False
+
+    def value(self):
+        if self.low is None:
+            return 1
+        steps = 1000
+        return self.low + (self.high - self.low) * (((self.puts * 7919 + self.seed) % steps) / float(steps))
+
+    def run(self):
+        epics.threads_init()
+        self.running = True
+        next_put = time.time()
+        while self.running:
+            value = self.value()
+            if self.low is not None:
+                self.monitor.expect(round(value, 6))
+            self.pv.put(value)
+            self.puts += 1
+            next_put += self.period
+            time.sleep(max(next_put - time.time(), 0))
+
+
+def wait_connected(pvs, timeout=10.0):
+    end = time.time() + timeout
+    while time.time() < end and not all(pv.is_connected() for pv in pvs):
+        time.sleep(0.05)
+    missing = [pv.name for pv in pvs if not pv.is_connected()]
+    if missing:
+        raise RuntimeError('Not connected: {}'.format(', '.join(missing)))
+
+
+def start_local():
+    """
+    Start an IOC on the fake controller in this process
+    """
+    from auntisara import ioc
+    from fakecontroller import FakeController
+
+    controller = FakeController()
+    controller.start()
+    app = ioc.AuntISARAApp(
+        'LOADGEN', '127.0.0.1', command_port=controller.command_port, status_port=controller.status_port,
+        directory=tempfile.mkdtemp(prefix='loadgen-')
+    )
+    end = time.time() + 10
+    while time.time() < end and not app.ready:
+        time.sleep(0.05)
+    app.ioc.enabled.put(1)
+    return app, controller
+
+
+def percentile(values, q):
+    return 1e3 * numpy.percentile(values, q) if len(values) else 0.0
+
+
+def main():
+    args = parser.parse_args()
+    log.log_to_console()
+    thread = threading.Thread(target=reactor.run, kwargs={'installSignalHandlers': False})
+    thread.daemon = True
+    thread.start()
+
+    app = controller = None
+    if LOCAL:
+        app, controller = start_local()
+        device = app.ioc.device_name
+    else:
+        device = args.device
+
+    toggles = args.toggle or TOGGLES
+    params = [spec.rsplit(':', 2) for spec in (args.param or PARAMS)]
+    watched = args.watch or WATCH
+
+    monitors = {}
+    clients = []
+    for name in toggles:
+        monitors[name] = [Monitor('{}:{}'.format(device, name), toggle=True) for i in range(args.monitors)]
+        clients += [
+            Client('{}:{}'.format(device, name), monitors[name][0], args.rate) for i in range(args.clients)
+        ]
+    for name, low, high in params:
+        monitors[name] = [Monitor('{}:{}'.format(device, name)) for i in range(args.monitors)]
+        clients += [
+            Client('{}:{}'.format(device, name), monitors[name][0], args.rate, float(low), float(high), seed=i)
+            for i in range(args.clients)
+        ]
+    for name in watched:
+        monitors[name] = [Monitor('{}:{}'.format(device, name)) for i in range(args.monitors)]
+
+    wait_connected([client.pv for client in clients] + [m.pv for group in monitors.values() for m in group])
+    stats_before = app.executor.get_stats() if app else {}
+
+    print('Load: {} clients at {:0.1f} puts/s, {} monitors, {:0.0f} s'.format(
+        len(clients), args.rate, sum(len(group) for group in monitors.values()), args.duration
+    ))
+    cpu_start = sum(os.times()[:2])
+    start = time.time()
+    for client in clients:
+        client.start()
+
+    latencies = []
+    behind = 0
+    while time.time() - start < args.duration:
+        time.sleep(1.0)
+        recent = sum([monitors[name][0].take_latencies() for name, low, high in params], [])
+        latencies += recent
+        backlog = app.executor.backlog() if app else 0
+        p95 = percentile(recent, 95)
+        if p95 > 1e3 * args.max_latency or backlog > len(clients):
+            behind += 1
+            print('{:6.1f} s  IOC falling behind: put to monitor p95 {:0.1f} ms, {} callbacks queued'.format(
+                time.time() - start, p95, backlog
+            ))
+
+    for client in clients:
+        client.running = False
+    for client in clients:
+        client.join()
+    wall = time.time() - start
+    cpu = sum(os.times()[:2]) - cpu_start
+    time.sleep(1.0)
+    latencies += sum([monitors[name][0].take_latencies() for name, low, high in params], [])
+
+    print('')
+    print('{:>24} {:>8} {:>8} {:>10} {:>10}'.format('toggle', 'presses', 'seen', 'merged', 'callbacks'))
+    stats_after = app.executor.get_stats() if app else {}
+    for name in toggles:
+        presses = sum(client.puts for client in clients if client.pv.name.endswith(':' + name))
+        seen = min(monitor.rises for monitor in monitors[name])
+        callbacks = callback_count(app, name, stats_before, stats_after) if app else ''
+        print('{:>24} {:>8} {:>8} {:>10} {:>10}'.format(name, presses, seen, presses - seen, callbacks))
+
+    print('')
+    print('{:>24} {:>8} {:>10} {:>10} {:>10}'.format('record', 'updates', 'min', 'max', 'monitors'))
+    for name in sorted(monitors):
+        counts = [monitor.updates for monitor in monitors[name]]
+        print('{:>24} {:>8} {:>10} {:>10} {:>10}'.format(name, sum(counts), min(counts), max(counts), len(counts)))
+
+    print('')
+    print('Put to monitor latency: median {:0.2f} ms, p95 {:0.2f} ms, max {:0.2f} ms ({} puts matched)'.format(
+        percentile(latencies, 50), percentile(latencies, 95), 1e3 * max(latencies or [0]), len(latencies)
+    ))
+    if app:
+        for name, info in sorted(stats_after.items(), key=lambda item: -item[1]['max_delay']):
+            count = info['count'] - stats_before.get(name, {}).get('count', 0)
+            if count:
+                print('Callback {}: {} calls, delay {:0.2f} ms, max {:0.2f} ms, run {:0.2f} ms'.format(
+                    name, count, 1e3 * info['delay'], 1e3 * info['max_delay'], 1e3 * info['runtime']
+                ))
+        print('Commands: {}'.format(', '.join(
+            '{} {}'.format(kind, info['count']) for kind, info in sorted(app.outbox.get_stats().items())
+        )))
+    print('CPU: {:0.1f}% of one core over {:0.1f} s, fell behind in {} of {} intervals'.format(
+        100 * cpu / wall, wall, behind, int(args.duration)
+    ))
+
+    if app:
+        app.shutdown()
+        controller.stop()
+    reactor.callFromThread(reactor.stop)
+    thread.join(5)
+
+
+def callback_count(app, name, before, after):
+    # callbacks are named after the record attribute, find the attribute serving the record name
+    for attr, field in app.ioc._fields.items():
+        if field.options.get('name') == name:
+            key = getattr(getattr(app, 'do_{}'.format(attr).lower(), None), '__name__', None)
+            return after.get(key, {}).get('count', 0) - before.get(key, {}).get('count', 0)
+    return ''
+
+
+if __name__ == '__main__':
+    main()
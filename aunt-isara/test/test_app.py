@@ -0,0 +1,70 @@
+"""
+Smoke test of the application against the fake controller, on the in-memory fake Channel Access backend.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+os.environ.setdefault('SOFTDEV_CA_BACKEND', 'fake')
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from softdev import models, signals
+from auntisara import ioc
+from fakecontroller import FakeController
+
+
+def wait_for(condition, timeout=10.0):
+    end = time.time() + timeout
+    while time.time() < end and not condition():
+        time.sleep(0.05)
+    return condition()
+
+
+@unittest.skipUnless('asyncio' in ioc.TRANSPORTS, 'asyncio links require Python 3')
+class AsyncioAppTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dispatcher = signals.get_dispatcher()
+        signals.set_dispatcher(signals.DirectDispatcher())
+        cls.directory = tempfile.mkdtemp()
+        cls.controller = FakeController()
+        cls.controller.start()
+        cls.server = models.RecordServer(directory=cls.directory)
+        cls.app = ioc.AuntISARAApp(
+            'TESTAIO', '127.0.0.1', command_port=cls.controller.command_port,
+            status_port=cls.controller.status_port, directory=cls.directory, server=cls.server, transport='asyncio'
+        )
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.shutdown()
+        cls.server.shutdown()
+        cls.controller.stop()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        signals.set_dispatcher(cls.dispatcher)
+
+    def test_ready(self):
+        self.assertTrue(wait_for(lambda: self.app.ready), 'Application not ready over the asyncio links')
+        # x coordinate of the position reply of the fake controller
+        self.assertTrue(wait_for(lambda: abs(self.app.ioc.xpos_fbk.get() + 33.7) < 1e-3), 'No status received')
+        self.assertEqual(self.app.ioc.connected.get(), 1)
+
+    def test_command_sent(self):
+        self.assertTrue(wait_for(lambda: self.app.ready))
+        sent = self.app.outbox.get_stats()['speed']['count']
+        self.app.ioc.enabled.put(1)
+        self.app.ioc.faster_cmd.put(1)
+        self.assertTrue(
+            wait_for(lambda: self.app.outbox.get_stats()['speed']['count'] > sent), 'Command not sent'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
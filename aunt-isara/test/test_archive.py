@@ -0,0 +1,71 @@
+"""
+Unit tests of the columnar status archive.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara import archive
+
+CONTEXTS = ['state', 'position', 'di', 'do', 'message']
+STATE_FIELDS = 8
+
+
+class ArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = archive.StatusArchive(self.directory, CONTEXTS, STATE_FIELDS, rows=16)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+    def rows(self):
+        return archive.query(self.directory, 0, time.time() + 1)
+
+    def test_rows_are_snapshots(self):
+        now = time.time()
+        self.archive.add('di', 'di', [1, 2, 3, 4], timestamp=now)
+        self.archive.add('message', 'error', 0x11, timestamp=now + 0.1)
+        rows = self.rows()
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(list(rows['context']), [CONTEXTS.index('di'), CONTEXTS.index('message')])
+        self.assertEqual(list(rows[1]['di']), [1, 2, 3, 4])
+        self.assertEqual(rows[1]['error'], 0x11)
+
+    def test_short_reply_padded(self):
+        now = time.time()
+        self.archive.add('do', 'do', [1, 2, 3, 4], timestamp=now)
+        self.archive.add('do', 'do', [5, 6], timestamp=now + 0.1)
+        self.archive.add('state', 'state', range(STATE_FIELDS + 2), timestamp=now + 0.2)
+        rows = self.rows()
+        self.assertEqual(list(rows[1]['do']), [5, 6, 0, 0])
+        self.assertEqual(list(rows[2]['state']), list(range(STATE_FIELDS)))
+
+    def test_update_without_row(self):
+        now = time.time()
+        self.archive.add('message', 'error', 0x4, timestamp=now)
+        self.archive.update('error', 0)
+        self.archive.add('position', 'pose', [1, 2, 3, 4, 5, 6], timestamp=now + 0.1)
+        rows = self.rows()
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(list(rows['error']), [0x4, 0])
+
+    def test_query_interval(self):
+        now = time.time()
+        for i in range(10):
+            self.archive.add('state', timestamp=now + i)
+        rows = archive.query(self.directory, now + 2, now + 5, columns=['time'])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows.dtype.names, ('time',))
+
+
+if __name__ == '__main__':
+    unittest.main()
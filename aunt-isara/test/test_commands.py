@@ -0,0 +1,158 @@
+"""
+Unit tests of the command table which validates and encodes the commands sent from the records.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara import commands
+from auntisara.ioc import COMMANDS, ToolType
+
+
+class Record(object):
+    def __init__(self, value):
+        self.value = value
+        self.reads = 0
+
+    def get(self):
+        self.reads += 1
+        return self.value
+
+
+class Database(object):
+    """
+    Stand-in for the records read by the command table
+    """
+
+    def __init__(self, position='SOAK', tool=ToolType.DOUBLE, **values):
+        defaults = dict(
+            position_fbk=position, tool_fbk=tool.value, tool_param=tool.value, tooled_fbk='1A3', puck_param=3,
+            sample_param=7, plate_param=1, datamatrix_scan=1, next_puck=4, next_sample=2, sample_type=0,
+            next_sample_type=0, next_param='2A5', jaw_param=1,
+        )
+        defaults.update(values)
+        self.records = {name: Record(value) for name, value in defaults.items()}
+        self.__dict__.update(self.records)
+
+
+def prepare(name, value=1, positions=True, **kwargs):
+    return COMMANDS.prepare(name, commands.Snapshot(Database(**kwargs), value), positions=positions)
+
+
+class PositionTestCase(unittest.TestCase):
+
+    def test_pattern(self):
+        pattern = commands.position_pattern('SOAK', 'HOME')
+        for position in ['SOAK', 'HOME', 'SOAK_2', 'HOME_left', 'SOAK_']:
+            self.assertTrue(pattern.match(position), position)
+        for position in ['SOAKED', 'XSOAK', 'DRY', 'Undefined', '']:
+            self.assertFalse(pattern.match(position), position)
+        self.assertIs(pattern, commands.position_pattern('SOAK', 'HOME'))
+
+    def test_no_positions_defined(self):
+        with self.assertRaises(commands.Rejected) as context:
+            prepare('put', positions=False)
+        self.assertEqual(str(context.exception), 'No positions have been defined')
+        self.assertIn('`SOAK`', context.exception.help)
+
+        # commands allowed from any position do not need positions
+        self.assertEqual(prepare('safe', positions=False), 'safe(3)')
+
+    def test_position_variants(self):
+        self.assertEqual(prepare('dry', position='SOAK_2'), 'traj(dry,3)')
+        self.assertEqual(prepare('dry', position='HOME_1'), 'traj(dry,3)')
+        with self.assertRaises(commands.Rejected) as context:
+            prepare('put', position='HOME')
+        self.assertEqual(str(context.exception), 'Command allowed only from ` SOAK ` position')
+        self.assertTrue(context.exception.help)
+
+
+class ToolTestCase(unittest.TestCase):
+
+    def test_variant_selection(self):
+        self.assertTrue(prepare('put').startswith('traj(put,'))
+        self.assertEqual(prepare('put', tool=ToolType.PLATE), 'traj(putplate,6,1)')
+        self.assertEqual(prepare('get', tool=ToolType.PLATE), 'traj(getplate,6)')
+        self.assertEqual(prepare('getput', tool=ToolType.PLATE), 'traj(getplate,6)')
+
+    def test_invalid_tool(self):
+        for name in ['put', 'soak', 'pick', 'settool']:
+            with self.assertRaises(commands.Rejected) as context:
+                prepare(name, position='HOME' if name == 'soak' else 'SOAK', tool=ToolType.LASER)
+            self.assertEqual(str(context.exception), 'Invalid tool for command!')
+
+    def test_any_tool(self):
+        self.assertEqual(prepare('home', tool=ToolType.LASER), 'traj(home,8)')
+
+
+class CheckTestCase(unittest.TestCase):
+
+    def assertRejected(self, message, name, **kwargs):
+        with self.assertRaises(commands.Rejected) as context:
+            prepare(name, **kwargs)
+        self.assertEqual(str(context.exception), message)
+
+    def test_checks(self):
+        self.assertRejected('Requested tool already present, command ignored', 'changetool', position='HOME')
+        self.assertRejected('No sample on tool, command ignored', 'back', tooled_fbk='')
+        self.assertRejected(
+            'Please select a puck number', 'teachpuck', position='HOME', tool=ToolType.LASER, puck_param=0
+        )
+        self.assertRejected('No Sample specified', 'setdiffr', next_param='')
+        self.assertRejected('No Sample specified', 'settool', next_param='P2')
+
+    def test_check_passes(self):
+        self.assertEqual(
+            prepare('changetool', position='HOME', tool_param=ToolType.LASER.value), 'traj(changetool,8)'
+        )
+
+    def test_records_read_once(self):
+        database = Database()
+        COMMANDS.prepare('put', commands.Snapshot(database, 1))
+        self.assertTrue(all(record.reads <= 1 for record in database.records.values()))
+
+
+class EncodingTestCase(unittest.TestCase):
+    """
+    The table encodes every command as the per-command handlers it replaced did
+    """
+    LEGACY = [
+        ('restart', {}, 'restart'),
+        ('clearmemory', {}, 'clearmemory'),
+        ('reset parameters', {}, 'reset parameters'),
+        ('resetMotion', {}, 'resetMotion'),
+        ('speedup', {}, 'speedup'),
+        ('safe', {}, 'safe(3)'),
+        ('home', {'position': 'Undefined'}, 'traj(home,3)'),
+        ('recover', {'position': 'DRY'}, 'traj(recover,3)'),
+        ('put', {}, 'traj(put,3,3,7,1,4,2,0,0,0,0,0,0,0)'),
+        ('get', {}, 'traj(get,3,0,0,1,0,0,0,0,0,0,0,0,0)'),
+        ('getput', {}, 'traj(getput,3,3,7,1,4,2,0,0,0,0,0,0,0)'),
+        ('datamatrix', {}, 'traj(datamatrix,3,3,7,0,0,0,0)'),
+        ('back', {}, 'traj(back,3)'),
+        ('soak', {'position': 'HOME'}, 'traj(soak,3)'),
+        ('dry', {}, 'traj(dry,3)'),
+        ('pick', {'position': 'DRY'}, 'traj(pick,3,3,7,1,0,0,0)'),
+        ('toolcal', {'position': 'HOME'}, 'traj(toolcal,3)'),
+        ('teachgonio', {'position': 'HOME', 'tool': ToolType.LASER}, 'traj(teachgonio,8)'),
+        ('teachpuck', {'position': 'HOME', 'tool': ToolType.LASER}, 'traj(teachpuck,8,3)'),
+        ('teachdewar', {'position': 'HOME', 'tool': ToolType.LASER}, 'traj(teachdewar,8,3)'),
+        ('setdiffr', {}, 'setdiffr(2,5,0)'),
+        ('settool', {}, 'settool(2,5,0,1)'),
+        ('settool2', {}, 'settool2(2,5,0)'),
+    ]
+
+    def test_legacy_encoding(self):
+        for name, kwargs, expected in self.LEGACY:
+            self.assertEqual(prepare(name, **kwargs), expected, name)
+
+    def test_value_setters(self):
+        for name in ['setmaxsoaktime', 'setmaxsoaknb', 'setautocloselidtimer', 'setautodrytimer', 'sethighln2']:
+            self.assertEqual(prepare(name, value=45), '{}(45)'.format(name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Unit tests of the controller link message framing.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara.msgs import MessageFramer
+
+
+class FramerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.framer = MessageFramer()
+
+    def test_burst(self):
+        messages = self.framer.feed(b'state(0,1)\0di(1,0)\0System OK\0')
+        self.assertEqual(messages, ['state(0,1)', 'di(1,0)', 'System OK'])
+
+    def test_split_frames(self):
+        self.assertEqual(self.framer.feed(b'position(1.0,'), ['position(1.0,'])
+        self.framer.reset()
+        self.assertEqual(self.framer.feed(b'a\0position(1.0,'), ['a'])
+        self.assertEqual(self.framer.feed(b'2.0)'), [])
+        self.assertEqual(self.framer.feed(b'\0'), ['position(1.0,2.0)'])
+
+    def test_empty_message(self):
+        self.assertEqual(self.framer.feed(b'x\0\0'), ['x', ''])
+
+    def test_undelimited(self):
+        # until a terminator is seen, each chunk is a message
+        self.assertEqual(self.framer.feed(b'state(0,1)'), ['state(0,1)'])
+        self.assertEqual(self.framer.feed(b'di(1)'), ['di(1)'])
+        self.assertFalse(self.framer.delimited)
+
+    def test_oversized(self):
+        framer = MessageFramer(limit=8)
+        framer.feed(b'\0')
+        self.assertEqual(framer.feed(b'0123456789'), ['0123456789'])
+        self.assertEqual(framer.buffer, b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Unit tests of the dewar inventory bitsets.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara.inventory import Inventory, PortState, bit_indices, mask_names
+
+PUCKS = 4
+SAMPLES = 16
+PLATES = 2
+
+
+class BitTestCase(unittest.TestCase):
+
+    def test_bit_indices(self):
+        self.assertEqual(bit_indices(0), [])
+        self.assertEqual(bit_indices(0b101001), [0, 3, 5])
+        self.assertEqual(bit_indices(1 << 40), [40])
+
+    def test_mask_names(self):
+        self.assertEqual(mask_names(0b1011, ['A', 'B', 'C']), {'A', 'B'})
+
+
+class InventoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.inventory = Inventory(PUCKS, SAMPLES, PLATES)
+
+    def state(self, puck, sample):
+        return self.inventory.get_occupancy()[(puck - 1) * SAMPLES + sample - 1]
+
+    def test_update_pucks(self):
+        added, removed = self.inventory.update_pucks(0b0101)
+        self.assertEqual((added, removed), (0b0101, 0))
+        self.assertEqual(self.inventory.samples, [0xFFFF, 0, 0xFFFF, 0])
+        added, removed = self.inventory.update_pucks(0b0110)
+        self.assertEqual((added, removed), (0b0010, 0b0001))
+        self.assertEqual(self.inventory.samples, [0, 0xFFFF, 0xFFFF, 0])
+        self.assertEqual(self.inventory.update_pucks(0b0110), (0, 0))
+
+    def test_occupancy(self):
+        self.inventory.update_pucks(0b0001)
+        occupancy = self.inventory.get_occupancy()
+        self.assertEqual(len(occupancy), PUCKS * SAMPLES + PLATES)
+        self.assertTrue((occupancy[:SAMPLES] == PortState.PRESENT.value).all())
+        self.assertTrue((occupancy[SAMPLES:PUCKS * SAMPLES] == PortState.EMPTY.value).all())
+        self.assertTrue((occupancy[PUCKS * SAMPLES:] == PortState.PRESENT.value).all())
+        self.assertFalse(self.inventory.dirty)
+
+    def test_tool_and_gonio(self):
+        self.inventory.update_pucks(0b0001)
+        self.assertTrue(self.inventory.set_location('tool', 1, 3))
+        self.assertFalse(self.inventory.set_location('tool', 1, 3))
+        self.assertEqual(self.state(1, 3), PortState.TOOL.value)
+
+        # pin moves from the tool to the goniometer
+        self.inventory.set_location('gonio', 1, 3)
+        self.inventory.set_location('tool', 0, 0)
+        self.assertEqual(self.state(1, 3), PortState.GONIO.value)
+
+        # dismounted pin returns to its port
+        self.inventory.set_location('gonio', -1, -1)
+        self.assertEqual(self.state(1, 3), PortState.PRESENT.value)
+
+    def test_tool_jaw_b(self):
+        self.inventory.update_pucks(0b0001)
+        self.inventory.set_location('tool', 1, 1)
+        self.inventory.set_location('toolb', 1, 2)
+        self.assertEqual(self.state(1, 1), PortState.TOOL.value)
+        self.assertEqual(self.state(1, 2), PortState.TOOL.value)
+        self.assertFalse(self.inventory.samples[0] & 0b11)
+        self.inventory.set_location('toolb', 0, 0)
+        self.assertEqual(self.state(1, 2), PortState.PRESENT.value)
+        self.assertEqual(self.state(1, 1), PortState.TOOL.value)
+
+    def test_held_pin_survives_puck_reload(self):
+        self.inventory.update_pucks(0b0001)
+        self.inventory.set_location('toolb', 1, 5)
+        self.inventory.update_pucks(0)
+        self.inventory.update_pucks(0b0001)
+        self.assertFalse(self.inventory.samples[0] & (1 << 4))
+        self.assertEqual(self.state(1, 5), PortState.TOOL.value)
+
+    def test_pin_of_removed_puck_not_returned(self):
+        self.inventory.update_pucks(0b0001)
+        self.inventory.set_location('gonio', 1, 7)
+        self.inventory.update_pucks(0)
+        self.inventory.set_location('gonio', 0, 0)
+        self.assertEqual(self.inventory.samples[0], 0)
+        self.assertEqual(self.state(1, 7), PortState.EMPTY.value)
+
+    def test_plates(self):
+        self.assertTrue(self.inventory.set_plate(2))
+        self.assertEqual(list(self.inventory.get_occupancy()[PUCKS * SAMPLES:]), [
+            PortState.PRESENT.value, PortState.TOOL.value
+        ])
+        self.assertFalse(self.inventory.set_plate(2))
+        self.assertTrue(self.inventory.set_plate(0))
+        self.assertEqual(self.inventory.tool_plate, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
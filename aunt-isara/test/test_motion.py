@@ -0,0 +1,102 @@
+"""
+Unit tests of the robot pose history and motion detection.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import sys
+import unittest
+
+import numpy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara.motion import PoseHistory
+
+
+def pose(x=0.0, rz=0.0):
+    return [x, 0.0, 0.0, 0.0, 0.0, rz]
+
+
+class PoseHistoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.history = PoseHistory(size=4, start_speed=1.0, stop_speed=0.2, start_rate=1.0, stop_rate=0.2, settle=2)
+        self.t = 100.0
+        self.x = 0.0
+        self.rz = 0.0
+
+    def step(self, dx=0.0, drz=0.0, dt=1.0):
+        self.t += dt
+        self.x += dx
+        self.rz += drz
+        return self.history.add(pose(self.x, self.rz), timestamp=self.t)
+
+    def test_start_stop_hysteresis(self):
+        self.history.add(pose(), timestamp=self.t)
+        self.assertFalse(self.history.moving)
+        self.step(0.5)
+        self.assertFalse(self.history.moving, 'started below the start speed')
+        self.assertEqual(self.step(10.0), 10.0)
+        self.assertTrue(self.history.moving)
+        self.assertEqual(self.history.speed(), 10.0)
+
+        self.step(0.5)
+        self.assertTrue(self.history.moving, 'stopped above the stop speed')
+        self.step(0.1)
+        self.assertTrue(self.history.moving, 'stopped before settling')
+        self.step(0.5)
+        self.step(0.1)
+        self.assertTrue(self.history.moving, 'slow samples not consecutive')
+        self.step(0.1)
+        self.assertFalse(self.history.moving)
+
+    def test_rotation_starts_motion(self):
+        self.history.add(pose(), timestamp=self.t)
+        self.step(drz=5.0)
+        self.assertTrue(self.history.moving)
+        self.assertEqual(self.history.speed(), 0.0)
+
+    def test_angle_wrap(self):
+        self.history.add(pose(rz=179.95), timestamp=self.t)
+        self.history.add(pose(rz=-179.95), timestamp=self.t + 1.0)
+        self.assertFalse(self.history.moving, 'a 0.1 deg turn across +-180 taken as a full turn')
+        self.history.add(pose(rz=178.0), timestamp=self.t + 2.0)
+        self.assertTrue(self.history.moving)
+
+    def test_repeated_timestamp(self):
+        self.history.add(pose(0.0), timestamp=10.0)
+        self.assertEqual(self.history.add(pose(5.0), timestamp=10.0), 5.0)
+        self.assertEqual(self.history.speed(), 0.0)
+        self.history.add(pose(7.0), timestamp=11.0)
+        self.history.add(pose(11.0), timestamp=12.0)
+
+        times, velocities = self.history.velocity()
+        self.assertEqual(list(times), [10.5, 11.5])
+        self.assertEqual(list(velocities[:, 0]), [2.0, 4.0])
+        times, accelerations = self.history.acceleration()
+        self.assertEqual(list(times), [11.0])
+        self.assertEqual(list(accelerations[:, 0]), [2.0])
+        self.assertFalse(numpy.isnan(accelerations).any())
+
+    def test_ring_wrap(self):
+        for i in range(6):
+            self.step(float(i))
+        self.assertEqual(len(self.history), 4)
+        times, poses = self.history.latest()
+        self.assertEqual(list(times), [103.0, 104.0, 105.0, 106.0])
+        self.assertEqual(list(poses[:, 0]), [3.0, 6.0, 10.0, 15.0])
+        times, poses = self.history.latest(2)
+        self.assertEqual(list(times), [105.0, 106.0])
+        self.assertEqual(list(self.history.speed_history()), [2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(list(self.history.speed_history(10)), [2.0, 3.0, 4.0, 5.0])
+
+    def test_empty(self):
+        times, poses = self.history.latest()
+        self.assertEqual((len(times), poses.shape), (0, (0, 6)))
+        self.assertEqual(self.history.speed(), 0.0)
+        self.assertEqual(len(self.history.velocity()[0]), 0)
+        self.assertEqual(len(self.history.acceleration()[0]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
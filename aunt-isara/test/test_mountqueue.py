@@ -0,0 +1,108 @@
+"""
+Unit tests of the mount queue and the throughput estimate.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import sys
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara import mountqueue
+
+
+class Clock(object):
+    """
+    Replacement for the time module of the module under test, time only advances when told to
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class MountQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = mountqueue.MountQueue()
+        for port in ['1A1', '1A2', '1A3']:
+            self.queue.add(port)
+
+    def test_start_passes_next_port(self):
+        self.assertEqual(self.queue.start(), ('1A1', '1A2'))
+        self.assertEqual(self.queue.active, '1A1')
+        self.assertEqual(self.queue.text(), '1A1 1A2 1A3')
+
+    def test_one_mount_at_a_time(self):
+        self.queue.start()
+        self.assertEqual(self.queue.start(), (None, ''))
+
+    def test_complete(self):
+        self.queue.start()
+        self.assertFalse(self.queue.complete('1A2'))
+        self.assertTrue(self.queue.complete('1A1'))
+        self.assertEqual((len(self.queue), self.queue.completed, self.queue.active), (2, 1, None))
+        self.assertFalse(self.queue.complete('1A2'))
+
+        self.assertEqual(self.queue.start(), ('1A2', '1A3'))
+        self.queue.complete('1A2')
+        self.assertEqual(self.queue.start(), ('1A3', ''))
+        self.queue.complete('1A3')
+        self.assertEqual(self.queue.start(), (None, ''))
+        self.assertEqual(self.queue.completed, 3)
+
+    def test_cancel_keeps_port(self):
+        self.queue.start()
+        self.queue.cancel()
+        self.assertIsNone(self.queue.active)
+        self.assertEqual(self.queue.start(), ('1A1', '1A2'))
+
+    def test_clear(self):
+        self.queue.start()
+        self.queue.clear()
+        self.assertEqual((len(self.queue), self.queue.active, self.queue.text()), (0, None, ''))
+        self.assertFalse(self.queue.complete('1A1'))
+
+
+class ThroughputTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        mountqueue.time = self.clock
+        self.throughput = mountqueue.Throughput(window=3)
+
+    def tearDown(self):
+        mountqueue.time = time
+
+    def mount(self, port, pipelined, duration):
+        self.throughput.start(port, pipelined)
+        self.clock.now += duration
+        return self.throughput.stop(port)
+
+    def test_rates(self):
+        self.assertEqual(self.throughput.rate(True), 0.0)
+        self.assertTrue(self.mount('1A1', False, 60.0))
+        self.assertTrue(self.mount('1A2', True, 30.0))
+        self.assertTrue(self.mount('1A3', True, 10.0))
+        self.assertAlmostEqual(self.throughput.rate(False), 60.0)
+        self.assertAlmostEqual(self.throughput.rate(True), 180.0)
+
+    def test_other_port_not_recorded(self):
+        self.throughput.start('1A1', True)
+        self.assertFalse(self.throughput.stop('1A2'))
+        self.assertTrue(self.throughput.stop('1A1'))
+        self.assertFalse(self.throughput.stop('1A1'))
+
+    def test_window(self):
+        for i in range(3):
+            self.mount('1A1', False, 100.0)
+        for i in range(3):
+            self.mount('1A1', False, 20.0)
+        self.assertAlmostEqual(self.throughput.rate(False), 180.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Unit tests of the controller command outbox.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara import outbox
+
+
+class OutboxTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.outbox = outbox.Outbox(self.sent.append)
+
+    def drain(self):
+        commands = []
+        while True:
+            entry = self.outbox.get(timeout=0)
+            if entry is None:
+                return commands
+            commands.append(entry.command)
+
+    def test_command_class(self):
+        self.assertEqual(outbox.command_class('abort'), outbox.SAFETY)
+        self.assertEqual(outbox.command_class('reset'), outbox.CONTROL)
+        self.assertEqual(outbox.command_class('speedup'), outbox.SPEED)
+        self.assertEqual(outbox.command_class('traj(home,1)'), outbox.TRAJECTORY)
+        self.assertEqual(outbox.command_class('setspeed(50)'), outbox.SETTER)
+        self.assertEqual(outbox.command_class('put(1,1,1,2,3)'), outbox.COMMAND)
+
+    def test_order(self):
+        for command in ['put(1,1,1,2,3)', 'traj(home,1)', 'setspeed(50)', 'reset', 'openlid']:
+            self.outbox.put(command)
+        self.assertEqual(len(self.outbox), 5)
+        self.assertEqual(self.drain(), ['reset', 'put(1,1,1,2,3)', 'traj(home,1)', 'setspeed(50)', 'openlid'])
+        self.assertEqual(len(self.outbox), 0)
+
+    def test_safety_bypasses_queue(self):
+        self.outbox.put('openlid')
+        self.outbox.put('pause')
+        self.assertEqual(self.sent, ['pause'])
+        self.assertEqual(self.drain(), ['openlid'])
+
+    def test_purge(self):
+        for command in ['openlid', 'setspeed(50)', 'speedup']:
+            self.outbox.put(command)
+        self.outbox.put('abort')
+        self.assertEqual(self.sent, ['abort'])
+        self.assertEqual(len(self.outbox), 0)
+
+        # nothing queued before the purge is coalesced with
+        self.outbox.put('speeddown')
+        self.outbox.put('setspeed(60)')
+        self.outbox.put('panic')
+        self.outbox.put('setspeed(70)')
+        self.assertEqual(self.drain(), ['setspeed(70)'])
+        self.assertEqual(self.sent, ['abort', 'panic'])
+
+    def test_setter_coalesced_at_tail(self):
+        self.outbox.put('setspeed(50)')
+        self.outbox.put('setspeed(60)')
+        self.assertEqual(self.drain(), ['setspeed(60)'])
+        self.assertEqual(self.outbox.get_stats()[outbox.SETTER]['coalesced'], 1)
+
+    def test_setter_not_moved_past_commands(self):
+        self.outbox.put('setspeed(50)')
+        self.outbox.put('traj(home,1)')
+        self.outbox.put('setspeed(60)')
+        self.outbox.put('settool(1)')
+        self.outbox.put('setspeed(70)')
+        self.assertEqual(self.drain(), [
+            'setspeed(50)', 'traj(home,1)', 'setspeed(60)', 'settool(1)', 'setspeed(70)'
+        ])
+
+    def test_setter_after_send(self):
+        self.outbox.put('setspeed(50)')
+        self.assertEqual(self.outbox.send_next(timeout=0), 'setspeed(50)')
+        self.outbox.put('setspeed(60)')
+        self.assertEqual(self.drain(), ['setspeed(60)'])
+
+    def test_speed_netted_at_tail(self):
+        for command in ['speedup', 'speedup', 'speedup', 'speeddown']:
+            self.outbox.put(command)
+        self.assertEqual(len(self.outbox), 1)
+        self.assertEqual(self.drain(), ['speedup', 'speedup'])
+
+        self.outbox.put('speedup')
+        self.outbox.put('speeddown')
+        self.assertEqual(len(self.outbox), 0)
+        self.assertEqual(self.drain(), [])
+
+    def test_speed_not_moved_past_commands(self):
+        self.outbox.put('speedup')
+        self.outbox.put('traj(home,1)')
+        self.outbox.put('speeddown')
+        self.assertEqual(self.drain(), ['speedup', 'traj(home,1)', 'speeddown'])
+
+    def test_speed_steps_sent_one_at_a_time(self):
+        self.outbox.put('speeddown')
+        self.outbox.put('speeddown')
+        self.assertEqual(self.outbox.get(timeout=0).command, 'speeddown')
+
+        # the remaining step is still the last entry
+        self.outbox.put('speedup')
+        self.assertEqual(self.drain(), [])
+
+        self.outbox.put('speedup')
+        self.outbox.put('speedup')
+        self.outbox.get(timeout=0)
+        self.outbox.put('openlid')
+        self.outbox.put('speeddown')
+        self.assertEqual(self.drain(), ['speedup', 'openlid', 'speeddown'])
+
+    def test_transport_error(self):
+        def fail(command):
+            raise IOError('not connected')
+
+        box = outbox.Outbox(fail)
+        box.put('openlid')
+        self.assertEqual(box.send_next(timeout=0), 'openlid')
+        self.assertEqual(box.get_stats()[outbox.COMMAND]['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Unit tests of the flight recorder.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import numpy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara import recorder
+
+STATE_TYPE = numpy.dtype([('context', 'u1'), ('pose', '<f4', (6,))])
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end and not condition():
+        time.sleep(0.01)
+    return condition()
+
+
+class RingTestCase(unittest.TestCase):
+
+    def test_since_wraps(self):
+        ring = recorder.Ring(4, '<i4')
+        for i in range(1, 7):
+            ring.add(10 * i, float(i))
+        times, values = ring.since(0.0)
+        self.assertEqual(list(times), [3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(list(values), [30, 40, 50, 60])
+        times, values = ring.since(5.0)
+        self.assertEqual(list(values), [50, 60])
+        self.assertEqual(len(ring.since(7.0)[0]), 0)
+
+    def test_since_copies(self):
+        ring = recorder.Ring(4, '<i4')
+        ring.add(1, 1.0)
+        times, values = ring.since(0.0)
+        ring.add(2, 2.0)
+        ring.data[0] = 5
+        self.assertEqual(list(values), [1])
+
+    def test_partially_filled(self):
+        ring = recorder.Ring(4, '<i4')
+        self.assertEqual(len(ring.since(0.0)[0]), 0)
+        ring.add(1, 1.0)
+        ring.add(2, 2.0)
+        self.assertEqual(list(ring.since(0.0)[1]), [1, 2])
+
+
+class FlightRecorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.handler = ListHandler()
+        self.logger = logging.getLogger('test_recorder')
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.saved = []
+        self.recorder = recorder.FlightRecorder(
+            self.directory, STATE_TYPE, seconds=10.0, frames=8, commands=4, post_trigger=0.2, keep=3,
+            callback=self.saved.append, logger=self.logger
+        )
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        shutil.rmtree(self.directory)
+
+    def test_dump_contents(self):
+        now = time.time()
+        self.recorder.add_frame(1, 'too old', timestamp=now - 20)
+        self.recorder.add_frame(1, 'state(0,1)', timestamp=now - 1)
+        self.recorder.add_frame(2, u'message(\xb5)', timestamp=now - 0.5)
+        row = numpy.zeros(1, dtype=STATE_TYPE)[0]
+        row['pose'] = [1, 2, 3, 4, 5, 6]
+        self.recorder.add_state(row, timestamp=now - 1)
+        self.recorder.add_command('traj(put,' + 'x' * 200, timestamp=now - 2)
+
+        path = self.recorder.dump()
+        self.assertEqual(self.saved, [path])
+        self.assertEqual(self.recorder.last_dump, path)
+        data = numpy.load(path)
+        self.assertEqual(set(data.files), {
+            'trigger_times', 'triggers', 'frame_times', 'frame_kinds', 'frames', 'state_times', 'states',
+            'command_times', 'commands'
+        })
+        self.assertEqual(list(data['frames']), [b'state(0,1)', u'message(\xb5)'.encode('utf-8')])
+        self.assertEqual(list(data['frame_kinds']), [1, 2])
+        self.assertEqual(list(data['frame_times']), [now - 1, now - 0.5])
+        self.assertEqual(list(data['states']['pose'][0]), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(len(data['commands'][0]), 128)
+        self.assertEqual(len(data['triggers']), 0)
+
+    def test_triggers_merged(self):
+        self.recorder.add_command('abort')
+        self.recorder.trigger('fault')
+        self.recorder.trigger('collision')
+        self.assertTrue(wait_for(lambda: self.saved), 'No dump written')
+        time.sleep(0.4)
+        self.assertEqual(len(self.saved), 1)
+        data = numpy.load(self.saved[0])
+        self.assertEqual(list(data['triggers']), [b'fault', b'collision'])
+        self.assertEqual(list(data['commands']), [b'abort'])
+        self.assertIn('Flight record (fault, collision) saved to {}'.format(self.saved[0]), self.handler.messages)
+
+        # a trigger after the dump starts a new one
+        self.recorder.trigger('health error')
+        self.assertTrue(wait_for(lambda: len(self.saved) == 2))
+
+    def test_expire(self):
+        for i in range(5):
+            open(os.path.join(self.directory, 'flight-20260101-00000{}-0.npz'.format(i)), 'w').close()
+        open(os.path.join(self.directory, 'other.npz'), 'w').close()
+        self.recorder.expire()
+        self.assertEqual(sorted(os.listdir(self.directory)), [
+            'flight-20260101-000002-0.npz', 'flight-20260101-000003-0.npz', 'flight-20260101-000004-0.npz',
+            'other.npz'
+        ])
+
+    def test_write_error(self):
+        shutil.rmtree(self.directory)
+        self.assertIsNone(self.recorder.dump())
+        os.makedirs(self.directory)
+        self.assertTrue(any(message.startswith('Unable to write') for message in self.handler.messages))
+        self.assertEqual(self.saved, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit tests of the soak and dry scheduler decisions.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import sys
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara.msgs import StatusType
+from auntisara.scheduler import SchedulerState, SoakScheduler
+
+IDLE_TIME = 60.0
+
+
+def make_state(**kwargs):
+    state = dict(
+        status=StatusType.IDLE.value, position='SOAK', soak_count=10, max_soak_count=12, max_soak_time=0,
+        queued=0, mounting=False, pending=False, moving=False,
+    )
+    state.update(kwargs)
+    return SchedulerState(**state)
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = SoakScheduler(idle_time=IDLE_TIME)
+        self.scheduler.enabled = True
+        self.scheduler.last_activity = time.time() - 2 * IDLE_TIME
+
+    def test_dry_when_soaks_run_out(self):
+        action, reason = self.scheduler.evaluate(make_state(soak_count=12))
+        self.assertEqual(action, 'dry', reason)
+        self.assertEqual(self.scheduler.evaluate(make_state(soak_count=11)), (None, ''))
+
+    def test_disabled(self):
+        self.scheduler.enabled = False
+        self.assertEqual(self.scheduler.evaluate(make_state(soak_count=12)), (None, ''))
+
+    def test_not_idle_long_enough(self):
+        self.scheduler.activity()
+        self.assertEqual(self.scheduler.evaluate(make_state(soak_count=12)), (None, ''))
+
+    def test_robot_busy_or_moving(self):
+        busy = make_state(soak_count=12, status=StatusType.BUSY.value)
+        self.assertEqual(self.scheduler.evaluate(busy), (None, ''))
+        self.assertEqual(self.scheduler.evaluate(make_state(soak_count=12, moving=True)), (None, ''))
+
+    def test_never_while_mount_imminent(self):
+        for imminent in [dict(queued=1), dict(mounting=True), dict(pending=True)]:
+            self.assertEqual(self.scheduler.evaluate(make_state(soak_count=12, **imminent)), (None, ''), imminent)
+
+    def test_burst_prediction(self):
+        # a burst of five mounts, more than the soaks left, then an idle window
+        for i in range(5):
+            self.scheduler.mount_requested()
+        self.scheduler.last_mount -= 2 * IDLE_TIME
+        self.assertEqual(self.scheduler.evaluate(make_state(soak_count=8))[0], 'dry')
+        self.assertEqual(self.scheduler.evaluate(make_state(soak_count=7))[0], None)
+
+        # a new burst starts counting again but the last one is remembered
+        self.scheduler.mount_requested()
+        self.assertEqual(self.scheduler.last_burst, 5)
+        self.assertEqual(self.scheduler.burst, 1)
+
+    def test_soak_time(self):
+        self.scheduler.soak_since = time.time() - 1000
+        action, reason = self.scheduler.evaluate(make_state(soak_count=1, max_soak_time=1100))
+        self.assertEqual(action, 'dry', reason)
+        self.assertEqual(self.scheduler.evaluate(make_state(soak_count=1, max_soak_time=2000)), (None, ''))
+
+    def test_not_soaked(self):
+        self.assertEqual(self.scheduler.evaluate(make_state(soak_count=0)), (None, ''))
+
+    def test_soak_after_scheduled_dry(self):
+        self.assertEqual(self.scheduler.evaluate(make_state(position='HOME')), (None, ''))
+        self.scheduler.start('dry', 'test')
+        self.assertEqual(self.scheduler.evaluate(make_state(soak_count=12)), (None, ''))
+        self.scheduler.status_changed(StatusType.DRYING.value, 10.0)
+        self.assertTrue(self.scheduler.status_changed(StatusType.IDLE.value, 10.0))
+        self.assertEqual(self.scheduler.saved, 10.0)
+
+        self.scheduler.last_activity = time.time() - 2 * IDLE_TIME
+        self.assertEqual(self.scheduler.evaluate(make_state(position='HOME', soak_count=0))[0], 'soak')
+        self.assertEqual(self.scheduler.evaluate(make_state(position='HOME', pending=True)), (None, ''))
+
+    def test_deferred_mount(self):
+        self.assertFalse(self.scheduler.defer_mount())
+        self.scheduler.start('dry', 'test')
+        self.assertTrue(self.scheduler.defer_mount())
+        self.assertFalse(self.scheduler.take_deferred())
+        self.scheduler.status_changed(StatusType.FAULT.value, 0.0)
+        self.assertFalse(self.scheduler.take_deferred())
+
+        self.scheduler.start('dry', 'test')
+        self.scheduler.defer_mount()
+        self.scheduler.status_changed(StatusType.BUSY.value, 0.0)
+        self.scheduler.status_changed(StatusType.IDLE.value, 0.0)
+        self.assertTrue(self.scheduler.take_deferred())
+        self.assertFalse(self.scheduler.take_deferred())
+
+    def test_deferred_mount_counted_once(self):
+        self.scheduler.start('dry', 'test')
+        self.scheduler.mount_requested()
+        self.assertTrue(self.scheduler.defer_mount())
+        self.scheduler.status_changed(StatusType.BUSY.value, 0.0)
+        self.scheduler.status_changed(StatusType.IDLE.value, 0.0)
+        self.assertTrue(self.scheduler.take_deferred())
+
+        # the re-issued mount request is not a new mount, the next one is
+        self.scheduler.mount_requested()
+        self.assertEqual(self.scheduler.burst, 1)
+        self.scheduler.mount_requested()
+        self.assertEqual(self.scheduler.burst, 2)
+
+    def test_unstarted_action_expires(self):
+        self.scheduler.start('dry', 'test')
+        self.scheduler.started -= 100
+        self.assertFalse(self.scheduler.defer_mount())
+        self.assertIsNone(self.scheduler.running)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+"""
+Unit tests of the operation timelines and the endstation wait accounting.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara import timing
+from auntisara.msgs import StatusType
+
+RDTRSF, SPLON = 14, 15
+
+
+class Clock(object):
+    """
+    Replacement for the time module of the module under test, time only advances when told to
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class TimingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        timing.time = self.clock
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'timing.json')
+        self.timer = timing.OperationTimer(self.filename)
+        self.waits = timing.WaitAccounting(self.timer)
+
+    def tearDown(self):
+        timing.time = time
+        shutil.rmtree(self.directory)
+
+    def advance(self, seconds):
+        self.clock.now += seconds
+
+    def run_operation(self, command, duration, path=0.0):
+        self.timer.command_sent(command)
+        self.timer.command_ack(command)
+        self.advance(0.5)
+        self.timer.status_changed(StatusType.BUSY.value)
+        self.timer.add_path(path)
+        self.advance(duration - 0.5)
+        self.timer.status_changed(StatusType.IDLE.value)
+
+
+class OperationTimerTestCase(TimingTestCase):
+
+    def test_timeline(self):
+        self.timer.command_sent('traj(put,3,1,2)')
+        self.timer.command_ack('put')
+        self.advance(1.0)
+        self.timer.path_changed('put')
+        self.advance(2.0)
+        self.timer.position_changed('SOAK')
+        self.timer.add_path(150.0)
+        self.advance(3.0)
+        self.timer.path_changed('')
+
+        last = self.timer.last
+        self.assertIsNone(self.timer.current)
+        self.assertEqual([label for label, t in last.phases], ['sent', 'ack', 'start', 'SOAK', 'end'])
+        self.assertEqual([t for label, t in last.phases], [0.0, 0.0, 1.0, 3.0, 6.0])
+        self.assertEqual(last.path, 150.0)
+        self.assertEqual(self.timer.path_lengths()[timing.OPERATIONS.index('put')], 150.0)
+
+    def test_untracked_and_aborted(self):
+        self.timer.command_sent('openlid')
+        self.assertIsNone(self.timer.current)
+        self.timer.command_sent('traj(dry,3)')
+        self.timer.status_changed(StatusType.BUSY.value)
+        self.timer.command_sent('abort')
+        self.assertIsNone(self.timer.current)
+
+        self.timer.command_sent('traj(soak,3)')
+        self.timer.status_changed(StatusType.BUSY.value)
+        self.timer.status_changed(StatusType.FAULT.value)
+        self.assertIsNone(self.timer.current)
+        self.assertIsNone(self.timer.last)
+
+    def test_idle_before_start_ignored(self):
+        self.timer.command_sent('traj(home,3)')
+        self.timer.status_changed(StatusType.IDLE.value)
+        self.assertIsNotNone(self.timer.current)
+        self.timer.status_changed(StatusType.BUSY.value)
+        self.timer.status_changed(StatusType.IDLE.value)
+        self.assertEqual(self.timer.last.name, 'home')
+
+    def test_statistics(self):
+        for duration in [10.0, 20.0, 30.0]:
+            self.run_operation('traj(dry,3)', duration)
+        mean, p95, last = self.timer.statistics()
+        index = timing.OPERATIONS.index('dry')
+        self.assertAlmostEqual(mean[index], 20.0)
+        self.assertAlmostEqual(p95[index], 29.0)
+        self.assertAlmostEqual(last[index], 30.0)
+        self.assertEqual(mean[timing.OPERATIONS.index('put')], 0.0)
+        self.assertAlmostEqual(self.timer.mean('dry'), 20.0)
+        self.assertEqual(self.timer.mean('unknown'), 0.0)
+
+    def test_persistence(self):
+        self.run_operation('traj(put,3)', 12.3456)
+        self.run_operation('traj(soak,3)', 40.0)
+        with open(self.filename) as fobj:
+            self.assertEqual(json.load(fobj), {'put': [12.346], 'soak': [40.0]})
+
+        restored = timing.OperationTimer(self.filename, window=2)
+        self.assertEqual(list(restored.durations['put']), [12.346])
+        restored.durations['put'].extend([1.0, 2.0])
+        self.assertEqual(list(restored.durations['put']), [1.0, 2.0])
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+
+    def test_corrupt_file(self):
+        with open(self.filename, 'w') as fobj:
+            fobj.write('{"put": [1.0,')
+        timer = timing.OperationTimer(self.filename)
+        self.assertEqual(timer.mean('put'), 0.0)
+
+
+class WaitAccountingTestCase(TimingTestCase):
+
+    def test_wait_attributed_to_operation(self):
+        self.timer.command_sent('traj(put,3)')
+        self.timer.status_changed(StatusType.BUSY.value)
+        self.advance(1.0)
+        self.assertFalse(self.waits.update(RDTRSF))
+        self.advance(4.0)
+        self.waits.edge('di24', 1)
+        self.assertTrue(self.waits.update(None))
+        self.advance(1.0)
+
+        operation = self.timer.current
+        self.assertEqual(operation.waits['RdTrsf'], 4.0)
+        self.assertEqual(operation.wait_time(), 4.0)
+        self.assertEqual(
+            [label for label, t in operation.phases], ['sent', 'start', 'wait RdTrsf', 'di24 on', 'RdTrsf ready']
+        )
+        totals, per_operation = self.waits.statistics()
+        self.assertEqual(totals, {'RdTrsf': 4.0, 'SplOn': 0.0})
+        self.assertEqual(per_operation[timing.OPERATIONS.index('put')], 4.0)
+
+    def test_cause_changes(self):
+        self.waits.update(RDTRSF)
+        self.advance(2.0)
+        self.waits.update(RDTRSF)
+        self.advance(1.0)
+        self.assertTrue(self.waits.update(SPLON))
+        self.advance(5.0)
+        self.assertTrue(self.waits.update(3))
+        totals, per_operation = self.waits.statistics()
+        self.assertEqual(totals, {'RdTrsf': 3.0, 'SplOn': 5.0})
+        self.assertEqual(sum(per_operation), 0.0)
+        self.assertFalse(self.waits.update(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Unit tests of the status link watchdog.
+
+Run with `python -m unittest discover -s test -p "test_*.py"` from the aunt-isara directory.
+"""
+import os
+import sys
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auntisara import watchdog
+
+
+class Clock(object):
+    """
+    Replacement for the time module of the module under test, time only advances when told to
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class WatchdogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        watchdog.time = self.clock
+        self.watchdog = watchdog.LinkWatchdog(stale_timeout=5.0)
+
+    def tearDown(self):
+        watchdog.time = time
+
+    def query(self, rtt):
+        self.watchdog.query_sent()
+        self.clock.now += rtt
+        return self.watchdog.reply_received()
+
+    def test_smoothing(self):
+        self.assertAlmostEqual(self.query(0.1), 0.1)
+        self.assertAlmostEqual(self.watchdog.average, 0.1)
+        self.assertAlmostEqual(self.watchdog.deviation, 0.05)
+
+        self.assertAlmostEqual(self.query(0.2), 0.2)
+        self.assertAlmostEqual(self.watchdog.rtt, 0.2)
+        self.assertAlmostEqual(self.watchdog.average, 0.1 + 0.125 * 0.1)
+        self.assertAlmostEqual(self.watchdog.deviation, 0.05 + 0.25 * (0.1 - 0.05))
+        self.assertEqual(self.watchdog.samples, 2)
+
+    def test_ambiguous_reply_discarded(self):
+        self.query(0.1)
+        self.watchdog.query_sent()
+        self.clock.now += 1.0
+        self.watchdog.query_sent()
+        self.clock.now += 0.05
+        self.assertIsNone(self.watchdog.reply_received())
+        self.assertEqual(self.watchdog.samples, 1)
+        self.assertAlmostEqual(self.watchdog.rtt, 0.1)
+
+        # a late reply with no query outstanding is not a sample either
+        self.assertIsNone(self.watchdog.reply_received())
+        self.assertAlmostEqual(self.query(0.3), 0.3)
+        self.assertEqual(self.watchdog.samples, 2)
+
+    def test_stale_latch(self):
+        self.watchdog.query_sent()
+        self.clock.now += 4.0
+        self.assertFalse(self.watchdog.check())
+        self.clock.now += 2.0
+        self.assertAlmostEqual(self.watchdog.silence(), 6.0)
+        self.assertTrue(self.watchdog.check())
+        self.assertTrue(self.watchdog.stale)
+        self.clock.now += 10.0
+        self.assertFalse(self.watchdog.check(), 'stale link reported again')
+        self.assertEqual(self.watchdog.drops, 1)
+
+        # replies alone do not clear the latch, the link is reset once re-established
+        self.watchdog.reply_received()
+        self.assertFalse(self.watchdog.check())
+        self.watchdog.reset()
+        self.assertFalse(self.watchdog.stale)
+        self.clock.now += 6.0
+        self.assertTrue(self.watchdog.check())
+        self.assertEqual(self.watchdog.drops, 2)
+
+    def test_reset_clears_outstanding_query(self):
+        self.watchdog.query_sent()
+        self.watchdog.reset()
+        self.assertIsNone(self.watchdog.reply_received())
+        self.watchdog.query_sent()
+        self.assertFalse(self.watchdog.ambiguous)
+
+    def test_timeout_change(self):
+        self.clock.now += 3.0
+        self.assertFalse(self.watchdog.check())
+        self.watchdog.stale_timeout = 2.0
+        self.assertTrue(self.watchdog.check())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,17 @@
 import atexit
-import collections
+import logging
 import os
 import re
-import sys
 import threading
 import time
 from ctypes import *
-from . import log
+from . import log, signals
 import numpy
-from gi.repository import GObject
+
+try:
+    from collections.abc import Iterable
+except ImportError:
+    from collections import Iterable
 
 # _setup module logger with a default do-nothing handler
 logger = log.get_module_logger(__name__)
@@ -50,6 +53,7 @@ MAX_ENUM_STATES = 16
 DBE_VALUE = 1 << 0
 DBE_ALARM = 1 << 1
 DBE_LOG = 1 << 2
+DBE_PROPERTY = 1 << 3
 
 (
     DBF_STRING, DBF_INT, DBF_FLOAT, DBF_ENUM, DBF_CHAR, DBF_LONG, DBF_DOUBLE, DBR_STS_STRING,
@@ -147,7 +151,7 @@ BaseFieldMap = {
     DBR_CTRL_FLOAT: _base_ctrl + [('precision', c_short), ('RISC_pad', c_short)] + _limit_fields(c_float),
     DBR_CTRL_ENUM: _base_ctrl + _enum_ctrl,
     DBR_CTRL_CHAR: _base_ctrl + _limit_fields(c_char) + [('RISC_pad', c_char)],
-    DBR_CTRL_LONG: _base_ctrl + _limit_fields(c_long),
+    DBR_CTRL_LONG: _base_ctrl + _limit_fields(c_int32),
     DBR_CTRL_DOUBLE: _base_ctrl + [('precision', c_short), ('RISC_pad', c_short)] + _limit_fields(c_double),
 }
 
@@ -185,6 +189,58 @@ TypeMap = {
     DBR_CTRL_DOUBLE: (c_double, 'DBR_CTRL_DOUBLE'),
 }
 
+# numpy element types matching the channel access types of numeric arrays
+NumpyTypeMap = {
+    DBR_ENUM: numpy.uint16,
+    DBR_SHORT: numpy.int16,
+    DBR_LONG: numpy.int32,
+    DBR_FLOAT: numpy.float32,
+    DBR_DOUBLE: numpy.float64,
+}
+
+# default number of monitor buffers for numeric arrays
+MONITOR_FRAMES = 3
+
+# ctypes types shared by all PVs, keyed by (dbr type, count)
+_value_types = {}
+_dbr_types = {}
+_types_lock = threading.Lock()
+
+
+def get_value_type(dbr_type, count):
+    """
+    Return the ctypes type holding count values of a channel access type. Types are created once and shared.
+
+    :param dbr_type: any DBR_XXX, DBR_TIME_XXX or DBR_CTRL_XXX type, only the base type is used
+    :param count: element count
+    """
+    key = (dbr_type % 7, count)
+    with _types_lock:
+        if key not in _value_types:
+            element = TypeMap[key[0]][0]
+            _value_types[key] = element if count == 1 else element * count
+        return _value_types[key]
+
+
+def get_dbr_type(dbr_type, count):
+    """
+    Return the ctypes Structure for a DBR_TIME_XXX or DBR_CTRL_XXX value with count elements. Types are created
+    once and shared.
+
+    :param dbr_type: DBR_TIME_XXX or DBR_CTRL_XXX type
+    :param count: element count
+    """
+    key = (dbr_type, count)
+    vtype = get_value_type(dbr_type, count)
+    with _types_lock:
+        if key not in _dbr_types:
+            _dbr_types[key] = type(
+                "DBR_{:02d}_{:02d}".format(dbr_type, count), (Structure,),
+                {'_fields_': BaseFieldMap[dbr_type] + [('value', vtype)]}
+            )
+        return _dbr_types[key]
+
+
 _PV_REPR_FMT = (
     "<ProcessVariable\n"
     "    Name:       %s\n"
@@ -199,28 +255,24 @@ _PV_REPR_FMT = (
 )
 
 
-class BasePV(GObject.GObject):
+class BasePV(signals.Emitter):
     """Process Variable Base Class"""
-    __gsignals__ = {
-        'changed': (GObject.SignalFlags.RUN_FIRST, None, (object,)),
-        'time': (GObject.SignalFlags.RUN_FIRST, None, (object,)),
-        'active': (GObject.SignalFlags.RUN_FIRST, None, (bool,)),
-        'alarm': (GObject.SignalFlags.RUN_FIRST, None, (object,))
-    }
+    __signals__ = ('changed', 'time', 'active', 'alarm')
 
     def __init__(self, name, monitor=True):
-        GObject.GObject.__init__(self)
+        super(BasePV, self).__init__()
 
     def set_state(self, **kwargs):
         """
-        Set and emit signals for the current state. Only specified states will be set
+        Set and emit signals for the current state. Only specified states will be set. Signals are delivered in
+        the main loop by the active dispatcher, see softdev.signals.
         :param kwargs: keywords correspond to signal names, values are signal values to emit
         :return:
         """
         for st, val in kwargs.items():
             st = st.replace('_', '-')
             self.state_info.update({st: val})
-            GObject.idle_add(self.emit, st, val)
+            self.emit_soon(st, val)
 
     def is_active(self):
         return self.state_info.get('active', False)
@@ -248,8 +300,8 @@ class PV(BasePV):
     network traffic, so that calls to get() fetches the cached value,
     which is automatically updated.
 
-    Note that GObject, derived features are available only when a GObject
-    or compatible main-loop is running.
+    Note that signals are delivered only when the main-loop of the active
+    dispatcher is running (GObject, Twisted or asyncio, see softdev.signals).
 
     In order to communicate with the corresponding channel on the IOC, a PV
     needs to "connect".  This creates a dedicated connection to the IOC on which
@@ -268,13 +320,22 @@ class PV(BasePV):
     useful with the PV.
     """
 
-    def __init__(self, name, monitor=True, connect=False, ignore_first=False):
+    def __init__(
+            self, name, monitor=True, connect=False, ignore_first=False, history=0, mask=DBE_VALUE | DBE_ALARM,
+            deadband=0.0, relative=0.0, max_rate=0.0
+    ):
         """
         Process Variable Object
         :param name: PV name
         :param monitor: boolean, whether to enable monitoring of changes and emitting of change signals
         :param connect:  boolean, connect immediately. No deferred connection
         :param ignore_first: Do not emit signals for the very first value, since it doesn't actually represent a change
+        :param history: number of past frames of numeric array monitors to keep, see get_history
+        :param mask: event mask of the value monitor, e.g. DBE_LOG to follow the archive deadband of the record
+        :param deadband: numeric changes not larger than this from the last emitted value are not emitted
+        :param relative: same as deadband but as a fraction of the last emitted value, the larger of both applies
+        :param max_rate: maximum number of change signals emitted per second, 0 for no limit. Changes arriving
+            faster are merged and the latest value is emitted at the end of the interval.
         """
         super(PV, self).__init__(name, monitor=monitor)
 
@@ -297,10 +358,26 @@ class PV(BasePV):
         self.ctype = None
         self.dtype = None
         self.chid = c_ulong()
+        self.send_buffer = None
+        self.last_sent = None
+        self.ntype = None
+        self.history = history
+        self.mask = mask
+        self.deadband = deadband
+        self.relative = relative
+        self.interval = 1.0 / max_rate if max_rate else 0.0
+        self.emitted = None
+        self.emit_time = 0.0
+        self.emit_pending = False
+        self.frames = None
+        self.frame_times = None
+        self.frame_index = 0
+        self.frame_count = 0
         self.params = {}
         self.monitors = {}
         self.lock = threading.RLock()
         self.connections = []
+        self.fields = {}
 
         if connect:
             self.create_connection()
@@ -346,33 +423,52 @@ class PV(BasePV):
             return self.value
 
     def get_parameters(self):
-        """Get control parameters of a Process Variable.
+        """Get control parameters of a Process Variable. The parameters are normally prefetched and kept
+        current by a property monitor when the PV connects, this only blocks if they have not arrived yet.
         """
-        params = {}
         if not self.is_connected():
             logger.error('(%s) PV not connected' % (self.name,))
-            return params
+            return {}
+        elif self.params:
+            return self.params
         else:
-            count = 1  # use count of 1 for control parameters
-            _vtype = TypeMap[self.type][0] * count
-            _dtype = type(
-                "DBR_{:02d}_{:02d}".format(self.ctype, count), (Structure,),
-                {'_fields_': BaseFieldMap[self.ctype] + [('value', _vtype)]}
-            )
-            data = _dtype()
-            libca.ca_array_get(self.ctype, self.count, self.chid, byref(data))
+            # use count of 1 for control parameters
+            data = get_dbr_type(self.ctype, 1)()
+            libca.ca_array_get(self.ctype, 1, self.chid, byref(data))
             libca.ca_pend_io(1.0)
+            self.params = self.parse_parameters(data)
+            return self.params
 
-            for _k, _t in _dtype._fields_:
-                v = getattr(data, _k)
-                if _k in ['pad', 'pad0', 'pad1', 'RISC_pad', 'no_str', 'value']:
-                    continue
-                if _k == 'strs':
-                    strs = [v[i].value for i in range(data.no_str)]
-                    params[_k] = strs
-                else:
-                    params[_k] = v
-            return params
+    def parse_parameters(self, data):
+        """
+        Extract control parameters from a DBR_CTRL_XXX structure
+        :param data: DBR_CTRL_XXX structure
+        :return: dictionary of parameters
+        """
+        params = {}
+        for _k, _t in data._fields_:
+            v = getattr(data, _k)
+            if _k in ['pad', 'pad0', 'pad1', 'RISC_pad', 'no_str', 'value']:
+                continue
+            if _k == 'strs':
+                strs = [v[i].value for i in range(data.no_str)]
+                params[_k] = strs
+            else:
+                params[_k] = v
+        return params
+
+    def on_property(self, event):
+        """
+        Callback for control parameter updates, called once when the property monitor is created and every
+        time the parameters change
+        :param event: CA Event record
+        :return:
+        """
+        if self.chid != event.chid or event.type != self.ctype:
+            return 0
+        dbr = cast(event.dbr, POINTER(get_dbr_type(self.ctype, 1)))
+        self.params = self.parse_parameters(dbr.contents)
+        return 0
 
     def put(self, val, wait=False, ignore=False, soft=False):
         """
@@ -390,9 +486,16 @@ class PV(BasePV):
             return
 
         self.ignore_next_change = ignore
-        if not (soft and self.value == val):
-            data = self.from_python(val)
-            libca.ca_array_put(self.type, self.count, self.chid, byref(data))
+        if not (soft and _same_value(self.value, val)):
+            with self.lock:
+                if self.send_buffer is not None:
+                    raw = self.encode_string(val)
+                    if soft and raw == self.last_sent:
+                        return
+                    data = self.fill_buffer(raw)
+                else:
+                    data = self.from_python(val)
+                libca.ca_array_put(self.type, self.count, self.chid, byref(data))
             libca.ca_pend_io(0.05)
             libca.ca_pend_event(1e-4)
             if wait:
@@ -401,6 +504,25 @@ class PV(BasePV):
     # provide a put method for those used to EPICS terminology
     set = put
 
+    def field(self, name):
+        """
+        Return a PV for a field of the record behind this PV. Field PVs are created once, connect asynchronously
+        and are not monitored.
+        :param name: field name, e.g. 'UDF'
+        :return: PV
+        """
+        if name not in self.fields:
+            self.fields[name] = PV('{}.{}'.format(self.name, name), monitor=False)
+        return self.fields[name]
+
+    def invalidate(self):
+        """
+        Mark the record undefined and process it, raising a UDF alarm with INVALID severity until the value is
+        written again. Call field('UDF') and field('PROC') ahead of time so that the field PVs are connected.
+        """
+        self.field('UDF').put(1)
+        self.field('PROC').put(1)
+
     def toggle(self, val1, val2, delay=0.001):
         """
         Rapidly switch between two values with a maximum delay between.
@@ -413,6 +535,45 @@ class PV(BasePV):
         libca.ca_pend_event(delay)
         self.set(val2)
 
+    def encode_string(self, val):
+        """
+        Convert a python value for a string or character array PV into raw bytes without copying if possible.
+
+        :param val: python value, bytes, bytearray, memoryview, text or, for string arrays, a sequence of these
+        :return: bytes-like object, or tuple of bytes-like objects for string arrays
+        """
+        if self.type == DBR_STRING and self.count > 1:
+            return tuple(_to_bytes(v)[:MAX_STRING_SIZE] for v in val[:self.count])
+        return _to_bytes(val)[:len(self.send_buffer)]
+
+    def fill_buffer(self, raw):
+        """
+        Copy raw bytes into the preallocated send buffer of a string or character array PV. Only the bytes
+        which changed length since the previous put are cleared.
+
+        :param raw: result of encode_string
+        :return: the send buffer
+        """
+        buf = self.send_buffer
+        if isinstance(raw, tuple):
+            for i in range(self.count):
+                item = raw[i] if i < len(raw) else b''
+                address = addressof(buf) + i * MAX_STRING_SIZE
+                size = len(item)
+                memmove(address, bytes(item), size)
+                memset(address + size, 0, MAX_STRING_SIZE - size)
+        else:
+            size = len(raw)
+            previous = len(self.last_sent) if self.last_sent is not None else len(buf)
+            if isinstance(raw, bytearray):
+                memmove(buf, (c_char * size).from_buffer(raw), size)
+            else:
+                memmove(buf, bytes(raw), size)
+            if size < previous:
+                memset(addressof(buf) + size, 0, previous - size)
+        self.last_sent = raw if isinstance(raw, (bytes, tuple)) else bytes(raw)
+        return buf
+
     def from_python(self, val):
         """
         Convert python value to data suitable for Channel Access
@@ -425,19 +586,10 @@ class PV(BasePV):
             if val in self.params.get('strs', []):
                 val = self.params['strs'].index(val)
 
-        if self.count > 1 and isinstance(val, collections.Iterable):
-            if self.type == DBR_CHAR:
-                val_str = str(''.join([v for v in val[:self.count]]))
-                data = create_string_buffer(val_str, self.count)
-            elif self.type == DBR_STRING:
-                data = self.vtype(*[
-                    create_string_buffer(val[i][:MAX_STRING_SIZE], MAX_STRING_SIZE) for i in range(self.count)
-                ])
-
-            else:
-                data = self.vtype(*[self.etype(v) for v in val])
-        elif self.type == DBR_STRING:
-            data = create_string_buffer(str(val)[:MAX_STRING_SIZE], MAX_STRING_SIZE)
+        if self.send_buffer is not None and not (self.type == DBR_CHAR and isinstance(val, int)):
+            data = self.fill_buffer(self.encode_string(val))
+        elif self.ntype is not None and self.count > 1 and isinstance(val, (numpy.ndarray, Iterable)):
+            data = self.array_data(val)
         elif self.type == DBR_CHAR and isinstance(val, int):
             data = self.vtype(chr(val))
         else:
@@ -459,13 +611,62 @@ class PV(BasePV):
                 val = c_char_p(ca_value.value).value
         elif ca_type in [DBR_CHAR, DBR_CTRL_CHAR, DBR_TIME_CHAR]:
             val = ca_value.value
+        elif self.count > 1:
+            val = self.store_frame(ca_value if isinstance(ca_value, Array) else ca_value.value)
         else:
-            if self.count > 1:
-                val = numpy.frombuffer(ca_value.value, dtype=self.etype)
-            else:
-                val = ca_value.value
+            val = ca_value.value
         return val
 
+    def array_data(self, val):
+        """
+        Convert a sequence to Channel Access data for a numeric array PV. A C-contiguous numpy array of the
+        channel's element type with at least count elements is passed through without copying, anything else is
+        converted in one step by numpy and zero-padded to the element count.
+
+        :param val: numpy array or sequence
+        :return: Channel Access data
+        """
+        if (
+                isinstance(val, numpy.ndarray) and val.dtype == self.ntype and val.flags.c_contiguous
+                and val.flags.writeable and val.size >= self.count
+        ):
+            return self.vtype.from_buffer(val)
+        arr = numpy.asarray(val, dtype=self.ntype).ravel()
+        size = min(arr.size, self.count)
+        data = numpy.zeros(self.count, dtype=self.ntype)
+        data[:size] = arr[:size]
+        return self.vtype.from_buffer(data)
+
+    def store_frame(self, source):
+        """
+        Copy numeric array data from Channel Access memory into the next buffer of the monitor ring. The
+        returned array remains valid until the ring wraps around, callers keeping it longer must copy it.
+
+        :param source: ctypes array holding the values
+        :return: numpy array
+        """
+        with self.lock:
+            frame = self.frames[self.frame_index]
+            memmove(frame.ctypes.data, addressof(source), frame.nbytes)
+            self.frame_times[self.frame_index] = time.time()
+            self.frame_index = (self.frame_index + 1) % len(self.frames)
+            self.frame_count = min(self.frame_count + 1, len(self.frames))
+        return frame
+
+    def get_history(self):
+        """
+        Return copies of the most recent numeric array frames received by the monitor, oldest first
+
+        :return: (times, frames) tuple of numpy arrays, frames has one row per frame
+        """
+        if self.frames is None:
+            return numpy.empty(0), numpy.empty((0, 0))
+        with self.lock:
+            size = len(self.frames)
+            count = min(self.frame_count, max(self.history, 1))
+            order = [(self.frame_index - count + i) % size for i in range(count)]
+            return self.frame_times[order], self.frames[order]
+
     def on_change(self, event):
         """
         Callback for handling change event of Process Variables
@@ -481,20 +682,65 @@ class PV(BasePV):
         self.value = self.to_python(dbr.contents, event.type)
         self.time = epics_to_posixtime(dbr.contents.stamp)
 
+        _alm, _sev = dbr.contents.status, dbr.contents.severity
+        alarm_changed = (_alm, _sev) != (self.alarm, self.severity)
+
         # do not send signals if change was suspended during put
         if self.ignore_next_change:
             self.ignore_next_change = False
-        else:
-            self.set_state(time=self.time)
-            self.set_state(changed=self.value)
+        elif alarm_changed or not self.within_deadband(self.value):
+            self.emit_change()
 
-        _alm, _sev = dbr.contents.status, dbr.contents.severity
-        if (_alm, _sev) != (self.alarm, self.severity):
+        if alarm_changed:
             self.alarm, self.severity = _alm, _sev
             self.set_state(alarm=(self.alarm, self.severity))
 
         return 0
 
+    def within_deadband(self, value):
+        """
+        Check if a new value is within the deadband of the last emitted value
+        """
+        if not (self.deadband or self.relative) or self.emitted is None:
+            return False
+        try:
+            change = numpy.abs(numpy.subtract(value, self.emitted, dtype=float)).max()
+            limit = max(self.deadband, self.relative * numpy.abs(self.emitted).max())
+        except (TypeError, ValueError):
+            return False
+        return change <= limit
+
+    def emit_change(self):
+        """
+        Emit the time and changed signals for the current value, unless the last one was emitted less than the
+        rate limit interval ago. In that case a single emission of the latest value is scheduled for the end of
+        the interval.
+        """
+        with self.lock:
+            if self.emit_pending:
+                return
+            wait = self.emit_time + self.interval - time.time()
+            if wait > 0:
+                self.emit_pending = True
+                timer = threading.Timer(wait, self.emit_latest)
+                timer.daemon = True
+                timer.start()
+                return
+            self.emit_time = time.time()
+        self.emit_latest(pending=False)
+
+    def emit_latest(self, pending=True):
+        with self.lock:
+            if pending:
+                self.emit_pending = False
+                self.emit_time = time.time()
+            if self.deadband or self.relative:
+                # frames of array monitors are reused, keep a copy as the deadband reference
+                self.emitted = numpy.array(self.value) if isinstance(self.value, numpy.ndarray) else self.value
+            value, timestamp = self.value, self.time
+        self.set_state(time=timestamp)
+        self.set_state(changed=value)
+
     def is_connected(self):
         """
         Returns True if the channel is active
@@ -511,9 +757,8 @@ class PV(BasePV):
         if stat != NEVER_CONNECTED:
             self.set_properties()
             libca.channel_registry.append(self.chid)
-            if self.monitor == True:
-                self.add_monitor(self.on_change)
             self.connected = CA_OP_CONN_UP
+            self.add_monitors()
         else:
             self.defer_connection()
 
@@ -534,20 +779,38 @@ class PV(BasePV):
         _r = libca.ca_read_access(self.chid)
         _w = libca.ca_write_access(self.chid)
         self.access = ('none', 'read', 'write', 'read+write')[_r + 2 * _w]
+        self.setup_types()
 
+    def setup_types(self):
+        """
+        Derive the ctypes types for the channel from its type and element count and allocate buffers
+        """
         # get DBR_TIME_XXXX and DBR_CTRL_XXXX value from DBR_XXXX
         self.ttype = self.type + 14
         self.ctype = self.type + 28
-        self.vtype = TypeMap[self.type][0] if self.count == 1 else TypeMap[self.type][0] * self.count
+        self.vtype = get_value_type(self.type, self.count)
         self.etype = TypeMap[self.type][0]
-
-        self.dtype = type(
-            "DBR_{:02d}_{:02d}".format(self.ttype, self.count),
-            (Structure,),
-            {'_fields_': BaseFieldMap[self.ttype] + [('value', self.vtype)]}
-        )
+        self.dtype = get_dbr_type(self.ttype, self.count)
+        self.params = {}
         self.data = self.vtype()
-        # self.params = self.get_parameters()
+
+        # reusable send buffer for strings and character arrays
+        self.last_sent = None
+        if self.type == DBR_STRING or (self.type == DBR_CHAR and self.count > 1):
+            self.send_buffer = self.vtype()
+        else:
+            self.send_buffer = None
+
+        # ring of monitor buffers for numeric arrays, with one spare beyond the history in use by consumers
+        self.ntype = NumpyTypeMap.get(self.type)
+        if self.ntype is not None and self.count > 1:
+            frames = max(MONITOR_FRAMES, self.history + 1)
+            self.frames = numpy.zeros((frames, self.count), dtype=self.ntype)
+            self.frame_times = numpy.zeros(frames)
+        else:
+            self.frames = self.frame_times = None
+        self.frame_index = 0
+        self.frame_count = 0
 
     def on_connect(self, event):
         """
@@ -561,18 +824,29 @@ class PV(BasePV):
             if self.chid not in libca.channel_registry:
                 libca.channel_registry.append(self.chid)
                 self.set_properties()
-                if self.monitor == True:
-                    self.add_monitor(self.on_change)
+                self.add_monitors()
             self.set_state(active=True)
         else:
             self.set_state(active=False)
 
         return 0
 
-    def add_monitor(self, callback):
+    def add_monitors(self):
+        """
+        Subscribe to value changes if monitoring is enabled and to control parameter changes
+        """
+        if self.monitor == True:
+            self.add_monitor(self.on_change, mask=self.mask)
+        self.add_monitor(self.on_property, dbr_type=self.ctype, count=1, mask=DBE_PROPERTY)
+
+    def add_monitor(self, callback, dbr_type=None, count=None, mask=DBE_VALUE | DBE_ALARM):
         """
         Add a callback function to be called every time a change occurs. Mostly used internally.
         External users should use the 'changed' and 'time' signals and the 'connect' method
+        :param callback: callback function
+        :param dbr_type: DBR type to subscribe to, defaults to the DBR_TIME_XXX type of the channel
+        :param count: element count, defaults to the element count of the channel
+        :param mask: event mask
         """
         if not self.is_connected():
             logger.error('(%s) PV not connected.' % (self.name,))
@@ -584,7 +858,8 @@ class PV(BasePV):
         key = repr(callback)
         user_arg = c_void_p()
         libca.ca_create_subscription(
-            self.ttype, self.count, self.chid, DBE_VALUE | DBE_ALARM, cb_function, user_arg, event_id
+            self.ttype if dbr_type is None else dbr_type, self.count if count is None else count, self.chid,
+            mask, cb_function, user_arg, event_id
         )
         libca.ca_pend_io(1.0)
         self.monitors[event_id.value] = [cb_factory, cb_function, event_id.value]
@@ -611,6 +886,34 @@ class PV(BasePV):
             raise AttributeError("%s has no attribute '%s'" % (self.__class__.__name__, attr))
 
 
+def _same_value(current, val):
+    """
+    Compare a cached PV value with a new value, including numpy arrays
+    """
+    if isinstance(current, numpy.ndarray) or isinstance(val, numpy.ndarray):
+        try:
+            return numpy.array_equal(current, val)
+        except (TypeError, ValueError):
+            return False
+    return current == val
+
+
+def _to_bytes(val):
+    """
+    Convert a value to a bytes-like object for string puts
+    """
+    if isinstance(val, (bytes, bytearray)):
+        return val
+    elif isinstance(val, memoryview):
+        return val.tobytes()
+    elif not isinstance(val, (type(u''), str)):
+        if isinstance(val, Iterable):
+            val = ''.join(val)
+        else:
+            val = str(val)
+    return val.encode('utf-8')
+
+
 def epics_to_posixtime(time_stamp):
     """
     Convert EPICS time-stamp to float representing the seconds sinceUNIX epoch.
@@ -633,91 +936,167 @@ def flush():
 
 
 def ca_exception_handler(event):
-    name = '?' if not event.chid else libca.ca_name(event.chid)
-    msg = "Channel Access Exception: `{}:{}` ({}: {})".format(
-        name, libca.ca_message(event.stat), event.pFile, event.lineNo,
-    )
-    logger.debug(msg)
+    if logger.isEnabledFor(logging.DEBUG):
+        name = '?' if not event.chid else libca.ca_name(event.chid)
+        logger.debug(
+            "Channel Access Exception: `%s:%s` (%s: %s)", name, libca.ca_message(event.stat), event.pFile, event.lineNo
+        )
     return 0
 
-try:
-    libca_file = "%s/lib/%s/libca.so" % (os.environ['EPICS_BASE'], os.environ['EPICS_HOST_ARCH'])
-    libca = cdll.LoadLibrary(libca_file)
-except OSError:
-    print("EPICS run-time libraries could not be loaded! Make Sure EPICS is properly installed.")
-    sys.exit(1)
+def load_libca():
+    """
+    Load the EPICS Channel Access client library from EPICS_BASE and EPICS_HOST_ARCH and declare the argument and
+    return types of the functions used
+
+    :return: library
+    """
+    try:
+        libca_file = "%s/lib/%s/libca.so" % (os.environ['EPICS_BASE'], os.environ['EPICS_HOST_ARCH'])
+        lib = cdll.LoadLibrary(libca_file)
+    except (KeyError, OSError) as e:
+        raise ChannelAccessError(
+            "EPICS run-time libraries could not be loaded! Make Sure EPICS is properly installed: {}".format(e)
+        )
 
-libca.last_heart_beat = time.time()
+    # define argument and return types
+    lib.ca_name.restype = c_char_p
+    lib.ca_name.argtypes = [c_ulong]
 
-# define argument and return types
-libca.ca_name.restype = c_char_p
-libca.ca_name.argtypes = [c_ulong]
+    lib.ca_element_count.restype = c_uint
+    lib.ca_element_count.argtypes = [c_ulong]
 
-libca.ca_element_count.restype = c_uint
-libca.ca_element_count.argtypes = [c_ulong]
+    lib.ca_state.restype = c_ushort
+    lib.ca_state.argtypes = [c_ulong]
 
-libca.ca_state.restype = c_ushort
-libca.ca_state.argtypes = [c_ulong]
+    lib.ca_message.restype = c_char_p
+    lib.ca_message.argtypes = [c_ulong]
 
-libca.ca_message.restype = c_char_p
-libca.ca_message.argtypes = [c_ulong]
+    lib.ca_field_type.restype = c_long
+    lib.ca_field_type.argtypes = [c_ulong]
 
-libca.ca_field_type.restype = c_long
-libca.ca_field_type.argtypes = [c_ulong]
+    lib.ca_host_name.restype = c_char_p
+    lib.ca_host_name.argtypes = [c_ulong]
 
-libca.ca_host_name.restype = c_char_p
-libca.ca_host_name.argtypes = [c_ulong]
+    lib.ca_create_channel.argtypes = [c_char_p, c_void_p, c_void_p, c_int, POINTER(c_ulong)]
+    lib.ca_clear_channel.argtypes = [c_ulong]
 
-libca.ca_create_channel.argtypes = [c_char_p, c_void_p, c_void_p, c_int, POINTER(c_ulong)]
-libca.ca_clear_channel.argtypes = [c_ulong]
+    lib.ca_clear_subscription.argtypes = [c_ulong]
+    lib.ca_create_subscription.argtypes = [
+        c_long, c_uint, c_ulong, c_ulong, c_void_p, c_void_p, POINTER(c_ulong)
+    ]
 
-libca.ca_clear_subscription.argtypes = [c_ulong]
-libca.ca_create_subscription.argtypes = [
-    c_long, c_uint, c_ulong, c_ulong, c_void_p, c_void_p, POINTER(c_ulong)
-]
+    lib.ca_array_get.argtypes = [c_long, c_uint, c_ulong, c_void_p]
+    lib.ca_array_put.argtypes = [c_long, c_uint, c_ulong, c_void_p]
+
+    lib.ca_pend_io.argtypes = [c_double]
+    lib.ca_pend_event.argtypes = [c_double]
+    lib.ca_flush_io.restype = c_uint
+
+    lib.ca_context_create.argtypes = [c_ushort]
+    lib.ca_context_create.restype = c_int
+    lib.ca_current_context.restype = c_ulong
+    lib.ca_attach_context.argtypes = [c_ulong]
+    lib.ca_attach_context.restype = c_int
 
-libca.ca_array_get.argtypes = [c_long, c_uint, c_ulong, c_void_p]
-libca.ca_array_put.argtypes = [c_long, c_uint, c_ulong, c_void_p]
+    lib.ca_client_status.argtypes = [c_uint]
 
-libca.ca_pend_io.argtypes = [c_double]
-libca.ca_pend_event.argtypes = [c_double]
-libca.ca_flush_io.restype = c_uint
+    lib.ca_write_access.argtypes = [c_ulong]
+    lib.ca_write_access.restype = c_uint
 
-libca.ca_context_create.argtypes = [c_ushort]
-libca.ca_context_create.restype = c_int
-libca.ca_current_context.restype = c_ulong
-libca.ca_attach_context.argtypes = [c_ulong]
-libca.ca_attach_context.restype = c_int
+    lib.ca_read_access.argtypes = [c_ulong]
+    lib.ca_read_access.restype = c_uint
 
-libca.ca_client_status.argtypes = [c_uint]
+    lib.ca_dump_dbr.argtypes = [c_uint, c_ulong, c_void_p]
+    return lib
+
+
+def load_fake():
+    """
+    Create the in-memory Channel Access implementation, see softdev.fakeca
+    """
+    from . import fakeca
+    return fakeca.FakeLibCA()
 
-libca.ca_write_access.argtypes = [c_ulong]
-libca.ca_write_access.restype = c_uint
 
-libca.ca_read_access.argtypes = [c_ulong]
-libca.ca_read_access.restype = c_uint
+# Channel Access backends, selected by name with set_backend or the SOFTDEV_CA_BACKEND environment variable
+BACKENDS = {
+    'libca': load_libca,
+    'fake': load_fake,
+}
+
+
+class _DeferredBackend(object):
+    """
+    Placeholder for the Channel Access backend until it is first used. The first attribute access loads and
+    initializes the selected backend, which then replaces the placeholder as the module-level libca.
+    """
+
+    def __getattr__(self, attr):
+        return getattr(get_backend(), attr)
+
 
-libca.ca_dump_dbr.argtypes = [c_uint, c_ulong, c_void_p]
+_backend = None
+_backend_choice = None
+_backend_lock = threading.Lock()
+libca = _DeferredBackend()
+
+
+def set_backend(backend):
+    """
+    Select the Channel Access backend. Must be called before any PVs are created.
+
+    :param backend: backend name, one of BACKENDS, or an object implementing the libca functions used here
+    """
+    global _backend_choice
+    with _backend_lock:
+        if _backend is not None:
+            raise ChannelAccessError('Channel Access backend already initialized')
+        _backend_choice = backend
+
+
+def get_backend():
+    """
+    Return the Channel Access backend, loading and initializing it on first use. The backend is taken from
+    set_backend, the SOFTDEV_CA_BACKEND environment variable or is the EPICS libca library by default.
+    """
+    global _backend, libca
+    with _backend_lock:
+        if _backend is None:
+            choice = _backend_choice or os.environ.get('SOFTDEV_CA_BACKEND', 'libca')
+            if choice in BACKENDS:
+                backend = BACKENDS[choice]()
+            elif isinstance(choice, str):
+                raise ChannelAccessError('Unknown Channel Access backend: {}'.format(choice))
+            else:
+                backend = choice
+            _initialize(backend)
+            _backend = libca = backend
+        return _backend
+
+
+def _initialize(backend):
+    """
+    Create the Channel Access context and register the exception handler
+    """
+    backend.last_heart_beat = time.time()
+    backend.ca_context_create(ENABLE_PREEMPTIVE_CALLBACK)
+    backend.context = backend.ca_current_context()
+    backend.ca_add_exception_event(_cb_function, _cb_user_agg)
+    backend.active = True
+    backend.channel_registry = []
 
-# initialize channel access
-libca.ca_context_create(ENABLE_PREEMPTIVE_CALLBACK)
-libca.context = libca.ca_current_context()
 
 _cb_factory = CFUNCTYPE(c_int, ExceptionHandlerArgs)
 _cb_function = _cb_factory(ca_exception_handler)
 _cb_user_agg = c_void_p()
-libca.ca_add_exception_event(_cb_function, _cb_user_agg)
-libca.active = True
-libca.channel_registry = []
 
 
 # cleanup gracefully at termination
 @atexit.register
 def ca_cleanup():
-    libca.active = False
-    for cid in libca.channel_registry:
-        libca.ca_clear_channel(cid)
-    libca.ca_context_destroy()
-
-
-__all__ = ['BasePV', 'PV', 'threads_init', 'flush', ]
\ No newline at end of file
+    if _backend is None:
+        return
+    _backend.active = False
+    for cid in _backend.channel_registry:
+        _backend.ca_clear_channel(cid)
+    _backend.ca_context_destroy()
@@ -0,0 +1,164 @@
+"""
+Bounded thread pool for running record callbacks outside the main loop. Callbacks submitted with the same key,
+normally the process variable of a record, run one at a time in submission order, while callbacks for different
+keys run concurrently on up to the configured number of workers. The queueing delay and run time of every callback
+is accounted for and can be reported.
+"""
+
+import collections
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from . import epics, log
+
+logger = log.get_module_logger(__name__)
+
+
+class CallbackStats(object):
+    """
+    Queueing delay and run time statistics of one callback
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.delay = 0.0
+        self.max_delay = 0.0
+        self.runtime = 0.0
+        self.max_runtime = 0.0
+
+    def add(self, delay, runtime):
+        self.count += 1
+        self.delay += delay
+        self.max_delay = max(self.max_delay, delay)
+        self.runtime += runtime
+        self.max_runtime = max(self.max_runtime, runtime)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'delay': self.delay / self.count if self.count else 0.0,
+            'max_delay': self.max_delay,
+            'runtime': self.runtime / self.count if self.count else 0.0,
+            'max_runtime': self.max_runtime,
+        }
+
+
+class CallbackExecutor(object):
+    def __init__(self, workers=4, name='callbacks', warn_delay=0.5):
+        """
+        :param workers: maximum number of callbacks running concurrently
+        :param name: name of the worker threads
+        :param warn_delay: log a warning when a callback waits longer than this many seconds to start
+        """
+        self.workers = workers
+        self.name = name
+        self.warn_delay = warn_delay
+        self.ready = queue.Queue()
+        self.pending = {}
+        self.stats = collections.defaultdict(CallbackStats)
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        """
+        Start the worker threads. Callbacks submitted earlier are queued until then.
+        """
+        for i in range(self.workers - len(self.threads)):
+            thread = threading.Thread(target=self.run, name='{}-{}'.format(self.name, len(self.threads)))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        """
+        Stop the worker threads once the callbacks already queued have run
+        """
+        for thread in self.threads:
+            self.ready.put(None)
+        self.threads = []
+
+    def submit(self, key, func, *args):
+        """
+        Queue a callback. May be called from any thread.
+
+        :param key: callbacks with the same key run in order, one at a time
+        :param func: callable
+        :param args: arguments
+        """
+        with self.lock:
+            if key in self.pending:
+                self.pending[key].append((func, args, time.time()))
+                return
+            self.pending[key] = collections.deque([(func, args, time.time())])
+        self.ready.put(key)
+
+    def dispatch(self, pv, value, callback, ioc):
+        """
+        Signal handler which queues a record callback, keyed by its process variable or by the group it was
+        assigned to with models.serial. Connect it in place of the callback with
+        pv.connect('changed', executor.dispatch, callback, ioc).
+        """
+        self.submit(getattr(callback, 'serial', pv), callback, pv, value, ioc)
+
+    def run(self):
+        epics.threads_init()
+        while True:
+            key = self.ready.get()
+            if key is None:
+                break
+            with self.lock:
+                func, args, queued = self.pending[key][0]
+            started = time.time()
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error('Error in callback {}: {}'.format(_callback_name(func), e))
+            finished = time.time()
+            delay = started - queued
+            with self.lock:
+                self.stats[_callback_name(func)].add(delay, finished - started)
+                self.pending[key].popleft()
+                if self.pending[key]:
+                    self.ready.put(key)
+                else:
+                    del self.pending[key]
+            if delay > self.warn_delay:
+                logger.warning('Callback {} waited {:0.3f} s to run'.format(_callback_name(func), delay))
+
+    def backlog(self):
+        """
+        Return the number of callbacks queued or running
+        """
+        with self.lock:
+            return sum(len(callbacks) for callbacks in self.pending.values())
+
+    def get_stats(self):
+        """
+        Return the queueing delay and run time statistics of each callback, in seconds
+
+        :return: dictionary mapping callback names to dictionaries with count, delay, max_delay, runtime and
+            max_runtime
+        """
+        with self.lock:
+            return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def report(self):
+        """
+        Log the statistics of all callbacks, slowest to start first
+        """
+        stats = sorted(self.get_stats().items(), key=lambda item: -item[1]['max_delay'])
+        lines = ['{:>32} {:>8} {:>12} {:>12} {:>12}'.format('callback', 'count', 'delay (ms)', 'max (ms)', 'run (ms)')]
+        for name, info in stats:
+            lines.append('{:>32} {:>8} {:>12.3f} {:>12.3f} {:>12.3f}'.format(
+                name, info['count'], 1e3 * info['delay'], 1e3 * info['max_delay'], 1e3 * info['runtime']
+            ))
+        logger.info('Callback statistics:\n' + '\n'.join(lines))
+
+
+def _callback_name(func):
+    return getattr(func, '__name__', repr(func))
@@ -0,0 +1,681 @@
+"""
+In-memory implementation of the parts of the EPICS Channel Access client library (libca) used by softdev.epics,
+so that models and applications can run without an EPICS installation, for example in benchmarks.
+
+The functions take the same ctypes arguments as their libca counterparts. Channels are served from memory:
+records are loaded from the startup scripts and databases generated by softdev.models, or added directly with
+add_channel. Connections and monitor events are delivered from a background thread after a configurable latency,
+as Channel Access does with preemptive callbacks. A small subset of record processing is simulated: toggles (bo
+records with HIGH), calc and calcout records with CP input links, and the UDF and PROC fields.
+
+Select it with the SOFTDEV_CA_BACKEND=fake environment variable or with epics.set_backend('fake') before any PVs
+are created.
+
+This module is for tests and benchmarks only. Calc expressions are translated to Python and evaluated with eval,
+without builtins but otherwise unchecked, so only databases from trusted sources, such as those generated by
+softdev.models, may be loaded.
+"""
+
+import collections
+import heapq
+import itertools
+import math
+import os
+import random
+import re
+import threading
+import time
+from ctypes import *
+from ctypes import _Pointer
+
+from . import epics, log, models
+
+logger = log.get_module_logger(__name__)
+
+# value types of records, waveform records use FTVL
+RECORD_TYPES = {
+    'ai': epics.DBR_DOUBLE,
+    'ao': epics.DBR_DOUBLE,
+    'calc': epics.DBR_DOUBLE,
+    'calcout': epics.DBR_DOUBLE,
+    'longin': epics.DBR_LONG,
+    'longout': epics.DBR_LONG,
+    'mbbiDirect': epics.DBR_LONG,
+    'mbboDirect': epics.DBR_LONG,
+    'bi': epics.DBR_ENUM,
+    'bo': epics.DBR_ENUM,
+    'mbbi': epics.DBR_ENUM,
+    'mbbo': epics.DBR_ENUM,
+    'stringin': epics.DBR_STRING,
+    'stringout': epics.DBR_STRING,
+}
+
+FTVL_TYPES = {
+    'STRING': epics.DBR_STRING,
+    'CHAR': epics.DBR_CHAR,
+    'UCHAR': epics.DBR_CHAR,
+    'SHORT': epics.DBR_SHORT,
+    'USHORT': epics.DBR_SHORT,
+    'LONG': epics.DBR_LONG,
+    'ULONG': epics.DBR_LONG,
+    'ENUM': epics.DBR_ENUM,
+    'FLOAT': epics.DBR_FLOAT,
+    'DOUBLE': epics.DBR_DOUBLE,
+}
+
+CALC_INPUTS = 'ABCDEFGHIJKL'
+CALC_FUNCTIONS = {
+    'ABS': abs, 'SQRT': math.sqrt, 'MIN': min, 'MAX': max, 'EXP': math.exp, 'LOG': math.log10, 'LN': math.log,
+    'SIN': math.sin, 'COS': math.cos, 'TAN': math.tan, 'FLOOR': math.floor, 'CEIL': math.ceil, 'PI': math.pi,
+}
+
+RECORD_PATTERN = re.compile(r'record\(\s*(\w+)\s*,\s*"([^"]+)"\s*\)\s*\{(.*?)\}', re.DOTALL)
+FIELD_PATTERN = re.compile(r'field\(\s*(\w+)\s*,\s*"((?:[^"\\]|\\.)*)"\s*\)')
+LOAD_PATTERN = re.compile(r'dbLoadRecords\(\s*"([^"]+)"\s*(?:,\s*"([^"]*)")?\s*\)')
+MACRO_PATTERN = re.compile(r'\$\((\w+)\)')
+
+
+def _target(ref):
+    """
+    Return the ctypes object behind an argument passed by reference with byref, pointer or directly
+    """
+    if hasattr(ref, '_obj'):
+        return ref._obj
+    elif isinstance(ref, _Pointer):
+        return ref.contents
+    return ref
+
+
+def _chid(value):
+    return value.value if hasattr(value, 'value') else value
+
+
+def _to_bytes(text):
+    return text if isinstance(text, bytes) else text.encode('utf-8')
+
+
+def _calc_expression(expr):
+    """
+    Compile an EPICS calc expression into a python expression
+    """
+    expr = expr.replace('#', '!=').replace('&&', ' and ').replace('||', ' or ').replace('^', '**')
+    expr = re.sub(r'(?<![<>!=])=(?!=)', '==', expr)
+    expr = re.sub(r'!(?!=)', ' not ', expr)
+    return compile(expr, '<calc>', 'eval')
+
+
+class Channel(object):
+    """
+    A channel served by the fake library, corresponding to a record or a field of a record
+    """
+
+    def __init__(self, name, dbr_type, count=1, value=None, enums=(), units='', precision=0, high=0.0):
+        """
+        :param name: channel name
+        :param dbr_type: native DBR_XXX type
+        :param count: element count
+        :param value: initial value
+        :param enums: state names of enum channels
+        :param units: engineering units
+        :param precision: display precision
+        :param high: for enum channels, return to zero this many seconds after a non-zero put (bo HIGH)
+        """
+        self.name = name
+        self.type = dbr_type
+        self.count = count
+        self.data = epics.get_value_type(dbr_type, count)()
+        self.enums = list(enums)
+        self.units = units
+        self.precision = precision
+        self.high = high
+        self.status = epics.NO_ALARM
+        self.severity = epics.NONE
+        self.stamp = time.time()
+        self.udf = False
+        self.record = None
+        self.field = None
+        self.calc = None
+        self.inputs = {}
+        self.output = None
+        self.listeners = []
+        if value is not None:
+            self.set_value(value)
+
+    def set_value(self, value):
+        """
+        Set the value of the channel from a python value
+        """
+        if self.type == epics.DBR_STRING and self.count > 1:
+            for i, item in enumerate(value[:self.count]):
+                self.data[i].value = _to_bytes(item)[:epics.MAX_STRING_SIZE - 1]
+        elif self.type == epics.DBR_STRING or (self.type == epics.DBR_CHAR and self.count > 1):
+            raw = _to_bytes(value)[:sizeof(self.data) - 1]
+            memset(addressof(self.data), 0, sizeof(self.data))
+            memmove(addressof(self.data), raw, len(raw))
+        elif self.count > 1:
+            for i, item in enumerate(list(value)[:self.count]):
+                self.data[i] = item
+        else:
+            self.data.value = int(value) if self.type in (epics.DBR_ENUM, epics.DBR_SHORT, epics.DBR_LONG) else value
+
+    def get_value(self):
+        """
+        Return the scalar value of the channel as a python number, used by calc records
+        """
+        if self.count > 1 or self.type in (epics.DBR_STRING, epics.DBR_CHAR):
+            return 0.0
+        return float(self.data.value)
+
+    def fill(self, dbr, dbr_type, count):
+        """
+        Fill a DBR_XXX value or DBR_TIME_XXX/DBR_CTRL_XXX structure with the state of the channel
+        """
+        size = sizeof(epics.get_value_type(self.type, min(count, self.count)))
+        if dbr_type < epics.DBR_STS_STRING:
+            memmove(addressof(dbr), addressof(self.data), size)
+            return
+        dbr.status = self.status
+        dbr.severity = self.severity
+        memmove(addressof(dbr) + type(dbr).value.offset, addressof(self.data), size)
+        if hasattr(dbr, 'stamp'):
+            stamp = self.stamp - epics.POSIX_TIME_AT_EPICS_EPOCH
+            dbr.stamp.secs = int(stamp)
+            dbr.stamp.nsec = int((stamp - int(stamp)) * 1e9)
+        if hasattr(dbr, 'strs'):
+            dbr.no_str = len(self.enums)
+            for i, state in enumerate(self.enums[:epics.MAX_ENUM_STATES]):
+                dbr.strs[i].value = _to_bytes(state)[:epics.MAX_ENUM_STRING_SIZE - 1]
+        if hasattr(dbr, 'units'):
+            dbr.units = _to_bytes(self.units)[:epics.MAX_UNITS_SIZE - 1]
+        if hasattr(dbr, 'precision'):
+            dbr.precision = self.precision
+
+
+class Client(object):
+    """
+    Client side of a channel, identified by its chid
+    """
+
+    def __init__(self, chid, name, callback):
+        self.chid = chid
+        self.name = name
+        self.callback = callback
+        self.channel = None
+        self.was_connected = False
+        self.subscriptions = {}
+
+
+class Subscription(object):
+    def __init__(self, event_id, client, dbr_type, count, mask, callback, user):
+        self.event_id = event_id
+        self.client = client
+        self.type = dbr_type
+        self.count = count
+        self.mask = mask
+        self.callback = callback
+        self.user = user
+
+
+class FakeLibCA(object):
+    """
+    In-memory Channel Access library. Implements the libca functions used by softdev.epics, plus methods for
+    serving channels.
+    """
+
+    def __init__(self, connect_latency=0.002, event_latency=0.0002, jitter=0.25):
+        """
+        :param connect_latency: delay in seconds between creating a channel and its connection
+        :param event_latency: delay in seconds between a change and the delivery of monitor events
+        :param jitter: relative random variation of the latencies
+        """
+        self.connect_latency = connect_latency
+        self.event_latency = event_latency
+        self.jitter = jitter
+        self.channels = {}
+        self.clients = {}
+        self.pending = {}
+        self.connecting = set()  # clients without connection callback, scheduled to connect
+        self.subscriptions = {}
+        self.watchers = collections.defaultdict(set)
+        self.chids = itertools.count(1)
+        self.event_ids = itertools.count(1)
+        self.sequence = itertools.count()
+        self.queue = []
+        self.last_due = {}
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)
+        self.running = False
+        self.thread = None
+        self.exception_callback = None
+        self.event_count = 0
+
+    # Serving channels
+    def add_channel(self, name, dbr_type, count=1, value=None, **kwargs):
+        """
+        Serve a new channel. Clients waiting for the name are connected. An existing channel with the same name is
+        kept, as with duplicate records in an IOC.
+
+        :param name: channel name
+        :param dbr_type: native DBR_XXX type
+        :param count: element count
+        :param value: initial value
+        :param kwargs: Channel keyword arguments
+        :return: Channel
+        """
+        with self.lock:
+            if name in self.channels:
+                logger.warning('Channel {} already exists'.format(name))
+                return self.channels[name]
+            channel = Channel(name, dbr_type, count=count, value=value, **kwargs)
+            self.channels[name] = channel
+            for client in self.pending.pop(name, []):
+                self.schedule_connect(client)
+        return channel
+
+    def get_channel(self, name):
+        """
+        Return the channel serving a name, creating channels for record fields on demand
+        """
+        with self.lock:
+            if name not in self.channels and '.' in name:
+                record_name, field = name.rsplit('.', 1)
+                record = self.channels.get(record_name)
+                if record is None:
+                    return None
+                if field == 'VAL':
+                    return record
+                channel = self.add_channel(name, epics.DBR_LONG)
+                channel.record = record
+                channel.field = field
+            return self.channels.get(name)
+
+    def load_database(self, text, macros=None):
+        """
+        Serve the records of an EPICS database
+
+        :param text: database text
+        :param macros: dictionary of macro values
+        :return: list of channels created
+        """
+        macros = macros or {}
+        text = MACRO_PATTERN.sub(lambda m: str(macros.get(m.group(1), m.group(0))), text)
+        channels = []
+        for record_type, name, body in RECORD_PATTERN.findall(text):
+            fields = {k: v for k, v in FIELD_PATTERN.findall(body)}
+            channels.append(self.add_record(record_type, name, fields))
+        for channel in channels:
+            self.link_record(channel)
+        return channels
+
+    def load_ioc(self, filename):
+        """
+        Serve the records loaded by dbLoadRecords commands of an IOC startup script. Other commands are ignored.
+
+        :param filename: startup script, databases are relative to its directory
+        """
+        directory = os.path.dirname(os.path.abspath(filename))
+        with open(filename) as cmd_file:
+            script = cmd_file.read()
+        for db_name, macro_text in LOAD_PATTERN.findall(script):
+            macros = dict(item.split('=', 1) for item in macro_text.split(',') if '=' in item)
+            with open(os.path.join(directory, db_name)) as db_file:
+                self.load_database(db_file.read(), macros)
+
+    def add_record(self, record_type, name, fields):
+        """
+        Serve a record from its type and fields
+        """
+        count = 1
+        if record_type == 'waveform':
+            dbr_type = FTVL_TYPES.get(fields.get('FTVL', 'DOUBLE'), epics.DBR_DOUBLE)
+            count = int(fields.get('NELM', 1))
+        else:
+            dbr_type = RECORD_TYPES.get(record_type, epics.DBR_DOUBLE)
+
+        if record_type in ('bi', 'bo'):
+            enums = [fields.get('ZNAM', ''), fields.get('ONAM', '')]
+        else:
+            enums = [fields[key + 'ST'] for key in models.ENUM_KEYS if key + 'ST' in fields]
+
+        value = fields.get('VAL') if count == 1 else None
+        if value is not None and dbr_type != epics.DBR_STRING:
+            try:
+                value = float(value)
+            except ValueError:
+                value = None
+        high = float(fields.get('HIGH', 0) or 0) if record_type == 'bo' else 0.0
+        channel = self.add_channel(
+            name, dbr_type, count=count, value=value, enums=enums, units=fields.get('EGU', ''),
+            precision=int(fields.get('PREC', 0) or 0), high=high
+        )
+        if record_type in ('calc', 'calcout') and 'CALC' in fields:
+            try:
+                channel.calc = _calc_expression(fields['CALC'])
+            except SyntaxError:
+                logger.warning('{}: unsupported calc expression: {}'.format(name, fields['CALC']))
+            for letter in CALC_INPUTS:
+                link = fields.get('INP' + letter)
+                if link:
+                    channel.inputs[letter] = link.split()
+            if record_type == 'calcout' and fields.get('OUT'):
+                channel.output = fields['OUT'].split()[0]
+        return channel
+
+    def link_record(self, channel):
+        """
+        Connect the CP input links of a calc record to their sources
+        """
+        for letter, link in channel.inputs.items():
+            source = self.get_channel(link[0])
+            if source is not None and 'CP' in link[1:]:
+                source.listeners.append(channel)
+        if channel.calc is not None:
+            self.process(channel)
+
+    def set_connected(self, name, connected):
+        """
+        Simulate the loss or recovery of the server connection of a channel
+
+        :param name: channel name
+        :param connected: True to connect, False to disconnect
+        """
+        with self.lock:
+            clients = [client for client in self.clients.values() if client.name == name]
+        op = epics.CA_OP_CONN_UP if connected else epics.CA_OP_CONN_DOWN
+        for client in clients:
+            with self.lock:
+                client.channel = self.channels.get(name) if connected else None
+            if client.callback:
+                self.schedule(self.connect_latency, client.callback, epics.ConnectionHandlerArgs(client.chid, op))
+            if connected:
+                # monitors send the current value again when the connection is restored
+                with self.lock:
+                    for sub in client.subscriptions.values():
+                        self.send_event(sub, client.channel)
+
+    def write(self, name, value):
+        """
+        Change the value of a channel on the server side and post monitor events
+        """
+        channel = self.get_channel(name)
+        with self.lock:
+            channel.set_value(value)
+        self.post(channel)
+
+    # Record processing
+    def post(self, channel):
+        """
+        Record a change of a channel, post monitor events to its subscribers and process dependent records
+        """
+        with self.lock:
+            channel.stamp = time.time()
+            for sub in self.watchers.get(channel.name, ()):
+                if sub.client.channel is channel and sub.mask & (epics.DBE_VALUE | epics.DBE_ALARM | epics.DBE_LOG):
+                    self.send_event(sub, channel)
+            listeners = list(channel.listeners)
+        for listener in listeners:
+            self.process(listener)
+
+    def process(self, channel):
+        """
+        Process a calc or calcout record
+        """
+        if channel.calc is None:
+            return
+        with self.lock:
+            values = {letter: 0.0 for letter in CALC_INPUTS}
+            for letter, link in channel.inputs.items():
+                source = self.get_channel(link[0])
+                if source is not None:
+                    values[letter] = source.get_value()
+            values.update(CALC_FUNCTIONS)
+            try:
+                # trusted expressions only, see the module documentation
+                result = float(eval(channel.calc, {'__builtins__': {}}, values))
+            except (ArithmeticError, ValueError, TypeError):
+                return
+            channel.set_value(result)
+        self.post(channel)
+        if channel.output:
+            target = self.get_channel(channel.output)
+            if target is not None:
+                self.write(target.name, result)
+
+    def put_field(self, channel, value):
+        """
+        Handle puts to fields of records
+        """
+        record = channel.record
+        if channel.field == 'UDF':
+            record.udf = bool(value)
+        elif channel.field == 'PROC':
+            if record.udf:
+                record.status, record.severity = epics.UDF_ALARM, epics.INVALID_ALARM
+            self.post(record)
+            self.process(record)
+
+    def reset_toggle(self, channel):
+        with self.lock:
+            channel.data.value = 0
+        self.post(channel)
+
+    # Event delivery
+    def schedule(self, delay, func, *args):
+        """
+        Call a function from the event thread after a delay with random jitter. Calls for the same function and
+        first argument are delivered in order.
+        """
+        delay *= random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        key = (func, args[0] if args else None)
+        with self.condition:
+            due = max(time.time() + delay, self.last_due.get(key, 0.0))
+            self.last_due[key] = due
+            heapq.heappush(self.queue, (due, next(self.sequence), func, args))
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and (not self.queue or self.queue[0][0] > time.time()):
+                    self.condition.wait(self.queue[0][0] - time.time() if self.queue else None)
+                if not self.running:
+                    return
+                due, seq, func, args = heapq.heappop(self.queue)
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error('Error in Channel Access callback: {}'.format(e))
+
+    def send_event(self, sub, channel):
+        """
+        Post a monitor event with a snapshot of the channel to a subscriber
+        """
+        if sub.type < epics.DBR_STS_STRING:
+            dbr = epics.get_value_type(sub.type, sub.count)()
+        else:
+            dbr = epics.get_dbr_type(sub.type, sub.count)()
+        channel.fill(dbr, sub.type, sub.count)
+        self.schedule(self.event_latency, self.deliver, sub, dbr)
+
+    def deliver(self, sub, dbr):
+        if sub.event_id not in self.subscriptions:
+            return
+        args = epics.EventHandlerArgs(
+            usr=getattr(sub.user, 'value', sub.user), chid=sub.client.chid, type=sub.type, count=sub.count, dbr=addressof(dbr),
+            status=epics.ECA_NORMAL
+        )
+        self.event_count += 1
+        sub.callback(args)
+
+    def schedule_connect(self, client):
+        """
+        Schedule the connection of a client to its channel, ca_pend_io waits for clients without callback
+        """
+        with self.lock:
+            if client.callback is None:
+                self.connecting.add(client)
+            self.schedule(self.connect_latency, self.connect_client, client)
+
+    def connect_client(self, client):
+        with self.lock:
+            self.connecting.discard(client)
+            if client.chid not in self.clients:
+                return
+            client.channel = self.channels.get(client.name)
+            client.was_connected = True
+            self.condition.notify_all()
+        if client.callback:
+            client.callback(epics.ConnectionHandlerArgs(client.chid, epics.CA_OP_CONN_UP))
+
+    # libca functions
+    def ca_context_create(self, preemptive):
+        with self.lock:
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self.run, name='fakeca')
+                self.thread.daemon = True
+                self.thread.start()
+        return 1
+
+    def ca_context_destroy(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def ca_current_context(self):
+        return id(self)
+
+    def ca_attach_context(self, context):
+        return 1
+
+    def ca_add_exception_event(self, callback, user):
+        self.exception_callback = callback
+        return 1
+
+    def ca_create_channel(self, name, callback, user, priority, pchid):
+        name = name.decode('utf-8') if isinstance(name, bytes) else name
+        with self.lock:
+            chid = next(self.chids)
+            client = Client(chid, name, callback)
+            self.clients[chid] = client
+            if self.get_channel(name) is not None:
+                self.schedule_connect(client)
+            else:
+                self.pending.setdefault(name, []).append(client)
+        _target(pchid).value = chid
+        return 1
+
+    def ca_clear_channel(self, chid):
+        with self.lock:
+            client = self.clients.pop(_chid(chid), None)
+            if client is not None:
+                self.connecting.discard(client)
+                for sub in client.subscriptions.values():
+                    self.subscriptions.pop(sub.event_id, None)
+                    self.watchers[client.name].discard(sub)
+        return 1
+
+    def ca_state(self, chid):
+        client = self.clients.get(_chid(chid))
+        if client is not None and client.channel is not None:
+            return epics.CONNECTED
+        elif client is not None and client.was_connected:
+            return epics.PREVIOUSLY_CONNECTED
+        return epics.NEVER_CONNECTED
+
+    def channel(self, chid):
+        client = self.clients.get(_chid(chid))
+        if client is None or client.channel is None:
+            raise epics.ChannelAccessError('Channel not connected')
+        return client.channel
+
+    def ca_element_count(self, chid):
+        return self.channel(chid).count
+
+    def ca_field_type(self, chid):
+        return self.channel(chid).type
+
+    def ca_host_name(self, chid):
+        return b'localhost:5064'
+
+    def ca_read_access(self, chid):
+        return 1
+
+    def ca_write_access(self, chid):
+        return 1
+
+    def ca_name(self, chid):
+        client = self.clients.get(_chid(chid))
+        return _to_bytes(client.name) if client else b''
+
+    def ca_message(self, status):
+        return b'Normal successful completion'
+
+    def ca_array_get(self, dbr_type, count, chid, pdata):
+        channel = self.channel(chid)
+        with self.lock:
+            channel.fill(_target(pdata), dbr_type, count)
+        return 1
+
+    def ca_array_put(self, dbr_type, count, chid, pdata):
+        channel = self.channel(chid)
+        data = _target(pdata)
+        if channel.record is not None:
+            self.put_field(channel, data.value if hasattr(data, 'value') else 0)
+            return 1
+        with self.lock:
+            memmove(addressof(channel.data), addressof(data), min(sizeof(data), sizeof(channel.data)))
+            if channel.udf:
+                channel.udf = False
+                channel.status, channel.severity = epics.NO_ALARM, epics.NONE
+        self.post(channel)
+        if channel.high and channel.data.value:
+            self.schedule(channel.high, self.reset_toggle, channel)
+        return 1
+
+    def ca_create_subscription(self, dbr_type, count, chid, mask, callback, user, event_id):
+        client = self.clients[_chid(chid)]
+        with self.lock:
+            sub = Subscription(next(self.event_ids), client, dbr_type, count, mask, callback, user)
+            self.subscriptions[sub.event_id] = sub
+            client.subscriptions[sub.event_id] = sub
+            self.watchers[client.name].add(sub)
+            if client.channel is not None:
+                self.send_event(sub, client.channel)
+        _target(event_id).value = sub.event_id
+        return 1
+
+    def ca_clear_subscription(self, event_id):
+        with self.lock:
+            sub = self.subscriptions.pop(_chid(event_id), None)
+            if sub is not None:
+                sub.client.subscriptions.pop(sub.event_id, None)
+                self.watchers[sub.client.name].discard(sub)
+        return 1
+
+    def ca_pend_io(self, timeout):
+        """
+        Wait for channels created without a connection callback to connect. Channels which do not exist yet are
+        not waited for.
+        """
+        end = time.time() + timeout
+        with self.condition:
+            while self.connecting and time.time() < end:
+                self.condition.wait(end - time.time())
+        return 1
+
+    def ca_pend_event(self, timeout):
+        time.sleep(timeout)
+        return 1
+
+    def ca_flush_io(self):
+        return 1
+
+    def ca_client_status(self, level):
+        logger.info('Fake Channel Access: {} channels, {} clients, {} subscriptions, {} events delivered'.format(
+            len(self.channels), len(self.clients), len(self.subscriptions), self.event_count
+        ))
+        return 1
+
+    def ca_dump_dbr(self, dbr_type, count, pdata):
+        return 1
@@ -2,13 +2,24 @@
 This module implements utility classes and functions for logging.
 """
 
+import atexit
+import collections
+import copy
 import logging
+import threading
+import time
 from logging.handlers import RotatingFileHandler
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 LOG_LEVEL = logging.DEBUG
 IMPORTANT = 25
 logging.addLevelName(IMPORTANT, 'IMPORTANT')
 DEBUGGING = False
+RATE_LIMIT = 10.0  # minimum interval in seconds between repeats of a message from the same logger and arguments
 
 
 class TermColor(object):
@@ -69,6 +80,177 @@ class ColoredConsoleHandler(logging.StreamHandler):
         return msg
 
 
+class QueueHandler(logging.Handler):
+    """
+    A log handler which places records on a queue to be formatted and emitted by a QueueListener in a separate
+    thread. Message arguments are not formatted in the calling thread. A copy of each record is queued, so that
+    other handlers of the same record are not affected.
+    """
+
+    def __init__(self, records):
+        logging.Handler.__init__(self)
+        self.records = records
+
+    def emit(self, record):
+        try:
+            record = copy.copy(record)
+            if record.exc_info:
+                # tracebacks can not be formatted later, so do it now
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            suppressed = getattr(record, 'suppressed', 0)
+            if suppressed:
+                record.msg = '{} [{} repeats suppressed]'.format(record.msg, suppressed)
+            self.records.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """
+    Receives log records from a queue and dispatches them to the attached handlers in a listener thread.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.handlers = []
+        self.thread = None
+
+    def add_handler(self, handler):
+        self.handlers.append(handler)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='LogListener')
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            record = self.records.get()
+            if record is None:
+                break
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def stop(self):
+        if self.thread and self.thread.is_alive():
+            self.records.put(None)
+            self.thread.join()
+        self.thread = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Suppresses repeats of the same message, from the same logger and with the same arguments, which occur within
+    the given interval. The number of suppressed repeats is stored in the `suppressed` attribute of the next
+    occurrence which is let through, and reported by the QueueHandler.
+    Debug messages, messages at IMPORTANT level and messages at ERROR level and above are never suppressed.
+    """
+
+    max_messages = 1000  # forget the least recent messages once this many are tracked
+
+    def __init__(self, interval=RATE_LIMIT):
+        logging.Filter.__init__(self)
+        self.interval = interval
+        self.messages = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if (
+                record.levelno >= logging.ERROR or record.levelno <= logging.DEBUG or record.levelno == IMPORTANT
+                or self.interval <= 0
+        ):
+            return True
+        key = (record.name, record.msg, record.args)
+        try:
+            hash(key)
+        except TypeError:
+            key = (record.name, record.getMessage())
+        now = time.time()
+        with self.lock:
+            last, suppressed = self.messages.get(key, (0.0, 0))
+            if now - last < self.interval:
+                self.messages[key] = (last, suppressed + 1)
+                return False
+            self.messages.pop(key, None)
+            if len(self.messages) >= self.max_messages:
+                self.messages.popitem(last=False)
+            self.messages[key] = (now, 0)
+        record.suppressed = suppressed
+        return True
+
+
+class DeviceLogger(logging.LoggerAdapter):
+    """
+    Logger adapter which prefixes messages with the name of the device they concern, for processes hosting
+    several devices.
+    """
+
+    def process(self, msg, kwargs):
+        return '{}: {}'.format(self.extra['device'], msg), kwargs
+
+    def warn(self, msg, *args, **kwargs):
+        self.warning(msg, *args, **kwargs)
+
+
+class DebugChannel(object):
+    """
+    A named channel of diagnostic messages which can be switched on and off at runtime. Messages are formatted
+    only if the channel is enabled, and are logged at INFO level so that they are visible without verbose
+    logging.
+    """
+
+    def __init__(self, name, enabled=False, device=None):
+        self.logger = get_module_logger(name) if device is None else get_device_logger(device, name)
+        self.enabled = enabled
+
+    def __call__(self, msg, *args):
+        if self.enabled:
+            self.logger.info(msg, *args)
+
+
+_records = queue.Queue()
+_listener = QueueListener(_records)
+_queue_handler = QueueHandler(_records)
+_rate_limiter = RateLimitFilter()
+_queue_handler.addFilter(_rate_limiter)
+_channels = {}
+
+
+def _add_handler(handler, queued):
+    if queued:
+        if not _listener.thread:
+            logging.getLogger('').addHandler(_queue_handler)
+            _listener.start()
+        _listener.add_handler(handler)
+    else:
+        logging.getLogger('').addHandler(handler)
+
+
+@atexit.register
+def stop_queue():
+    """Flush all queued log records and stop the listener thread."""
+    _listener.stop()
+
+
+def set_rate_limit(interval):
+    """
+    Set the minimum interval between repeats of the same message, for queued handlers.
+
+    :param interval: interval in seconds, 0 disables rate limiting
+    """
+    _rate_limiter.interval = interval
+
+
+def get_debug_channel(name, device=None):
+    """Return the debug channel with the given name, for the given device if any, creating it if necessary."""
+    key = (name, device)
+    if key not in _channels:
+        _channels[key] = DebugChannel(name, device=device)
+    return _channels[key]
+
+
 def get_module_logger(name):
     """A factory which creates loggers with the given name and returns it."""
     name = name.split('.')[-1]
@@ -78,8 +260,28 @@ def get_module_logger(name):
     return logger
 
 
-def log_to_console(level=LOG_LEVEL):
-    """Add a log handler which logs to the console."""
+def device_key(device):
+    """Logger name component for a device name."""
+    return device.replace('.', '_')
+
+
+def get_device_logger(device, name):
+    """
+    Return a logger for messages of a module concerning a single device. Records are logged to the logger named
+    '<device>.<module>' so that handlers can be restricted to one device, see log_to_file.
+    """
+    logger = logging.getLogger('{}.{}'.format(device_key(device), name.split('.')[-1]))
+    logger.setLevel(LOG_LEVEL)
+    return DeviceLogger(logger, {'device': device})
+
+
+def log_to_console(level=LOG_LEVEL, queued=False):
+    """
+    Add a log handler which logs to the console.
+
+    :param level: log level
+    :param queued: if True, records are queued and emitted from a listener thread, with rate limiting
+    """
 
     console = ColoredConsoleHandler()
     console.setLevel(level)
@@ -88,16 +290,25 @@ def log_to_console(level=LOG_LEVEL):
     else:
         formatter = logging.Formatter('%(asctime)s - %(message)s', '%b/%d %H:%M:%S')
     console.setFormatter(formatter)
-    logging.getLogger('').addHandler(console)
+    _add_handler(console, queued)
+
 
+def log_to_file(filename, level=logging.DEBUG, queued=False, device=None):
+    """
+    Add a log handler which logs to a rotating file.
 
-def log_to_file(filename, level=logging.DEBUG):
-    """Add a log handler which logs to the console."""
+    :param filename: log file name
+    :param level: log level
+    :param queued: if True, records are queued and written from a listener thread, with rate limiting
+    :param device: if given, only records from device loggers of this device are written
+    """
     logfile = RotatingFileHandler(filename, maxBytes=1e6, backupCount=10)
     logfile.setLevel(level)
+    if device is not None:
+        logfile.addFilter(logging.Filter(device_key(device)))
     formatter = logging.Formatter('%(asctime)s [%(name)s] %(message)s', '%b/%d %H:%M:%S')
     logfile.setFormatter(formatter)
-    logging.getLogger('').addHandler(logfile)
+    _add_handler(logfile, queued)
 
 
 logger = get_module_logger(__name__)
\ No newline at end of file
@@ -1,4 +1,3 @@
-import collections
 import multiprocessing
 import os
 import shutil
@@ -6,6 +5,11 @@ import subprocess
 import time
 from enum import EnumMeta
 
+try:
+    from collections.abc import Iterable
+except ImportError:
+    from collections import Iterable
+
 from . import epics, log
 
 ENUM_KEYS = [
@@ -16,6 +20,21 @@ ENUM_KEYS = [
 logger = log.get_module_logger(__name__)
 
 
+def compile_template(fields):
+    """
+    Build the database template of a record from its fields. Field values may contain format fields which are
+    replaced by the record options.
+
+    :param fields: dictionary of field names and values
+    :return: format string
+    """
+    return '\n'.join(
+        ['record({record}, "$(device):{name}") {{'] +
+        ['  field({}, "{}")'.format(k, v) for k, v in fields.items()] +
+        ['}}', '']
+    )
+
+
 class RecordType(type):
     """Record MetaClass"""
 
@@ -26,14 +45,16 @@ class RecordType(type):
         # update fields
         fields = {}
         fields.update(getattr(bases[0], 'fields', {}))
-        fields.update(dct.get('fields'))
+        fields.update(dct.get('fields', {}))
         dct['fields'] = fields
 
+        # compile the database template of the record type once
+        dct['template'] = compile_template(fields)
+
         return super(RecordType, cls).__new__(cls, name, bases, dct)
 
 
-class Record(object):
-    __metaclass__ = RecordType
+class Record(RecordType('RecordBase', (object,), {})):
     required = ['name', 'desc']
     record = 'ai'
     fields = {
@@ -46,7 +67,9 @@ class Record(object):
 
         :param name: Record name (str)
         :param desc: Description (str)
-        :param kwargs: additional keyword arguments
+        :param kwargs: additional keyword arguments. The subscription keyword takes a dictionary of value monitor
+            options of the record's process variable, see the mask, deadband, relative and max_rate parameters of
+            epics.PV
         """
         kwargs.update(name=name, desc=desc)
         kw = {k: v for k, v in kwargs.items() if v is not None}
@@ -55,17 +78,19 @@ class Record(object):
         self.options['record'] = self.record
         self.instance_fields = {}
         self.instance_fields.update(self.fields)
+        self._template = self.template
+        self._text = None
         missing_args = set(self.required) - set(self.options.keys())
         assert not missing_args, '{}: Missing required kwargs: "{}"'.format(self.__class__.__name__,
                                                                             ', '.join(missing_args))
 
     def __str__(self):
-        template = '\n'.join(
-            ['record({record}, "$(device):{name}") {{'] +
-            ['  field({}, "{}")'.format(k, v) for k, v in self.instance_fields.items()] +
-            ['}}', '']
-        )
-        return template.format(**self.options)
+        # the template of the record type is used unless fields were changed, the text is rendered only once
+        if self._text is None:
+            if self._template is None:
+                self._template = compile_template(self.instance_fields)
+            self._text = self._template.format(**self.options)
+        return self._text
 
     def add_field(self, key, value):
         """
@@ -76,6 +101,7 @@ class Record(object):
         :return:
         """
         self.instance_fields[key] = value
+        self._template = self._text = None
 
     def del_field(self, key):
         """
@@ -85,6 +111,7 @@ class Record(object):
         """
         if key in self.instance_fields:
             del self.instance_fields[key]
+            self._template = self._text = None
 
 
 class Enum(Record):
@@ -107,7 +134,7 @@ class Enum(Record):
         super(Enum, self).__init__(name, **kwargs)
         if isinstance(self.options['choices'], EnumMeta):
             choice_pairs = [(e.name, e.value) for e in self.options['choices']]
-        elif isinstance(self.options['choices'], collections.Iterable):
+        elif isinstance(self.options['choices'], Iterable):
             choice_pairs = [(c, i) for i, c in enumerate(self.options['choices'])]
         else:
             choice_pairs = []
@@ -242,10 +269,10 @@ class Float(Record):
     record = 'ao'
     required = ['units']
     fields = {
-        'DRVL': '{max_val:0.4e}',
-        'DRVH': '{min_val:0.4e}',
-        'LOPR': '{max_val:0.4e}',
-        'HOPR': '{min_val:0.4e}',
+        'DRVH': '{max_val:0.4e}',
+        'DRVL': '{min_val:0.4e}',
+        'HOPR': '{max_val:0.4e}',
+        'LOPR': '{min_val:0.4e}',
         'PREC': '{prec}',
         'EGU': '{units}',
         'VAL': '{default}'
@@ -325,16 +352,17 @@ class Array(Record):
         'FTVL': '{type}',
     }
 
-    def __init__(self, name, type=int, length=None, **kwargs):
+    def __init__(self, name, type=int, length=None, history=0, **kwargs):
         """
         Array Record.
 
         :param name: Record Name
         :param type: Element type (str or python type), supported types are ['STRING', 'SHORT', 'FLOAT', int, str, float]
         :param length: Number of elements in the array
+        :param history: Number of past values of numeric arrays to keep on the PV, see epics.PV.get_history
         :param kwargs: Extra kwargs
         """
-        kwargs.update(type=type, length=length)
+        kwargs.update(type=type, length=length, history=history)
         super(Array, self).__init__(name, **kwargs)
         element_type = self.options['type']
         self.options['type'] = {
@@ -346,27 +374,73 @@ class Array(Record):
 
 CMD_TEMPLATE = """
 ## Load record instances
-dbLoadRecords("{db_name}.db", "{macros}")
-iocInit()
+{loads}iocInit()
 dbl
 """
 
+LOAD_TEMPLATE = 'dbLoadRecords("{db_name}.db", "{macros}")\n'
+
+
+class RecordArray(object):
+    # placeholders used to render the template shared by all records of the array
+    NAME_MARK = '\x01'
+    DESC_MARK = '\x02'
+
+    def __init__(self, record_type, name, count=None, keys=None, start=0, desc=None, **kwargs):
+        """
+        A group of records of the same type which differ only by name and description, for example one record
+        per puck. The record database text is rendered once for the whole group and the model attribute is a list
+        of process variables, one per record, in order.
+
+        :param record_type: Record class
+        :param name: Record name pattern, '{}' is replaced by the key of each record, e.g. 'STATE:puck{:02d}'
+        :param count: Number of records, keys are integers from start
+        :param keys: Keys of the records, instead of count, e.g. port names from a geometry configuration
+        :param start: First key when count is given
+        :param desc: Description (str) pattern, '{}' is replaced by the key, or list of descriptions
+        :param kwargs: keyword arguments of the record type, shared by all records
+        """
+        self.keys = list(keys) if keys is not None else list(range(start, start + count))
+        self.names = [name.format(key) for key in self.keys]
+        assert len(set(self.names)) == len(self.names), '{}: Record names are not unique'.format(name)
+        if isinstance(desc, (list, tuple)):
+            self.descs = list(desc)
+        else:
+            self.descs = [desc.format(key) if desc else desc for key in self.keys]
+        assert len(self.descs) == len(self.keys), '{}: One description is needed per record'.format(name)
+        prototype = record_type(self.NAME_MARK, desc=None if desc is None else self.DESC_MARK, **kwargs)
+        self.options = prototype.options
+        self.template = str(prototype).replace('%', '%%').replace(
+            self.NAME_MARK, '%(name)s'
+        ).replace(self.DESC_MARK, '%(desc)s')
+        self._text = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __str__(self):
+        if self._text is None:
+            template = self.template
+            self._text = ''.join([
+                template % {'name': name, 'desc': desc} for name, desc in zip(self.names, self.descs)
+            ])
+        return self._text
+
 
 class ModelType(type):
     def __new__(cls, name, bases, dct):
         fields = {}
-        for k, v in dct.items():
-            if isinstance(v, Record):
+        for k, v in list(dct.items()):
+            if isinstance(v, (Record, RecordArray)):
                 fields[k] = v
                 del dct[k]
         dct['_fields'] = fields
         return super(ModelType, cls).__new__(cls, name, bases, dct)
 
 
-class Model(object):
-    __metaclass__ = ModelType
+class Model(ModelType('ModelBase', (object,), {})):
 
-    def __init__(self, device_name, callbacks=None, command='softIoc', macros=None):
+    def __init__(self, device_name, callbacks=None, command='softIoc', macros=None, server=None, executor=None):
         """
         IOC Database Model
 
@@ -374,6 +448,10 @@ class Model(object):
         :param callbacks: Callback handler which provides callback methods for handling events and commands
         :param command: The softIoc command to execute. By default this is 'softIoc' from EPICS base.
         :param macros: additional macros to be used in the database as a dictionary
+        :param server: RecordServer shared with other models. If provided, the records are served by it
+            instead of a dedicated softIoc process, and they connect once the server is started.
+        :param executor: executor.CallbackExecutor which runs the callbacks in worker threads instead of the main
+            loop. Callbacks decorated with inline are still called from the main loop.
 
         Process Variable records will be named *<device_name>:<record_name>*.
 
@@ -387,7 +465,11 @@ class Model(object):
 
         which accepts the active record (pv), the changed value (value) and the ioc instance (ioc). If the Model
         is also the callbacks provider, self, and ioc are identical, otherwise ioc is a reference to the database
-        model on which the record resides.
+        model on which the record resides. For a RecordArray, the callback is connected to every record of the
+        array.
+
+        With an executor, callbacks of the same record run in order while those of different records may run
+        concurrently, so callbacks sharing state must protect it or be grouped with the serial decorator.
         """
         self.device_name = device_name
         self.callbacks = callbacks or self
@@ -397,10 +479,37 @@ class Model(object):
             self.macros.update(**macros)
         self.command = command
         self.ready = False
-        self.db_cache_dir = os.path.join(os.path.join(os.getcwd(), '__dbcache__'))
-        self.directory = os.getcwd()
-        self._startup()
-        self._setup()
+        self.server = server
+        self.executor = executor
+        if server is None:
+            self.db_cache_dir = os.path.join(os.path.join(os.getcwd(), '__dbcache__'))
+            self.directory = os.getcwd()
+            self._startup()
+            self._setup()
+        else:
+            self.db_cache_dir = server.db_cache_dir
+            self.directory = server.directory
+            server.add(self)
+            self._setup(wait=False)
+
+    def write_db(self, directory):
+        """
+        Write the record database of the model to a directory
+
+        :param directory: destination directory
+        :return: database name
+        """
+        db_name = self.__class__.__name__
+        with open(os.path.join(directory, '{}.db'.format(db_name)), 'w') as db_file:
+            db_file.write(''.join([str(v) for v in self._fields.values()]))
+        return db_name
+
+    def load_text(self, db_name):
+        """
+        Return the IOC shell command to load the records of the model
+        """
+        macro_text = ','.join(['{}={}'.format(k, v) for k, v in self.macros.items()])
+        return LOAD_TEMPLATE.format(macros=macro_text, db_name=db_name)
 
     def _startup(self):
         """
@@ -408,52 +517,193 @@ class Model(object):
         """
         if not os.path.exists(self.db_cache_dir):
             os.mkdir(self.db_cache_dir)
-        db_name = self.__class__.__name__
-        with open(os.path.join(self.db_cache_dir, '{}.db'.format(db_name)), 'w') as db_file:
-            for k, v in self._fields.items():
-                db_file.write(str(v))
+        db_name = self.write_db(self.db_cache_dir)
 
         with open(os.path.join(self.db_cache_dir, '{}.cmd'.format(db_name)), 'w') as cmd_file:
-            macro_text = ','.join(['{}={}'.format(k,v) for k,v in self.macros.items()])
-
-
-            cmd_file.write(CMD_TEMPLATE.format(macros=macro_text, db_name=db_name))
+            cmd_file.write(CMD_TEMPLATE.format(loads=self.load_text(db_name)))
         os.chdir(self.db_cache_dir)
-        self.ioc_process = multiprocessing.Process(
-            target=subprocess.check_call,
-            args=([self.command, '{}.cmd'.format(db_name)],),
-            kwargs={'stdin': subprocess.PIPE}
-        )
-        self.ioc_process.daemon = True
-        self.ioc_process.start()
+        self.ioc_process = start_ioc(self.command, '{}.cmd'.format(db_name), self.db_cache_dir)
 
     def shutdown(self):
         """
-        Shutdown the ioc application
+        Shutdown the ioc application. Models hosted by a shared RecordServer are shut down with the server.
         """
-        self.ioc_process.terminate()
-        shutil.rmtree(self.db_cache_dir)
+        if self.server is None:
+            if self.ioc_process is not None:
+                self.ioc_process.terminate()
+            shutil.rmtree(self.db_cache_dir)
 
-    def _setup(self):
+    def _setup(self, wait=True):
         """
         Set up the ioc records an connect all callbacks
+
+        :param wait: wait for the records to connect
         """
-        pending = set()
         for k, f in self._fields.items():
-            pv_name = '{}:{}'.format(self.device_name, f.options['name'])
-            pv = epics.PV(pv_name)
-            pending.add(pv)
-            setattr(self, k, pv)
             callback = 'do_{}'.format(k).lower()
-            #REM print( '\tmydebug> ', pv, k, callback )
-            if hasattr(self.callbacks, callback):
-                pv.connect('changed', getattr(self.callbacks, callback), self)
-
-        # wait 10 seconds for all PVs to connect
-        timeout = 5
-        while pending and timeout > 0:
-            time.sleep(0.05)
-            timeout -= 0.05
-            pending = {pv for pv in pending if not pv.is_active()}
-
-        print('')
+            if isinstance(f, RecordArray):
+                pvs = [self._create_pv(name, f.options, callback) for name in f.names]
+                setattr(self, k, pvs)
+            else:
+                pv = self._create_pv(f.options['name'], f.options, callback)
+                setattr(self, k, pv)
+        if wait:
+            self.wait_for_records()
+
+    def _create_pv(self, name, options, callback):
+        """
+        Create the process variable of a record and connect its callback
+
+        :param name: record name
+        :param options: record options
+        :param callback: name of the callback method
+        """
+        pv_name = '{}:{}'.format(self.device_name, name)
+        pv = epics.PV(pv_name, history=options.get('history', 0), **options.get('subscription', {}))
+        if hasattr(self.callbacks, callback):
+            handler = getattr(self.callbacks, callback)
+            if self.executor is None or getattr(handler, 'inline', False):
+                pv.connect('changed', handler, self)
+            else:
+                pv.connect('changed', self.executor.dispatch, handler, self)
+        return pv
+
+    def get_records(self):
+        """
+        Return the process variables of all records of the model
+        """
+        records = []
+        for k, f in self._fields.items():
+            if isinstance(f, RecordArray):
+                records.extend(getattr(self, k))
+            else:
+                records.append(getattr(self, k))
+        return records
+
+    def wait_for_records(self, timeout=5):
+        """
+        Wait for all records to connect
+
+        :param timeout: maximum time to wait in seconds
+        :return: True if all records are connected
+        """
+        return wait_for_pvs(self.get_records(), timeout)
+
+
+def inline(method):
+    """
+    Decorator for fast record callbacks which should be called directly from the main loop even if the model
+    has an executor
+    """
+    method.inline = True
+    return method
+
+
+def serial(key):
+    """
+    Decorator for record callbacks sharing state with callbacks of other records. When the model has an executor,
+    callbacks decorated with the same key run one at a time in the order their records changed.
+
+    :param key: hashable name of the group of callbacks
+    """
+    def decorator(method):
+        method.serial = key
+        return method
+    return decorator
+
+
+class RecordServer(object):
+    """
+    A single softIoc process serving the records of several models, so that multiple devices can be hosted in one
+    process. Models are registered by passing the server to their constructor, and the server must be started
+    once all of them have been created since records can not be added to a running IOC.
+    """
+
+    def __init__(self, command='softIoc', directory=None):
+        """
+        :param command: The softIoc command to execute. By default this is 'softIoc' from EPICS base.
+        :param directory: directory under which the database cache is created, defaults to the current directory
+        """
+        self.command = command
+        self.directory = directory or os.getcwd()
+        self.db_cache_dir = os.path.join(self.directory, '__dbcache__')
+        self.models = []
+        self.ioc_process = None
+        self.started = False
+
+    def add(self, model):
+        assert not self.started, 'Models can not be added after the record server has started'
+        self.models.append(model)
+
+    def start(self, timeout=5):
+        """
+        Generate the databases, start the IOC application in a separate process and wait for the records of all
+        models to connect.
+
+        :param timeout: maximum time to wait for the records in seconds
+        :return: True if all records are connected
+        """
+        if not os.path.exists(self.db_cache_dir):
+            os.mkdir(self.db_cache_dir)
+        databases = {}
+        loads = ''
+        for model in self.models:
+            if model.__class__ not in databases:
+                databases[model.__class__] = model.write_db(self.db_cache_dir)
+            loads += model.load_text(databases[model.__class__])
+
+        with open(os.path.join(self.db_cache_dir, 'server.cmd'), 'w') as cmd_file:
+            cmd_file.write(CMD_TEMPLATE.format(loads=loads))
+        self.started = True
+        self.ioc_process = start_ioc(self.command, 'server.cmd', self.db_cache_dir)
+        records = [pv for model in self.models for pv in model.get_records()]
+        return wait_for_pvs(records, timeout)
+
+    def shutdown(self):
+        """
+        Shutdown the ioc application
+        """
+        if self.started:
+            if self.ioc_process is not None:
+                self.ioc_process.terminate()
+            shutil.rmtree(self.db_cache_dir)
+
+
+def start_ioc(command, cmd_name, directory):
+    """
+    Start the IOC application in a separate process. If the Channel Access backend serves records itself, as
+    softdev.fakeca does, the startup script is loaded by the backend instead and no process is started.
+
+    :param command: The softIoc command to execute
+    :param cmd_name: startup script
+    :param directory: directory containing the startup script and databases
+    :return: IOC process or None
+    """
+    backend = epics.get_backend()
+    if hasattr(backend, 'load_ioc'):
+        backend.load_ioc(os.path.join(directory, cmd_name))
+        return None
+    process = multiprocessing.Process(
+        target=subprocess.check_call,
+        args=([command, cmd_name],),
+        kwargs={'stdin': subprocess.PIPE, 'cwd': directory}
+    )
+    process.daemon = True
+    process.start()
+    return process
+
+
+def wait_for_pvs(pvs, timeout=5):
+    """
+    Wait for process variables to connect
+
+    :param pvs: process variables
+    :param timeout: maximum time to wait in seconds
+    :return: True if all process variables are connected
+    """
+    pending = set(pvs)
+    while pending and timeout > 0:
+        time.sleep(0.05)
+        timeout -= 0.05
+        pending = {pv for pv in pending if not pv.is_active()}
+    return not pending
@@ -0,0 +1,195 @@
+"""
+This module implements signal emission for process variables and the dispatchers which deliver signals in the
+main loop of the application. Signals are raised from Channel Access threads and handlers are called later by the
+active dispatcher:
+
+- GObjectDispatcher: through the GObject main loop, as with gireactor
+- TwistedDispatcher: through the Twisted reactor, without GObject
+- AsyncioDispatcher: through an asyncio event loop
+- DirectDispatcher: immediately, in the thread raising the signal
+
+The dispatcher must be selected with set_dispatcher() before any signals are raised. If none is selected, GObject is
+used if it is available, then the Twisted reactor.
+"""
+
+import collections
+import itertools
+import threading
+
+from . import log
+
+logger = log.get_module_logger(__name__)
+
+
+class Dispatcher(object):
+    """Base class for signal dispatchers."""
+
+    def call_soon(self, func, *args):
+        """
+        Schedule a call in the main loop. May be called from any thread.
+
+        :param func: callable
+        :param args: arguments
+        """
+        raise NotImplementedError
+
+
+class DirectDispatcher(Dispatcher):
+    """Calls handlers immediately in the thread which raised the signal."""
+
+    def call_soon(self, func, *args):
+        func(*args)
+
+
+class GObjectDispatcher(Dispatcher):
+    """Calls handlers from the GObject main loop."""
+
+    def __init__(self):
+        from gi.repository import GObject
+        self.idle_add = GObject.idle_add
+
+    def call_soon(self, func, *args):
+        self.idle_add(_call_once, func, args)
+
+
+class BatchDispatcher(Dispatcher):
+    """
+    Queues calls and runs them in batches in the main loop, waking the loop up once per batch instead of once
+    per call.
+    """
+
+    def __init__(self):
+        self.pending = collections.deque()
+        self.lock = threading.Lock()
+        self.scheduled = False
+
+    def call_soon(self, func, *args):
+        with self.lock:
+            self.pending.append((func, args))
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.wakeup()
+
+    def wakeup(self):
+        """Schedule a call to pump in the main loop."""
+        raise NotImplementedError
+
+    def pump(self):
+        """Run all queued calls. Called in the main loop."""
+        with self.lock:
+            calls, self.pending = self.pending, collections.deque()
+            self.scheduled = False
+        for func, args in calls:
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error('Error in signal handler {}: {}'.format(func, e))
+
+
+class TwistedDispatcher(BatchDispatcher):
+    """Calls handlers from the Twisted reactor thread, using the reactor's waker to interrupt select/epoll."""
+
+    def __init__(self, reactor=None):
+        super(TwistedDispatcher, self).__init__()
+        if reactor is None:
+            from twisted.internet import reactor
+        self.reactor = reactor
+
+    def wakeup(self):
+        self.reactor.callFromThread(self.pump)
+
+
+class AsyncioDispatcher(BatchDispatcher):
+    """Calls handlers from an asyncio event loop."""
+
+    def __init__(self, loop):
+        super(AsyncioDispatcher, self).__init__()
+        self.loop = loop
+
+    def wakeup(self):
+        self.loop.call_soon_threadsafe(self.pump)
+
+
+def _call_once(func, args):
+    func(*args)
+    return False
+
+
+_dispatcher = None
+
+
+def set_dispatcher(dispatcher):
+    """
+    Select the dispatcher used to deliver signals.
+
+    :param dispatcher: Dispatcher instance
+    """
+    global _dispatcher
+    _dispatcher = dispatcher
+
+
+def get_dispatcher():
+    """Return the active dispatcher, selecting the default if none has been set."""
+    global _dispatcher
+    if _dispatcher is None:
+        try:
+            _dispatcher = GObjectDispatcher()
+        except ImportError:
+            _dispatcher = TwistedDispatcher()
+    return _dispatcher
+
+
+class Emitter(object):
+    """
+    Thread-safe registry of signal handlers, with the same connect, disconnect and emit interface as GObject
+    signals. Handlers are called as handler(emitter, value, *args).
+    """
+    __signals__ = ()
+
+    def __init__(self):
+        self._handlers = {name: [] for name in self.__signals__}
+        self._handler_lock = threading.Lock()
+        self._handler_ids = itertools.count(1)
+
+    def connect(self, signal, handler, *args):
+        """
+        Connect a handler to a signal.
+
+        :param signal: signal name
+        :param handler: callable
+        :param args: extra arguments passed to the handler
+        :return: handler id
+        """
+        if signal not in self._handlers:
+            raise TypeError('{}: unknown signal name: {}'.format(self.__class__.__name__, signal))
+        with self._handler_lock:
+            handler_id = next(self._handler_ids)
+            self._handlers[signal] = self._handlers[signal] + [(handler_id, handler, args)]
+        return handler_id
+
+    def disconnect(self, handler_id):
+        """
+        Disconnect a handler.
+
+        :param handler_id: handler id returned by connect
+        """
+        with self._handler_lock:
+            for signal, handlers in self._handlers.items():
+                self._handlers[signal] = [entry for entry in handlers if entry[0] != handler_id]
+
+    def emit(self, signal, value):
+        """
+        Call all handlers of a signal in the current thread.
+
+        :param signal: signal name
+        :param value: signal value
+        """
+        for handler_id, handler, args in self._handlers[signal]:
+            handler(self, value, *args)
+
+    def emit_soon(self, signal, value):
+        """
+        Emit a signal from the main loop through the active dispatcher. May be called from any thread.
+        """
+        get_dispatcher().call_soon(self.emit, signal, value)
@@ -0,0 +1,55 @@
+"""
+Microbenchmark of the cost of converting values for numeric array puts and monitors, as a function of the
+array length. Compares the previous per-element conversion with the numpy path, both for a sequence and for a
+numpy array of the channel's element type which is passed through without copying.
+
+Run with `python -m tests.bench_arrays` from the softdev directory.
+"""
+import timeit
+
+import numpy
+
+from softdev import epics
+
+LENGTHS = [16, 256, 4096, 65536]
+REPEATS = 2000
+
+
+def legacy_from_python(pv, val):
+    return pv.vtype(*[pv.etype(v) for v in val])
+
+
+def legacy_to_python(pv, data):
+    return numpy.frombuffer(data, dtype=pv.etype).copy()
+
+
+def make_pv(length):
+    pv = epics.PV('BENCH:ARR{}'.format(length), monitor=False)
+    pv.type = epics.DBR_DOUBLE
+    pv.count = length
+    pv.setup_types()
+    return pv
+
+
+def main():
+    print('{:>8} {:>12} {:>12} {:>12} {:>12} {:>12}'.format(
+        'length', 'legacy (us)', 'list (us)', 'numpy (us)', 'copy (us)', 'ring (us)'
+    ))
+    for length in LENGTHS:
+        pv = make_pv(length)
+        values = [float(i) for i in range(length)]
+        array = numpy.array(values)
+        data = pv.from_python(values)
+        legacy = timeit.timeit(lambda: legacy_from_python(pv, values), number=REPEATS)
+        listed = timeit.timeit(lambda: pv.from_python(values), number=REPEATS)
+        direct = timeit.timeit(lambda: pv.from_python(array), number=REPEATS)
+        copied = timeit.timeit(lambda: legacy_to_python(pv, data), number=REPEATS)
+        ring = timeit.timeit(lambda: pv.to_python(data, epics.DBR_DOUBLE), number=REPEATS)
+        print('{:>8} {:>12.3f} {:>12.3f} {:>12.3f} {:>12.3f} {:>12.3f}'.format(
+            length, 1e6 * legacy / REPEATS, 1e6 * listed / REPEATS, 1e6 * direct / REPEATS,
+            1e6 * copied / REPEATS, 1e6 * ring / REPEATS
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of database generation for a model of 10,000 records. Compares the previous rendering, which built and
+formatted a template for every record on every start, with compiled record templates, and with the same records
+declared as record arrays. No IOC is started.
+
+Run with `python -m tests.bench_models` from the softdev directory.
+"""
+import shutil
+import tempfile
+import timeit
+
+from softdev import models
+
+RECORDS = 10000
+REPEATS = 5
+
+
+def legacy_render(record):
+    template = '\n'.join(
+        ['record({record}, "$(device):{name}") {{'] +
+        ['  field({}, "{}")'.format(k, v) for k, v in record.instance_fields.items()] +
+        ['}}', '']
+    )
+    return template.format(**record.options)
+
+
+def declare_records():
+    fields = {}
+    for i in range(RECORDS // 4):
+        fields['flt{}'.format(i)] = models.Float('FLT:{}'.format(i), units='mm', desc='Float {}'.format(i))
+        fields['int{}'.format(i)] = models.Integer('INT:{}'.format(i), units='', desc='Integer {}'.format(i))
+        fields['cmd{}'.format(i)] = models.Toggle('CMD:{}'.format(i), desc='Command {}'.format(i))
+        fields['sel{}'.format(i)] = models.Enum('SEL:{}'.format(i), choices=['Off', 'On'], desc='Select {}'.format(i))
+    return fields
+
+
+def declare_arrays():
+    count = RECORDS // 4
+    return {
+        'flt': models.RecordArray(models.Float, 'FLT:{}', count=count, units='mm', desc='Float {}'),
+        'int': models.RecordArray(models.Integer, 'INT:{}', count=count, units='', desc='Integer {}'),
+        'cmd': models.RecordArray(models.Toggle, 'CMD:{}', count=count, desc='Command {}'),
+        'sel': models.RecordArray(models.Enum, 'SEL:{}', count=count, choices=['Off', 'On'], desc='Select {}'),
+    }
+
+
+class Database(object):
+    """
+    Stands in for a model, only providing what write_db needs
+    """
+    write_db = models.Model.__dict__['write_db']
+
+    def __init__(self, fields):
+        self._fields = fields
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        fields = declare_records()
+        legacy = timeit.timeit(lambda: ''.join([legacy_render(f) for f in fields.values()]), number=REPEATS)
+        first = timeit.timeit(lambda: ''.join([str(f) for f in declare_records().values()]), number=1)
+        declare = timeit.timeit(declare_records, number=1)
+        Database(fields).write_db(directory)
+        cached = timeit.timeit(lambda: Database(fields).write_db(directory), number=REPEATS)
+
+        arrays = timeit.timeit(lambda: Database(declare_arrays()).write_db(directory), number=REPEATS)
+        array_fields = declare_arrays()
+        Database(array_fields).write_db(directory)
+        array_cached = timeit.timeit(lambda: Database(array_fields).write_db(directory), number=REPEATS)
+    finally:
+        shutil.rmtree(directory)
+
+    print('Generating a database of {} records (ms):'.format(RECORDS))
+    print('{:>36} {:>10.2f}'.format('previous rendering', 1e3 * legacy / REPEATS))
+    print('{:>36} {:>10.2f}'.format('compiled, first render', 1e3 * (first - declare)))
+    print('{:>36} {:>10.2f}'.format('compiled, write_db on restart', 1e3 * cached / REPEATS))
+    print('{:>36} {:>10.2f}'.format('record arrays, declare + write_db', 1e3 * arrays / REPEATS))
+    print('{:>36} {:>10.2f}'.format('record arrays, write_db on restart', 1e3 * array_cached / REPEATS))
+
+
+if __name__ == '__main__':
+    main()
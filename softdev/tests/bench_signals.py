@@ -0,0 +1,92 @@
+"""
+Microbenchmark of the per-event cost of delivering PV signals through each dispatcher. A worker thread emits
+change signals as Channel Access monitors do and the main loop, running in a separate thread, calls the handler.
+The GObject and asyncio dispatchers are skipped if PyGObject or asyncio are not available.
+
+Run with `python -m tests.bench_signals` from the softdev directory.
+"""
+import os
+import threading
+import time
+
+from softdev import signals
+
+EVENTS = 50000
+
+
+class Source(signals.Emitter):
+    __signals__ = ('changed',)
+
+
+class Counter(object):
+    def __init__(self, events):
+        self.events = events
+        self.count = 0
+        self.done = threading.Event()
+
+    def on_change(self, obj, value):
+        self.count += 1
+        if self.count == self.events:
+            self.done.set()
+
+
+def gobject_loop():
+    from gi.repository import GLib
+    loop = GLib.MainLoop()
+    return signals.GObjectDispatcher(), loop.run, loop.quit
+
+
+def twisted_loop():
+    from twisted.internet import reactor
+    run = lambda: reactor.run(installSignalHandlers=False)
+    return signals.TwistedDispatcher(reactor), run, lambda: reactor.callFromThread(reactor.stop)
+
+
+def asyncio_loop():
+    import asyncio
+    loop = asyncio.new_event_loop()
+    return signals.AsyncioDispatcher(loop), loop.run_forever, lambda: loop.call_soon_threadsafe(loop.stop)
+
+
+def direct_loop():
+    return signals.DirectDispatcher(), lambda: None, lambda: None
+
+
+def run(name, factory):
+    try:
+        dispatcher, start, stop = factory()
+    except ImportError as e:
+        print('{:>8} skipped: {}'.format(name, e))
+        return
+    signals.set_dispatcher(dispatcher)
+    thread = threading.Thread(target=start)
+    thread.daemon = True
+    thread.start()
+    time.sleep(0.1)
+
+    source = Source()
+    counter = Counter(EVENTS)
+    source.connect('changed', counter.on_change)
+
+    cpu_start = sum(os.times()[:2])
+    wall_start = time.time()
+    worker = threading.Thread(target=lambda: [source.emit_soon('changed', i) for i in range(EVENTS)])
+    worker.start()
+    worker.join()
+    counter.done.wait(60)
+    wall = time.time() - wall_start
+    cpu = sum(os.times()[:2]) - cpu_start
+    stop()
+    thread.join(5)
+    print('{:>8} {:>12.3f} {:>12.3f} {:>12.0f}'.format(name, 1e6 * wall / EVENTS, 1e6 * cpu / EVENTS, EVENTS / wall))
+
+
+def main():
+    print('{:>8} {:>12} {:>12} {:>12}'.format('loop', 'wall (us)', 'cpu (us)', 'events/s'))
+    for name, factory in [('direct', direct_loop), ('gobject', gobject_loop), ('twisted', twisted_loop),
+                          ('asyncio', asyncio_loop)]:
+        run(name, factory)
+
+
+if __name__ == '__main__':
+    main()
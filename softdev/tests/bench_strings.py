@@ -0,0 +1,44 @@
+"""
+Microbenchmark of the cost of converting values for string and character array puts, as a function of the
+string length. Compares the previous per-put allocation with the preallocated send buffer, and the cost of a
+soft put which is skipped because the bytes did not change.
+
+Run with `python -m tests.bench_strings` from the softdev directory.
+"""
+import timeit
+from ctypes import create_string_buffer
+
+from softdev import epics
+
+LENGTHS = [40, 256, 1024, 2048, 8192]
+REPEATS = 20000
+
+
+def legacy_from_python(pv, val):
+    val_str = str(''.join([v for v in val[:pv.count]]))
+    return create_string_buffer(val_str, pv.count)
+
+
+def make_pv(length):
+    pv = epics.PV('BENCH:STR{}'.format(length), monitor=False)
+    pv.type = epics.DBR_CHAR
+    pv.count = length
+    pv.setup_types()
+    return pv
+
+
+def main():
+    print('{:>8} {:>12} {:>12} {:>12}'.format('length', 'legacy (us)', 'buffer (us)', 'skip (us)'))
+    for length in LENGTHS:
+        pv = make_pv(length)
+        text = ('softdev ' * (length // 8 + 1))[:length - 1]
+        legacy = timeit.timeit(lambda: legacy_from_python(pv, text), number=REPEATS)
+        buffered = timeit.timeit(lambda: pv.from_python(text), number=REPEATS)
+        skipped = timeit.timeit(lambda: pv.encode_string(text) == pv.last_sent, number=REPEATS)
+        print('{:>8} {:>12.3f} {:>12.3f} {:>12.3f}'.format(
+            length, 1e6 * legacy / REPEATS, 1e6 * buffered / REPEATS, 1e6 * skipped / REPEATS
+        ))
+
+
+if __name__ == '__main__':
+    main()
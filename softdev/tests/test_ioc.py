@@ -1,7 +1,10 @@
+import os
+import tempfile
 import unittest
 import numpy
+import threading
 import time
-from softdev import epics, models, log
+from softdev import epics, executor, models, log, signals
 
 MAX_INTEGER = 12345
 MIN_INTEGER = -54321
@@ -115,6 +118,147 @@ class IOCTestCase(unittest.TestCase):
         self.assertAlmostEqual(out2, expected, 6, 'Calculated Vaues do not match: {} vs {}'.format(out2, expected))
 
 
+class RecordServerTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.server = models.RecordServer(directory=cls.directory)
+        cls.iocs = [TestIOC('{}{}'.format(DEVICE_NAME, i), server=cls.server) for i in (1, 2)]
+        cls.connected = cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        os.rmdir(cls.directory)
+
+    def test_connected(self):
+        self.assertTrue(self.connected, 'Records of shared server did not connect')
+
+    def test_isolation(self):
+        first, second = self.iocs
+        first.intval.put(DEFAULT_INTEGER)
+        second.intval.put(-DEFAULT_INTEGER)
+        epics.flush()
+        time.sleep(0.5)
+        self.assertEqual(DEFAULT_INTEGER, first.intval.get(), 'Put Failed: Values do not match')
+        self.assertEqual(-DEFAULT_INTEGER, second.intval.get(), 'Put Failed: Values do not match')
+
+
+class MonitorFilterTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dispatcher = signals.get_dispatcher()
+        signals.set_dispatcher(signals.DirectDispatcher())
+        cls.directory = tempfile.mkdtemp()
+        cls.server = models.RecordServer(directory=cls.directory)
+        cls.ioc = TestIOC('{}F'.format(DEVICE_NAME), server=cls.server)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        os.rmdir(cls.directory)
+        signals.set_dispatcher(cls.dispatcher)
+
+    def monitor(self, record, **kwargs):
+        pv = epics.PV('{}:{}'.format(self.ioc.device_name, record), **kwargs)
+        values = []
+        pv.connect('changed', lambda obj, value: values.append(value))
+        end = time.time() + 5
+        while time.time() < end and not values:
+            time.sleep(0.05)
+        del values[:]
+        return pv, values
+
+    def put_values(self, record, values, delay=0.05):
+        pv = getattr(self.ioc, record)
+        for value in values:
+            pv.put(value)
+            epics.flush()
+            time.sleep(delay)
+        time.sleep(0.5)
+
+    def test_deadband(self):
+        pv, values = self.monitor('floatval', deadband=1.0)
+        self.put_values('floatval', [0.5, 1.5, 2.0, 2.4, 3.0, -3.0])
+        self.assertEqual(values, [1.5, 3.0, -3.0], 'Deadband not applied: {}'.format(values))
+        self.assertEqual(pv.get(), -3.0, 'Cached value not current')
+
+    def test_relative_deadband(self):
+        pv, values = self.monitor('intval', relative=0.1)
+        self.put_values('intval', [100, 105, 111, 115, 125])
+        self.assertEqual(values, [100, 111, 125], 'Relative deadband not applied: {}'.format(values))
+
+    def test_array_deadband(self):
+        pv, values = self.monitor('floatarray', deadband=0.5)
+        base = numpy.zeros(ARRAY_SIZE)
+        self.put_values('floatarray', [base + 1, base + 1.2, base + 2])
+        self.assertEqual([v[0] for v in values], [1.0, 2.0], 'Array deadband not applied')
+
+    def test_max_rate(self):
+        pv, values = self.monitor('floatout', max_rate=2.0)
+        self.put_values('floatout', [float(i) for i in range(1, 11)], delay=0.02)
+        self.assertTrue(len(values) <= 2, 'Rate limit not applied: {}'.format(values))
+        self.assertEqual(values[-1], 10.0, 'Latest value not delivered: {}'.format(values))
+
+
+class CallbackExecutorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = executor.CallbackExecutor(workers=4, name='test')
+        self.lock = threading.Lock()
+        self.active = 0
+        self.overlap = 0
+        self.calls = []
+        self.executor.start()
+
+    def tearDown(self):
+        self.executor.stop()
+
+    def callback(self, pv, value, ioc):
+        with self.lock:
+            self.active += 1
+            self.overlap = max(self.overlap, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+            self.calls.append((pv, value))
+
+    @models.serial('commands')
+    def serial_callback(self, pv, value, ioc):
+        self.callback(pv, value, ioc)
+
+    def wait(self, count, timeout=5):
+        end = time.time() + timeout
+        while time.time() < end and (len(self.calls) < count or self.executor.backlog()):
+            time.sleep(0.01)
+
+    def test_record_order(self):
+        for value in range(10):
+            self.executor.dispatch('rec', value, self.callback, None)
+        self.wait(10)
+        self.assertEqual([value for pv, value in self.calls], list(range(10)), 'Callbacks out of order')
+
+    def test_concurrent_records(self):
+        for value in range(8):
+            self.executor.dispatch('rec{}'.format(value), value, self.callback, None)
+        self.wait(8)
+        self.assertTrue(self.overlap > 1, 'Callbacks of different records not run concurrently')
+
+    def test_serial_group(self):
+        for value in range(8):
+            self.executor.dispatch('rec{}'.format(value % 4), value, self.serial_callback, None)
+        self.wait(8)
+        self.assertEqual(self.overlap, 1, 'Serial callbacks run concurrently')
+        self.assertEqual([value for pv, value in self.calls], list(range(8)), 'Serial callbacks out of order')
+
+
 if __name__ == '__main__':
-    suite = unittest.TestLoader().loadTestsFromTestCase(IOCTestCase)
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite([
+        loader.loadTestsFromTestCase(IOCTestCase), loader.loadTestsFromTestCase(MonitorFilterTestCase),
+        loader.loadTestsFromTestCase(RecordServerTestCase), loader.loadTestsFromTestCase(CallbackExecutorTestCase)
+    ])
     unittest.TextTestRunner(verbosity=2).run(suite)
\ No newline at end of file